@@ -2,9 +2,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.db import transaction
+from django.db.models import F
 from django.contrib import messages
 
-from .models import User, Team, Tag, Challenge, Hint, UnlockedHint, Solve, CTFSetting, WriteUp, ContentPage
+from .models import User, Team, Tag, Challenge, Hint, Flag, UnlockedHint, Solve, Submission, CTFSetting, WriteUp, ContentPage
+from .leaderboard import record_score, refresh_players, refresh_teams
+from .flags import invalidate_flags
+from .authentication import bump_user_version
+from .notifications import notify_user, notify_team_change
 
 
 # Register Team model
@@ -32,6 +37,22 @@ class UserAdmin(BaseUserAdmin):
         (None, {'fields': ('score', 'team')}),
     )
 
+    def save_model(self, request, obj, form, change):
+        # Score and team edits move points on the leaderboard
+        previous_team_id = User.objects.filter(pk=obj.pk).values_list('team_id', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        refresh_players(obj.pk)
+        refresh_teams(previous_team_id, obj.team_id)
+        if change:
+            bump_user_version(obj.pk) # Activity, permission, password or team changes must reach the auth cache
+        if change and previous_team_id != obj.team_id:
+            notify_team_change(obj, previous_team_id, obj.team_id)
+
+    def delete_model(self, request, obj):
+        team_id = obj.team_id
+        super().delete_model(request, obj)
+        refresh_teams(team_id)
+
 
 # Register Tag model
 @admin.register(Tag)
@@ -48,20 +69,28 @@ class HintInline(admin.TabularInline):
     extra = 1 # Number of empty forms to display
 
 
+class FlagInline(admin.TabularInline):
+    """
+    Inline admin for additional accepted flags (exact strings or regular expressions).
+    """
+    model = Flag
+    extra = 0
+
+
 # Register Challenge model
 @admin.register(Challenge)
 class ChallengeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'points', 'is_published', 'is_dynamic', 'initial_points', 'minimum_points', 'decay_factor', 'first_blood', 'created_at', 'updated_at')
-    list_filter = ('is_published', 'is_dynamic', 'tags')
+    list_display = ('name', 'points', 'is_published', 'is_dynamic', 'initial_points', 'minimum_points', 'decay_function', 'decay_factor', 'first_blood', 'created_at', 'updated_at')
+    list_filter = ('is_published', 'is_dynamic', 'decay_function', 'tags')
     search_fields = ('name', 'description', 'flag')
     filter_horizontal = ('tags',)
-    inlines = [HintInline] # Add HintInline to ChallengeAdmin
+    inlines = [FlagInline, HintInline] # Add FlagInline and HintInline to ChallengeAdmin
     fieldsets = (
         (None, {
             'fields': ('name', 'description', 'flag', 'file', 'tags', 'is_published', 'is_dynamic')
         }),
         ('Scoring', {
-            'fields': ('initial_points', 'minimum_points', 'decay_factor', 'points'),
+            'fields': ('initial_points', 'minimum_points', 'decay_function', 'decay_factor', 'points'),
             'description': 'For dynamic challenges, "Points" will be updated automatically by solves. For static challenges, "Points" should be set to "Initial Points".'
         }),
         ('Meta Information', {
@@ -71,6 +100,10 @@ class ChallengeAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('points', 'created_at', 'updated_at', 'first_blood') # 'points' is dynamically updated
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidate_flags(form.instance.pk) # Flags may have changed on the challenge or its inlines
+
 
 # Register Hint model
 @admin.register(Hint)
@@ -98,10 +131,27 @@ class SolveAdmin(admin.ModelAdmin):
     readonly_fields = ('solved_at', 'points_awarded') # Typically solved_at and points_awarded are set programmatically
 
 
+# Register Submission model (append-only attempt log)
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'challenge', 'is_correct', 'ip_address', 'submitted_at')
+    list_filter = ('is_correct', 'challenge')
+    search_fields = ('user__username', 'challenge__name', 'flag', 'ip_address')
+    list_select_related = ('user', 'challenge')
+    readonly_fields = ('user', 'challenge', 'flag', 'is_correct', 'ip_address', 'submitted_at')
+
+    def has_add_permission(self, request):
+        return False # Entries are only written by the submission log
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Register CTFSetting model
 @admin.register(CTFSetting)
 class CTFSettingAdmin(admin.ModelAdmin):
-    list_display = ('scoring_mode',)
+    list_display = ('scoring_mode', 'scoreboard_frozen', 'frozen_at')
+    readonly_fields = ('frozen_at',)
     # Prevent adding new instances, only allow changing the existing one
     def has_add_permission(self, request):
         return not CTFSetting.objects.exists()
@@ -126,14 +176,18 @@ class WriteUpAdmin(admin.ModelAdmin):
         
         with transaction.atomic():
             approved_count = 0
-            for writeup in queryset.filter(status='pending'):
+            for writeup in queryset.filter(status='pending').select_related('user', 'challenge'):
                 writeup.status = 'approved'
-                writeup.save()
+                writeup.save(update_fields=['status'])
                 
-                # Award bonus points to the user
+                # Award bonus points to the user (atomically, so concurrent solves are not overwritten)
                 user = writeup.user
-                user.score += BONUS_POINTS_FOR_WRITEUP
-                user.save()
+                User.objects.filter(pk=user.pk).update(score=F('score') + BONUS_POINTS_FOR_WRITEUP)
+                record_score(user, BONUS_POINTS_FOR_WRITEUP)
+                notify_user(
+                    user.pk, 'writeup_approved', writeup_id=writeup.pk, challenge_id=writeup.challenge_id,
+                    challenge=writeup.challenge.name, bonus_points=BONUS_POINTS_FOR_WRITEUP,
+                )
                 approved_count += 1
             
             if approved_count > 0:
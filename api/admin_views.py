@@ -1,8 +1,17 @@
 # api/admin_views.py
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAdminUser
-from .models import User, Team, Challenge, Tag, ContentPage
-from .serializers import AdminUserSerializer, AdminTeamSerializer, AdminChallengeSerializer, AdminTagSerializer, ContentPageSerializer
+from rest_framework.response import Response
+from .models import User, Team, Challenge, Flag, Submission, Tag, ContentPage
+from .serializers import AdminUserSerializer, AdminTeamSerializer, AdminChallengeSerializer, AdminFlagSerializer, AdminSubmissionSerializer, AdminTagSerializer, ContentPageSerializer
+from .leaderboard import refresh_players, refresh_teams
+from .scoring import rescore
+from .flags import invalidate_flags
+from .notifications import notify_team_change
 
 
 class UserManagementViewSet(viewsets.ModelViewSet):
@@ -15,6 +24,24 @@ class UserManagementViewSet(viewsets.ModelViewSet):
     serializer_class = AdminUserSerializer
     permission_classes = [IsAdminUser]
 
+    # Score and team edits move points on the leaderboards, so the affected entries are refreshed.
+    def perform_create(self, serializer):
+        user = serializer.save()
+        refresh_teams(user.team_id)
+
+    def perform_update(self, serializer):
+        previous_team_id = serializer.instance.team_id
+        user = serializer.save()
+        refresh_players(user.pk)
+        refresh_teams(previous_team_id, user.team_id)
+        if previous_team_id != user.team_id:
+            notify_team_change(user, previous_team_id, user.team_id)
+
+    def perform_destroy(self, instance):
+        team_id = instance.team_id
+        instance.delete()
+        refresh_teams(team_id)
+
 
 class TeamManagementViewSet(viewsets.ModelViewSet):
     """
@@ -48,6 +75,80 @@ class ChallengeManagementViewSet(viewsets.ModelViewSet):
     serializer_class = AdminChallengeSerializer
     permission_classes = [IsAdminUser]
 
+    def perform_update(self, serializer):
+        challenge = serializer.save()
+        invalidate_flags(challenge.pk)
+
+    def perform_destroy(self, instance):
+        challenge_id = instance.pk
+        instance.delete()
+        invalidate_flags(challenge_id)
+
+    @action(detail=True, methods=['post'])
+    def rescore(self, request, pk=None):
+        """
+        Retroactively recomputes this challenge's points and every earlier solve, user score and team total.
+        Responds with the number of rows touched and how long the rescore took.
+        """
+        challenge = self.get_object()
+        return Response(rescore([challenge.pk]))
+
+    @action(detail=False, methods=['post'], url_path='rescore')
+    def rescore_all(self, request):
+        """
+        Retroactively rescores every challenge in the event.
+        """
+        return Response(rescore())
+
+
+class FlagManagementViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for administrators to manage additional accepted flags.
+    Provides CRUD operations for Flag model instances (exact strings or regular expressions).
+    Requires admin privileges.
+    """
+    queryset = Flag.objects.all().order_by('challenge', 'id')
+    serializer_class = AdminFlagSerializer
+    permission_classes = [IsAdminUser]
+
+
+class SubmissionLogPagination(LimitOffsetPagination):
+    default_limit = 100
+    max_limit = 1000
+
+
+class SubmissionLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for administrators to query the submission attempt log.
+    Read-only and paginated ('?limit=&offset='). Filters: 'user', 'challenge', 'is_correct', 'ip_address', 'since'.
+    Requires admin privileges.
+    """
+    queryset = Submission.objects.select_related('user', 'challenge').order_by('-submitted_at')
+    serializer_class = AdminSubmissionSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = SubmissionLogPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        try:
+            if 'user' in params:
+                queryset = queryset.filter(user_id=int(params['user']))
+            if 'challenge' in params:
+                queryset = queryset.filter(challenge_id=int(params['challenge']))
+        except ValueError:
+            raise ValidationError({"detail": "'user' and 'challenge' must be integer IDs."})
+        if 'is_correct' in params:
+            queryset = queryset.filter(is_correct=params['is_correct'].lower() in ('1', 'true', 'yes'))
+        if 'ip_address' in params:
+            queryset = queryset.filter(ip_address=params['ip_address'])
+        if 'since' in params:
+            since = parse_datetime(params['since'])
+            if since is None:
+                raise ValidationError({"detail": "'since' must be an ISO 8601 datetime."})
+            queryset = queryset.filter(submitted_at__gte=since)
+        return queryset
+
 
 class ContentPageManagementViewSet(viewsets.ModelViewSet):
     """
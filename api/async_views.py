@@ -0,0 +1,214 @@
+# api/async_views.py
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound, ParseError, Throttled,
+)
+from rest_framework.renderers import JSONRenderer
+
+from .models import User, Challenge
+from .serializers import UserSerializer, FlagSubmissionSerializer, LeaderboardSerializer
+from .authentication import CachedJWTAuthentication
+from .broadcast import activity_broadcaster
+from .challenge_cache import challenge_cache
+from .challenge_stats import EMPTY_STATS, acount_attempt, aget_challenge_stats
+from .flags import acheck_flag
+from .leaderboard import ateam_rows
+from .notifications import anotify_solve
+from .scoreboard_freeze import afrozen_response
+from .submission_log import log_submission
+from .throttling import SubmitFlagThrottle
+from .user_progress import solved_challenges
+from .views import ProfileView, SubmitFlagView, parse_page_params, page_selector
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async-native versions of the hottest endpoints.
+
+    Under daphne, DRF views are sync code, which Django runs in the one thread reserved for sync code,
+    so concurrent requests queue behind each other's Redis round trips. These views are coroutines:
+    their Redis reads and writes go through the event loop's shared async client (see get_async_redis()),
+    and only database queries (the async ORM still runs them in that thread) and cache misses leave the loop.
+
+    Requests are authenticated (access token, user cache), throttled and answered exactly as by the DRF
+    views, which remain in api/views.py for the other methods and for comparison (see bench_async_views).
+    Every endpoint here requires an authenticated user.
+    """
+    authentication = CachedJWTAuthentication()
+    throttle_classes = ()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token authentication only, so no CSRF check, as with DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await self.authenticate(request)
+            await self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.error_response(request, exc)
+
+    async def authenticate(self, request):
+        # Honour APIClient.force_authenticate() in tests, as DRF's Request does
+        forced_user = getattr(request, '_force_auth_user', None)
+        if forced_user is not None:
+            return forced_user
+        result = await self.authentication.aauthenticate(request)
+        if result is None:
+            raise NotAuthenticated()
+        return result[0]
+
+    async def check_throttles(self, request):
+        waits = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            if not await throttle.aallow_request(request, self):
+                waits.append(throttle.wait())
+        if waits:
+            raise Throttled(max(waits))
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        raise MethodNotAllowed(request.method)
+
+    @staticmethod
+    def request_data(request):
+        """
+        The request body, as DRF's JSON and form parsers give it.
+        """
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body) if request.body else {}
+            except ValueError as exc:
+                raise ParseError(f'JSON parse error - {exc}')
+        return request.POST
+
+    @staticmethod
+    def render(data, status=status.HTTP_200_OK):
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+    def error_response(self, request, exc):
+        """
+        The response DRF's exception handler gives for `exc`.
+        """
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(request)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = str(exc.wait)
+        return response
+
+
+class AsyncProfileView(AsyncAPIView):
+    """
+    Async version of ProfileView for reads. Updates are rare and keep going through the DRF view.
+    """
+    update_view = staticmethod(ProfileView.as_view())
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(self.update_view)(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request):
+        # Read fresh, as ProfileView does: the cached user's score may be stale
+        user = await User.objects.select_related('team').filter(pk=request.user.pk).afirst()
+        if user is None:
+            raise NotFound()
+        return self.render(UserSerializer(user).data)
+
+
+class AsyncChallengeListView(AsyncAPIView):
+    """
+    Async version of ChallengeListView: the cached challenge list with the statistics and the user's
+    solved badges merged in, read concurrently and without leaving the event loop.
+    """
+
+    async def get(self, request):
+        challenges = await challenge_cache.achallenge_list()
+        stats, solved_ids = await asyncio.gather(
+            aget_challenge_stats([challenge['id'] for challenge in challenges]),
+            solved_challenges.aids(request.user.pk),
+        )
+        return self.render([
+            {**challenge, 'solved': challenge['id'] in solved_ids, 'stats': stats.get(challenge['id'], EMPTY_STATS)}
+            for challenge in challenges
+        ])
+
+
+class AsyncSubmitFlagView(AsyncAPIView):
+    """
+    Async version of SubmitFlagView. The checks, the attempt statistics and the broadcasts of a solve run
+    on the event loop; only the challenge lookup and the solve's transaction (SubmitFlagView.record_solve) leave it.
+    """
+    throttle_classes = (SubmitFlagThrottle,)
+
+    async def post(self, request, pk):
+        # The flag material comes from the in-process flag cache, so the flag column is not read here
+        challenge = await Challenge.objects.defer('flag', 'description').filter(pk=pk, is_published=True).afirst()
+        if challenge is None:
+            raise NotFound()
+        user = request.user
+
+        serializer = FlagSubmissionSerializer(data=self.request_data(request))
+        serializer.is_valid(raise_exception=True)
+        submitted_flag = serializer.validated_data['flag']
+
+        if await solved_challenges.acontains(user.pk, challenge.pk):
+            return self.render({"detail": "Challenge already solved."}, status.HTTP_400_BAD_REQUEST)
+
+        is_correct = await acheck_flag(challenge, submitted_flag)
+        log_submission(request, challenge, submitted_flag, is_correct)
+        await acount_attempt(challenge.pk, user.pk)
+        if not is_correct:
+            return self.render({"detail": "Incorrect flag."}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            solve_instance = await sync_to_async(SubmitFlagView.record_solve)(user, challenge)
+        except IntegrityError:
+            return self.render({"detail": "Challenge already solved."}, status.HTTP_400_BAD_REQUEST)
+        points_awarded_for_this_solve = solve_instance.points_awarded
+
+        # The solve has committed, so the broadcasts are published right away rather than on commit.
+        # Like on-commit hooks, they must not fail the request.
+        try:
+            await asyncio.gather(
+                activity_broadcaster.apublish({
+                    'user': user.username,
+                    'challenge': challenge.name,
+                    'points': points_awarded_for_this_solve,
+                    'timestamp': str(solve_instance.solved_at),
+                }),
+                anotify_solve(user, challenge, points_awarded_for_this_solve),
+            )
+        except RedisError:
+            logger.warning("Could not broadcast the solve of challenge %s.", challenge.pk, exc_info=True)
+
+        return self.render({"detail": "Flag submitted successfully!", "points_awarded": points_awarded_for_this_solve})
+
+
+class AsyncLeaderboardView(AsyncAPIView):
+    """
+    Async version of LeaderboardView: a page of the team leaderboard, or the frozen snapshot for non-admins.
+    """
+
+    async def get(self, request):
+        offset, limit = parse_page_params(request)
+        select, variant = page_selector(offset, limit)
+        frozen = await afrozen_response(request, 'leaderboard', select, variant)
+        if frozen is not None:
+            return frozen
+        return self.render(LeaderboardSerializer(await ateam_rows(offset, limit), many=True).data)
@@ -0,0 +1,215 @@
+# api/authentication.py
+import copy
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.auth import UserLazyObject
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.utils.functional import empty
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .redis_client import get_redis, get_async_redis
+
+# Users kept in memory per process
+USER_CACHE_SIZE = 10000
+
+# Redis hash of user id -> version stamp; bumping a user's stamp evicts them from every worker's cache
+VERSIONS_KEY = 'auth:user_versions'
+
+# WebSocket subprotocol announcing an access token: the client offers ['jwt', <token>] and is accepted with 'jwt'
+TOKEN_SUBPROTOCOL = 'jwt'
+
+
+def bump_user_version(*user_ids):
+    """
+    Invalidates the cached users once the surrounding transaction commits. Call it whenever a change
+    affects authentication or authorization: is_active, is_staff/is_superuser, password or team.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+
+    def apply():
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hincrby(VERSIONS_KEY, user_id, 1)
+        pipe.execute()
+
+    transaction.on_commit(apply, robust=True)
+
+
+class UserCache:
+    """
+    Process-local LRU cache of User rows, each tagged with the user's version stamp at load time.
+    A lookup reads the current stamp from Redis (one HGET) and reloads the row when it changed, so
+    deactivations and permission changes take effect on the very next request. Without Redis every
+    lookup goes to the database. Each caller gets its own copy, so per-request changes (scores,
+    cached relations) never leak into the cache or into other requests.
+    """
+
+    def __init__(self, max_size=USER_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Returns a copy of the user, or None if there is no such user.
+        """
+        try:
+            version = get_redis().hget(VERSIONS_KEY, user_id) or '0'
+        except RedisError:
+            return User.objects.filter(pk=user_id).first()
+
+        user = self._cached(user_id, version)
+        if user is not None:
+            return user
+        # The stamp was read before the row, so a concurrent change can only cause an extra reload
+        return self._store(user_id, version, User.objects.filter(pk=user_id).first())
+
+    async def aget(self, user_id):
+        """
+        get() for async views: the stamp is read through the event loop's Redis client, and a reload uses the async ORM.
+        """
+        try:
+            version = await get_async_redis().hget(VERSIONS_KEY, user_id) or '0'
+        except RedisError:
+            return await User.objects.filter(pk=user_id).afirst()
+
+        user = self._cached(user_id, version)
+        if user is not None:
+            return user
+        return self._store(user_id, version, await User.objects.filter(pk=user_id).afirst())
+
+    def _cached(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(user_id)
+                return copy.copy(entry[1])
+        return None
+
+    def _store(self, user_id, version, user):
+        if user is None:
+            return None
+        with self._lock:
+            self._entries[user_id] = (version, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return copy.copy(user)
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that verifies the token locally, as simplejwt does, and serves the user from
+    the version-stamped user cache instead of querying the users table on every request.
+    """
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views (see api/async_views.py). Returns (user, validated token),
+        or None if the request carries no token.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        return self.check_user(user_cache.get(self.token_user_id(validated_token)))
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await user_cache.aget(self.token_user_id(validated_token)))
+
+    @staticmethod
+    def token_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    @staticmethod
+    def check_user(user):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    ASGI middleware authenticating WebSocket connections by a simplejwt access token, passed as the
+    'token' query parameter or as the subprotocol following TOKEN_SUBPROTOCOL.
+
+    The token's signature and expiry are checked locally, so connecting costs no database or Redis
+    access, even when thousands of clients reconnect at once. scope['user_id'] holds the token's user
+    id; scope['user'] is an AnonymousUser without a valid token, and otherwise a lazy object that
+    consumers needing the user resolve with `await get_scope_user(scope)`.
+    scope['auth_subprotocol'] is the subprotocol to accept, if the token came as one.
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.authentication = JWTAuthentication()
+
+    def raw_token(self, scope):
+        """
+        Returns (token or None, subprotocol to accept or None).
+        """
+        subprotocols = scope.get('subprotocols') or []
+        if TOKEN_SUBPROTOCOL in subprotocols:
+            index = subprotocols.index(TOKEN_SUBPROTOCOL)
+            if index + 1 < len(subprotocols):
+                return subprotocols[index + 1], TOKEN_SUBPROTOCOL
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        return token, None
+
+    def user_id(self, raw_token):
+        if not raw_token:
+            return None
+        try:
+            return self.authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return None
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, subprotocol = self.raw_token(scope)
+        scope['user_id'] = self.user_id(raw_token)
+        scope['user'] = UserLazyObject() if scope['user_id'] is not None else AnonymousUser()
+        scope['auth_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
+
+
+async def get_scope_user(scope):
+    """
+    The user of an authenticated connection, loaded on first use from the version-stamped user cache;
+    AnonymousUser if the token's user no longer exists or is inactive.
+    """
+    user = scope['user']
+    if isinstance(user, UserLazyObject):
+        if user._wrapped is empty:
+            resolved = await database_sync_to_async(user_cache.get)(scope['user_id'])
+            user._wrapped = resolved if resolved is not None and resolved.is_active else AnonymousUser()
+        return user._wrapped
+    return user
@@ -0,0 +1,358 @@
+# api/broadcast.py
+import asyncio
+import json
+import logging
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from .redis_client import get_redis, get_async_redis, new_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Events arriving within this many seconds of the first one are sent together as one batch frame
+COALESCE_WINDOW = 0.1
+
+# Pause before resubscribing after the connection to Redis was lost
+RECONNECT_DELAY = 1.0
+
+# Events kept in a broadcaster's history stream (approximately; Redis trims whole stream nodes)
+HISTORY_SIZE = 1000
+
+# Events replayed to a connecting client that does not say which event it saw last
+REPLAY_COUNT = 50
+
+# Largest page of history served at once (see ActivityView)
+HISTORY_PAGE_MAX = 200
+
+# Redis stream entry ids, '<milliseconds>-<sequence>'
+EVENT_ID_RE = re.compile(r'^\d+-\d+$')
+
+# Appends an event to the history stream (KEYS[1], capped at ARGV[1] entries) and publishes it on
+# channel ARGV[2] with its new entry id, atomically, so live and replayed events carry the same ids.
+# The payload (ARGV[3]) is a JSON object; the id is spliced in as its first member, as with_id() does.
+_PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[3])
+redis.call('PUBLISH', ARGV[2], '{"id": "' .. id .. '", ' .. string.sub(ARGV[3], 2))
+return id
+"""
+
+
+def with_id(event_id, payload):
+    """
+    Adds the 'id' member to a pre-encoded JSON object without decoding it.
+    """
+    return f'{{"id": "{event_id}", {payload[1:]}'
+
+
+class Broadcaster:
+    """
+    Fans events out to the WebSocket consumers connected to this process.
+
+    Events are JSON-encoded once, by the publisher, and published on a Redis pub/sub channel.
+    Every ASGI process runs a single subscriber task that collects the events arriving within
+    COALESCE_WINDOW, wraps them into one frame and hands that same string to each local consumer,
+    so a burst of solves costs one encode per event and one frame per connection, whatever the
+    number of viewers. A single event is sent as {"type": update_type, "message": ...}, a burst as
+    {"type": batch_type, "messages": [...]}.
+
+    With a history_key, every event is also appended to a capped Redis stream and carries the
+    stream entry id as its 'id', so clients can page back through recent events (history()) and
+    resume after a reconnect (attach()) without any query.
+    """
+
+    def __init__(self, channel, update_type, batch_type, window=COALESCE_WINDOW, history_key=None,
+                 history_size=HISTORY_SIZE):
+        self.channel = channel
+        self.update_type = update_type
+        self.batch_type = batch_type
+        self.window = window
+        self.history_key = history_key
+        self.history_size = history_size
+        self._consumers = set()
+        self._replaying = {} # consumer -> frames held back until its initial frame has been sent
+        self._task = None
+        self._loop = None
+        self._subscribed = None
+        self._client = None # Async client of the current event loop, for reads such as replays
+        self._script = None
+        self._async_script = None
+
+    def publish(self, message):
+        """
+        Encodes the message (a non-empty dict) and publishes it once the surrounding transaction commits.
+        """
+        payload = json.dumps(message, cls=DjangoJSONEncoder)
+        transaction.on_commit(lambda: self._publish_now(payload), robust=True)
+
+    async def apublish(self, message):
+        """
+        publish() for async views, which run outside any transaction: the message is published right away,
+        through the event loop's Redis client.
+        """
+        payload = json.dumps(message, cls=DjangoJSONEncoder)
+        client = get_async_redis()
+        if self.history_key is None:
+            await client.publish(self.channel, payload)
+            return
+        if self._async_script is None or self._async_script.registered_client is not client:
+            self._async_script = client.register_script(_PUBLISH_SCRIPT)
+        await self._async_script(keys=[self.history_key], args=[self.history_size, self.channel, payload])
+
+    def _publish_now(self, payload):
+        if self.history_key is None:
+            get_redis().publish(self.channel, payload)
+            return
+        if self._script is None:
+            self._script = get_redis().register_script(_PUBLISH_SCRIPT)
+        self._script(keys=[self.history_key], args=[self.history_size, self.channel, payload])
+
+    def history(self, before=None, count=REPLAY_COUNT):
+        """
+        Up to `count` pre-encoded events older than the event id `before` (or the latest ones), newest first.
+        """
+        if self.history_key is None:
+            return []
+        entries = get_redis().xrevrange(self.history_key, max=f'({before}' if before else '+', min='-', count=count)
+        return [with_id(entry_id, fields['event']) for entry_id, fields in entries]
+
+    def frame(self, payloads, batch=False):
+        """
+        The text frame carrying the given pre-encoded events.
+        """
+        if len(payloads) == 1 and not batch:
+            return f'{{"type": "{self.update_type}", "message": {payloads[0]}}}'
+        return f'{{"type": "{self.batch_type}", "messages": [{", ".join(payloads)}]}}'
+
+    def add(self, consumer):
+        """
+        Starts delivering frames to the consumer. Must be called from the event loop serving it.
+        """
+        self._ensure_running()
+        self._consumers.add(consumer)
+
+    async def attach(self, consumer, *args, **kwargs):
+        """
+        Sends the consumer its initial frame (see initial_frame()), then starts delivering live frames.
+        Live frames arriving meanwhile are held back and sent after the initial frame, so the order is kept.
+        """
+        self.add(consumer)
+        self._replaying[consumer] = []
+        try:
+            frame = await self.initial_frame(*args, **kwargs)
+            if frame is not None:
+                consumer.push(frame)
+        finally:
+            for frame in self._replaying.pop(consumer, ()):
+                consumer.push(frame)
+
+    async def initial_frame(self, last_id=None, count=REPLAY_COUNT):
+        """
+        The events after `last_id` that are still in the history (or the latest `count` events) as one
+        batch frame, or None. An event published during the replay may also arrive live, so clients
+        should skip ids they have already seen.
+        """
+        if self.history_key is None:
+            return None
+        try:
+            if last_id:
+                entries = await self._client.xrange(self.history_key, min=f'({last_id}', max='+', count=self.history_size)
+            else:
+                entries = (await self._client.xrevrange(self.history_key, count=count))[::-1]
+        except RedisError:
+            logger.warning("Could not replay the history of %s.", self.channel, exc_info=True)
+            return None
+        if not entries:
+            return None
+        return self.frame([with_id(entry_id, fields['event']) for entry_id, fields in entries], batch=True)
+
+    def resync_frame(self):
+        """
+        A frame that supersedes every frame sent so far, sent instead of a connection's backlog when it
+        overflows (see BroadcastConsumer.push()), or None when there is none and the connection must go.
+        """
+        return None
+
+    def discard(self, consumer):
+        self._consumers.discard(consumer)
+        self._replaying.pop(consumer, None)
+
+    async def wait_subscribed(self):
+        """
+        Waits until this process's subscriber listens on the channel; events published earlier are not delivered.
+        """
+        self._ensure_running()
+        await self._subscribed.wait()
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        if self._loop is not loop:
+            # Consumers and the task of another event loop (e.g. an earlier test) cannot be reused
+            self._forget_consumers()
+            self._loop = loop
+            self._client = new_async_redis()
+        self._subscribed = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def _forget_consumers(self):
+        self._consumers = set()
+        self._replaying = {}
+
+    async def _run(self):
+        while True:
+            client = new_async_redis()
+            try:
+                async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    await self.on_subscribed()
+                    self._subscribed.set()
+                    while True:
+                        await self.deliver(await self._next_batch(pubsub))
+            except RedisError:
+                logger.warning("Broadcast subscriber for %s lost Redis; resubscribing.", self.channel, exc_info=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Broadcast subscriber for %s failed; resubscribing.", self.channel)
+            finally:
+                self._subscribed.clear()
+                await client.aclose()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def on_subscribed(self):
+        """
+        Called whenever the subscriber has (re)subscribed, before frames are delivered.
+        """
+
+    async def deliver(self, payloads):
+        """
+        Sends the events received within one coalescing window to every consumer.
+        """
+        self._fan_out(self.frame(payloads))
+
+    async def _next_batch(self, pubsub):
+        """
+        Waits for an event, then collects whatever else arrives within the coalescing window.
+        """
+        payloads = []
+        while not payloads:
+            message = await pubsub.get_message(timeout=None)
+            if message is not None:
+                payloads.append(message['data'])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while (remaining := deadline - loop.time()) > 0:
+            message = await pubsub.get_message(timeout=remaining)
+            if message is not None:
+                payloads.append(message['data'])
+        return payloads
+
+    def _fan_out(self, frame, consumers=None):
+        # Only queues the frame on each connection (see BroadcastConsumer.push()), so slow clients hold up no one
+        for consumer in list(self._consumers if consumers is None else consumers):
+            held_back = self._replaying.get(consumer)
+            if held_back is not None:
+                held_back.append(frame)
+            else:
+                consumer.push(frame)
+
+
+class GroupBroadcaster(Broadcaster):
+    """
+    Delivers each event only to the consumers that joined the event's group (e.g. 'user:5', 'team:3').
+
+    Like Broadcaster, it uses one Redis pub/sub subscription per process rather than one per connection;
+    each process routes the events to its own members of the group. An event is encoded once and sent
+    to every member as the same {"type": update_type, "message": ...} frame, without coalescing.
+    Consumers can also be moved between groups from anywhere (see regroup()), e.g. when a user changes team.
+    """
+
+    def __init__(self, channel, update_type, window=0):
+        super().__init__(channel, update_type=update_type, batch_type=update_type, window=window)
+        self._groups = {} # group -> consumers
+        self._memberships = {} # consumer -> groups
+
+    def publish_to(self, group, message):
+        """
+        Encodes the message and publishes it to the group's members once the surrounding transaction commits.
+        """
+        payload = f'{group} {json.dumps(message, cls=DjangoJSONEncoder)}'
+        transaction.on_commit(lambda: get_redis().publish(self.channel, payload), robust=True)
+
+    async def apublish_to(self, group, message):
+        """
+        publish_to() for async views, published right away.
+        """
+        await get_async_redis().publish(self.channel, f'{group} {json.dumps(message, cls=DjangoJSONEncoder)}')
+
+    def regroup(self, group, prefix, new_group=None):
+        """
+        Once the surrounding transaction commits, makes every member of `group` leave its groups starting
+        with `prefix` and join `new_group` (if any).
+        """
+        payload = json.dumps({'regroup': group, 'prefix': prefix, 'join': new_group})
+        transaction.on_commit(lambda: get_redis().publish(self.channel, payload), robust=True)
+
+    def join(self, consumer, *groups):
+        """
+        Adds the consumer to the groups. Must be called from the event loop serving it.
+        """
+        self._ensure_running()
+        for group in groups:
+            self._groups.setdefault(group, set()).add(consumer)
+            self._memberships.setdefault(consumer, set()).add(group)
+
+    def leave(self, consumer, *groups):
+        """
+        Removes the consumer from the groups.
+        """
+        memberships = self._memberships.get(consumer, set())
+        for group in groups:
+            members = self._groups.get(group)
+            if members is not None:
+                members.discard(consumer)
+                if not members:
+                    del self._groups[group]
+            memberships.discard(group)
+        if not memberships:
+            self._memberships.pop(consumer, None)
+
+    def discard(self, consumer):
+        """
+        Removes the consumer from all of its groups.
+        """
+        self.leave(consumer, *self._memberships.get(consumer, ()))
+
+    def _forget_consumers(self):
+        super()._forget_consumers()
+        self._groups = {}
+        self._memberships = {}
+
+    async def deliver(self, payloads):
+        for payload in payloads:
+            if payload.startswith('{'): # Groups never start with a brace
+                command = json.loads(payload)
+                for consumer in list(self._groups.get(command['regroup'], ())):
+                    self.leave(consumer, *[
+                        group for group in self._memberships.get(consumer, ()) if group.startswith(command['prefix'])
+                    ])
+                    if command['join']:
+                        self.join(consumer, command['join'])
+                continue
+            group, message = payload.split(' ', 1)
+            members = self._groups.get(group)
+            if members:
+                self._fan_out(self.frame([message]), members)
+
+
+# Solves and other public events, shown by the activity feed (see ActivityConsumer and ActivityView)
+activity_broadcaster = Broadcaster(
+    'activity:events', update_type='activity_update', batch_type='activity_batch', history_key='activity:history',
+)
+
+# Private events for one user or the members of one team (see api/notifications.py)
+notification_broadcaster = GroupBroadcaster('notifications:events', update_type='notification')
@@ -0,0 +1,117 @@
+# api/challenge_cache.py
+import threading
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from .models import Challenge
+from .redis_client import get_redis, get_async_redis
+from .serializers import SharedChallengeListSerializer, SharedChallengeDetailSerializer
+
+# Global version of the published challenge set; any change to a challenge, its tags or hints bumps it
+VERSION_KEY = 'challenge_cache:version'
+
+
+def current_version():
+    """
+    The current challenge-set version, or None if Redis is unreachable (callers then bypass the cache).
+    """
+    try:
+        return get_redis().get(VERSION_KEY) or '0'
+    except RedisError:
+        return None
+
+
+async def acurrent_version():
+    try:
+        return await get_async_redis().get(VERSION_KEY) or '0'
+    except RedisError:
+        return None
+
+
+def bump_challenge_version():
+    """
+    Invalidates every worker's cached challenge payloads once the surrounding transaction commits.
+    """
+    transaction.on_commit(lambda: get_redis().incr(VERSION_KEY), robust=True)
+
+
+class ChallengePayloadCache:
+    """
+    Process-local cache of the user-independent part of the challenge list and detail payloads,
+    already serialized, for the current challenge-set version. Each worker builds the list and each
+    detail once per version; requests in between only read the version from Redis and merge their
+    per-user fields (statistics, unlocked hints) into shallow copies.
+    The cached structures are shared between requests and must not be mutated.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._list = None
+        self._details = {}
+        self._lock = threading.Lock()
+
+    def _sync(self, version):
+        with self._lock:
+            if version is None or version != self._version:
+                self._version, self._list, self._details = version, None, {}
+        return version
+
+    def challenge_list(self):
+        version = self._sync(current_version())
+        payload = self._list
+        if payload is None:
+            payload = self._build_list(version)
+        return payload
+
+    async def achallenge_list(self):
+        """
+        challenge_list() for async views: only a rebuild, once per version, leaves the event loop.
+        """
+        version = self._sync(await acurrent_version())
+        payload = self._list
+        if payload is None:
+            payload = await sync_to_async(self._build_list)(version)
+        return payload
+
+    def _build_list(self, version):
+        challenges = Challenge.objects.filter(is_published=True).order_by('points', 'name').prefetch_related('tags')
+        payload = SharedChallengeListSerializer(challenges, many=True).data
+        with self._lock:
+            if version is not None and self._version == version:
+                self._list = payload
+        return payload
+
+    def challenge_detail(self, challenge_id):
+        """
+        Returns the shared detail payload of a published challenge, or None if there is none.
+        """
+        version = self._sync(current_version())
+        payload = self._details.get(challenge_id)
+        if payload is None:
+            challenge = (
+                Challenge.objects.filter(pk=challenge_id, is_published=True)
+                .prefetch_related('tags', 'hints').first()
+            )
+            if challenge is None:
+                return None
+            payload = SharedChallengeDetailSerializer(challenge).data
+            with self._lock:
+                if version is not None and self._version == version:
+                    self._details[challenge_id] = payload
+        return payload
+
+
+challenge_cache = ChallengePayloadCache()
+
+
+def user_hint_view(hint, unlocked_hint_ids):
+    """
+    A shared hint payload as HintSerializer renders it for a user: the text only once unlocked.
+    """
+    is_unlocked = hint['id'] in unlocked_hint_ids
+    view = {'id': hint['id'], 'cost': hint['cost'], 'is_unlocked': is_unlocked}
+    if is_unlocked:
+        view['text'] = hint['text']
+    return view
@@ -0,0 +1,212 @@
+# api/challenge_stats.py
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from redis.exceptions import RedisError
+
+from .models import Challenge, Solve, Submission
+from .redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+SOLVES_KEY = 'challenge_stats:solves'
+ATTEMPTS_KEY = 'challenge_stats:attempts'
+ATTEMPTERS_KEY = 'challenge_stats:attempters:{}' # HyperLogLog of user ids per challenge
+
+# Statistics of a challenge nobody has attempted yet
+EMPTY_STATS = {'solves': 0, 'attempts': 0, 'attempters': 0, 'solve_rate': None}
+
+# Applies solve count corrections to the counters that still hold the value they were computed against, so
+# increments of solves that land while the reconcile runs are neither lost nor counted twice.
+# KEYS: solve counters hash. ARGV: (challenge id, expected count, correction) triples. Returns the corrected ids.
+_CORRECT_SCRIPT = """
+local applied = {}
+for i = 1, #ARGV, 3 do
+    local current = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+    if current == tonumber(ARGV[i + 1]) then
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 2])
+        applied[#applied + 1] = ARGV[i]
+    end
+end
+return applied
+"""
+
+# Corrections sent to Redis per script call
+RECONCILE_BATCH_SIZE = 500
+
+# Passes over the solve counters that moved while their correction was computed; later passes re-read
+# only those challenges, so the window in which a counter can move again is much shorter
+RECONCILE_ATTEMPTS = 3
+
+_correct_script = None
+
+
+def _queue_attempt(pipe, challenge_id, user_id):
+    pipe.hincrby(ATTEMPTS_KEY, challenge_id, 1)
+    pipe.pfadd(ATTEMPTERS_KEY.format(challenge_id), user_id)
+
+
+def count_attempt(challenge_id, user_id):
+    """
+    Counts one submission attempt and adds the user to the challenge's unique attempters.
+    Statistics must never fail a submission, so Redis errors are logged and ignored;
+    the reconcile task repairs the counters.
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        _queue_attempt(pipe, challenge_id, user_id)
+        pipe.execute()
+    except RedisError:
+        logger.warning("Could not record attempt statistics for challenge %s.", challenge_id, exc_info=True)
+
+
+async def acount_attempt(challenge_id, user_id):
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        _queue_attempt(pipe, challenge_id, user_id)
+        await pipe.execute()
+    except RedisError:
+        logger.warning("Could not record attempt statistics for challenge %s.", challenge_id, exc_info=True)
+
+
+def count_solve(challenge_id):
+    """
+    Counts a solve once the surrounding transaction commits.
+    """
+    transaction.on_commit(lambda: get_redis().hincrby(SOLVES_KEY, challenge_id, 1), robust=True)
+
+
+def _queue_stats_reads(pipe, challenge_ids):
+    pipe.hmget(SOLVES_KEY, challenge_ids)
+    pipe.hmget(ATTEMPTS_KEY, challenge_ids)
+    for challenge_id in challenge_ids:
+        pipe.pfcount(ATTEMPTERS_KEY.format(challenge_id))
+
+
+def _stats(challenge_ids, results):
+    solves, attempts, *attempters = results
+    stats = {}
+    for challenge_id, solve_count, attempt_count, attempter_count in zip(challenge_ids, solves, attempts, attempters):
+        solve_count = int(solve_count or 0)
+        stats[challenge_id] = {
+            'solves': solve_count,
+            'attempts': int(attempt_count or 0),
+            'attempters': attempter_count,
+            # Solves recorded before attempts were tracked can exceed the attempters, hence the cap
+            'solve_rate': round(min(solve_count / attempter_count, 1.0), 4) if attempter_count else None,
+        }
+    return stats
+
+
+def get_challenge_stats(challenge_ids):
+    """
+    Returns {challenge id: {'solves', 'attempts', 'attempters', 'solve_rate'}} in one Redis round trip.
+    'solve_rate' is the share of users who attempted the challenge and solved it, or None before any attempt.
+    """
+    challenge_ids = list(challenge_ids)
+    if not challenge_ids:
+        return {}
+    pipe = get_redis().pipeline(transaction=False)
+    _queue_stats_reads(pipe, challenge_ids)
+    return _stats(challenge_ids, pipe.execute())
+
+
+async def aget_challenge_stats(challenge_ids):
+    challenge_ids = list(challenge_ids)
+    if not challenge_ids:
+        return {}
+    pipe = get_async_redis().pipeline(transaction=False)
+    _queue_stats_reads(pipe, challenge_ids)
+    return _stats(challenge_ids, await pipe.execute())
+
+
+def _solve_counts(challenge_ids=None):
+    solves = Solve.objects.all()
+    if challenge_ids is not None:
+        solves = solves.filter(challenge__in=challenge_ids)
+    return dict(solves.order_by().values('challenge').annotate(solve_count=Count('id')).values_list('challenge', 'solve_count'))
+
+
+def _correct_solve_counts(redis, corrections):
+    """
+    Applies (challenge id, stored count, correction) triples with _CORRECT_SCRIPT. Returns the ids corrected.
+    """
+    global _correct_script
+    if _correct_script is None:
+        _correct_script = redis.register_script(_CORRECT_SCRIPT)
+    applied = set()
+    for start in range(0, len(corrections), RECONCILE_BATCH_SIZE):
+        batch = corrections[start:start + RECONCILE_BATCH_SIZE]
+        result = _correct_script(keys=[SOLVES_KEY], args=[value for correction in batch for value in correction])
+        applied.update(int(challenge_id) for challenge_id in result)
+    return applied
+
+
+def reconcile_challenge_stats():
+    """
+    Corrects the solve counters to the exact counts in Solve and drops statistics of deleted challenges.
+    Attempt statistics are rebuilt from the Submission log only for challenges that have none in Redis
+    (e.g. after Redis lost its data), since the log trails the live counters by the write-behind buffer.
+    Returns the number of challenges whose statistics were corrected.
+
+    Runs alongside live solves: each counter is read before the database, and corrected by an increment
+    of (database count - stored count) only if it still holds the stored count (see _CORRECT_SCRIPT),
+    so increments landing meanwhile are neither lost nor counted twice. Counters that moved are read
+    again, challenge by challenge, for up to RECONCILE_ATTEMPTS passes; the rest wait for the next run.
+    """
+    redis = get_redis()
+    stored_solves = {int(challenge_id): int(count) for challenge_id, count in redis.hgetall(SOLVES_KEY).items()}
+    stored_attempts = {int(challenge_id) for challenge_id in redis.hkeys(ATTEMPTS_KEY)}
+    solve_counts = _solve_counts()
+    challenge_ids = set(Challenge.objects.values_list('id', flat=True))
+    # Deleted challenges get no new solves or attempts, so their statistics are simply dropped
+    deleted = (set(stored_solves) | stored_attempts) - challenge_ids
+
+    corrected = set()
+    pending = sorted(challenge_ids)
+    for attempt in range(RECONCILE_ATTEMPTS):
+        if attempt:
+            stored_solves = {
+                challenge_id: int(count or 0) for challenge_id, count in zip(pending, redis.hmget(SOLVES_KEY, pending))
+            }
+            solve_counts = _solve_counts(pending)
+        corrections = [
+            (challenge_id, stored_solves.get(challenge_id, 0), solve_counts.get(challenge_id, 0) - stored_solves.get(challenge_id, 0))
+            for challenge_id in pending
+            if stored_solves.get(challenge_id, 0) != solve_counts.get(challenge_id, 0)
+        ]
+        if not corrections:
+            break
+        applied = _correct_solve_counts(redis, corrections)
+        corrected |= applied
+        pending = [challenge_id for challenge_id, _, _ in corrections if challenge_id not in applied]
+        if not pending:
+            break
+
+    if deleted:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hdel(SOLVES_KEY, *deleted)
+        pipe.hdel(ATTEMPTS_KEY, *deleted)
+        pipe.delete(*[ATTEMPTERS_KEY.format(challenge_id) for challenge_id in deleted])
+        pipe.execute()
+
+    missing_attempts = challenge_ids - stored_attempts
+    if missing_attempts:
+        attempt_counts = dict(
+            Submission.objects.filter(challenge__in=missing_attempts).order_by().values('challenge')
+            .annotate(attempt_count=Count('id')).values_list('challenge', 'attempt_count')
+        )
+        # Every (challenge, user) pair in one query rather than one query per challenge
+        attempters = defaultdict(list)
+        pairs = Submission.objects.filter(challenge__in=attempt_counts).order_by().values_list('challenge', 'user').distinct()
+        for challenge_id, user_id in pairs.iterator(chunk_size=5000):
+            attempters[challenge_id].append(user_id)
+        pipe = redis.pipeline(transaction=False)
+        for challenge_id, attempt_count in attempt_counts.items():
+            pipe.hincrby(ATTEMPTS_KEY, challenge_id, attempt_count)
+            pipe.pfadd(ATTEMPTERS_KEY.format(challenge_id), *attempters[challenge_id])
+        pipe.execute()
+        corrected.update(attempt_counts)
+    return len(corrected)
@@ -0,0 +1,164 @@
+# api/connection_limits.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.settings import api_settings
+
+from .redis_client import get_redis, new_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Close code telling a client it was turned away for lack of capacity and should retry later. RFC 6455's
+# 1013 (try again later) is not allowed by ASGI servers such as daphne, so the application range mirrors it.
+CLOSE_TRY_LATER = 4013
+
+# Close code of a connection evicted for falling behind; the client should reconnect and resynchronize
+CLOSE_TOO_SLOW = 4008
+
+# Redis hash of ASGI process -> its latest gauges (see ConnectionRegistry.gauges())
+GAUGES_KEY = 'websockets:gauges'
+
+# Seconds between two reports of a process's gauges; reports older than GAUGES_STALE_AFTER are ignored
+GAUGES_INTERVAL = 10.0
+GAUGES_STALE_AFTER = 3 * GAUGES_INTERVAL
+
+# Defaults of settings.WEBSOCKET_LIMITS
+DEFAULT_LIMITS = {
+    'max_connections': 20000, # Per process
+    'max_connections_per_ip': 50, # Per process
+    'max_queued_frames': 64, # Frames waiting to be sent on one connection
+    'max_lag': 10.0, # Seconds a connection may go without catching up before it is evicted
+}
+
+
+def websocket_limit(name):
+    return getattr(settings, 'WEBSOCKET_LIMITS', {}).get(name, DEFAULT_LIMITS[name])
+
+
+def client_ip(scope):
+    """
+    The client address of a connection, taken from X-Forwarded-For behind NUM_PROXIES proxies,
+    exactly as DRF's throttles identify HTTP clients.
+    """
+    remote_addr = (scope.get('client') or ('',))[0]
+    xff = dict(scope.get('headers') or ()).get(b'x-forwarded-for')
+    num_proxies = api_settings.NUM_PROXIES
+    if xff is None or num_proxies == 0:
+        return remote_addr
+    xff = xff.decode('latin-1')
+    if num_proxies is None:
+        return ''.join(xff.split())
+    addrs = xff.split(',')
+    return addrs[-min(num_proxies, len(addrs))].strip()
+
+
+class ConnectionRegistry:
+    """
+    Tracks the WebSocket connections of this ASGI process, to turn away connections beyond the
+    'max_connections' and 'max_connections_per_ip' limits of settings.WEBSOCKET_LIMITS, and reports
+    the process's gauges to Redis every GAUGES_INTERVAL (see process_gauges()).
+
+    The limits are per process: admitting a connection costs no Redis round trip, and a crashed
+    process cannot leave stale counts behind. The deployment-wide cap is the sum over the processes.
+    """
+
+    def __init__(self):
+        self.process_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._connections = {} # consumer -> client address
+        self._per_ip = {}
+        self._loop = None
+        self._reporter = None
+        self.rejected = 0
+        self.evicted = 0
+        self.coalesced = 0
+
+    def admit(self, consumer, ip):
+        """
+        Registers the connection, or returns False if a limit is reached.
+        Must be called from the event loop serving it.
+        """
+        self._ensure_reporting()
+        if (len(self._connections) >= websocket_limit('max_connections')
+                or self._per_ip.get(ip, 0) >= websocket_limit('max_connections_per_ip')):
+            self.rejected += 1
+            return False
+        self._connections[consumer] = ip
+        self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        return True
+
+    def release(self, consumer):
+        ip = self._connections.pop(consumer, None)
+        if ip is None:
+            return
+        self._per_ip[ip] -= 1
+        if not self._per_ip[ip]:
+            del self._per_ip[ip]
+
+    def gauges(self):
+        depths = [len(consumer.outbox) for consumer in self._connections]
+        return {
+            'connections': len(self._connections),
+            'client_ips': len(self._per_ip),
+            'queued_frames': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'behind': sum(1 for consumer in self._connections if consumer.behind_since is not None),
+            'rejected': self.rejected,
+            'evicted': self.evicted,
+            'coalesced': self.coalesced,
+        }
+
+    def _ensure_reporting(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections of another event loop (e.g. an earlier test) are gone
+            self._connections = {}
+            self._per_ip = {}
+            self._loop = loop
+            self._reporter = None
+        if self._reporter is None or self._reporter.done():
+            self._reporter = loop.create_task(self._report())
+
+    async def _report(self):
+        client = new_async_redis()
+        try:
+            while True:
+                try:
+                    await client.hset(GAUGES_KEY, self.process_id, json.dumps({**self.gauges(), 'updated_at': time.time()}))
+                except RedisError:
+                    logger.warning("Could not report WebSocket gauges.", exc_info=True)
+                await asyncio.sleep(GAUGES_INTERVAL)
+        finally:
+            await client.aclose()
+
+
+connections = ConnectionRegistry()
+
+
+def process_gauges():
+    """
+    The latest gauges of every live ASGI process, and their totals. Reports of processes that
+    stopped reporting are dropped.
+    """
+    redis = get_redis()
+    now = time.time()
+    processes, stale = {}, []
+    for process_id, report in redis.hgetall(GAUGES_KEY).items():
+        gauges = json.loads(report)
+        if now - gauges['updated_at'] > GAUGES_STALE_AFTER:
+            stale.append(process_id)
+        else:
+            processes[process_id] = gauges
+    if stale:
+        redis.hdel(GAUGES_KEY, *stale)
+    totals = {
+        name: sum(gauges[name] for gauges in processes.values())
+        for name in ('connections', 'queued_frames', 'behind', 'rejected', 'evicted', 'coalesced')
+    }
+    totals['max_queue_depth'] = max((gauges['max_queue_depth'] for gauges in processes.values()), default=0)
+    return {'totals': totals, 'processes': processes}
@@ -1,49 +1,167 @@
 # api/consumers.py
-import json
+import asyncio
+import logging
+from collections import deque
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .authentication import get_scope_user
+from .broadcast import activity_broadcaster, notification_broadcaster, EVENT_ID_RE
+from .connection_limits import connections, client_ip, websocket_limit, CLOSE_TRY_LATER, CLOSE_TOO_SLOW
+from .leaderboard_stream import leaderboard_broadcaster
+from .notifications import user_group, team_group
+
+logger = logging.getLogger(__name__)
+
 
-class ActivityConsumer(AsyncWebsocketConsumer):
+class BroadcastConsumer(AsyncWebsocketConsumer):
     """
-    WebSocket consumer for broadcasting real-time activity (e.g., flag solves).
-    Clients connect to 'ws/activity/' and receive updates from the 'activity_feed' group.
+    Base for server-push consumers fed by a broadcaster (see api/broadcast.py).
+
+    Connections beyond the per-process and per-IP limits are closed with CLOSE_TRY_LATER right away.
+    The broadcaster never waits for a client: it queues frames in the connection's outbox, which a
+    writer task drains at the client's pace. When the outbox is full, its frames are replaced by the
+    broadcaster's resync frame (e.g. a fresh leaderboard snapshot), or, if it has none, the connection
+    is evicted with CLOSE_TOO_SLOW; so is a connection that has not caught up for 'max_lag' seconds.
+    An evicted activity client reconnects with '?last_id=' and gets exactly the events it missed.
     """
-    async def connect(self):
-        self.group_name = 'activity_feed'
+    # Frames come from the process-wide broadcaster, so connections need no channel layer subscription of their own
+    channel_layer_alias = None
+    broadcaster = None
 
-        # Join group
-        await self.channel_layer.group_add(
-            self.group_name,
-            self.channel_name
-        )
-        await self.accept()
-        print(f"WebSocket connected: {self.channel_name} joined {self.group_name}")
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbox = deque() # Frames waiting to be sent
+        self.behind_since = None # Loop time since which the outbox has not been empty
+        self.evicted = False
+        self._ready = asyncio.Event()
+        self._writer = None
+
+    async def websocket_connect(self, message):
+        if not connections.admit(self, client_ip(self.scope)):
+            # Accepting first lets the client see the close code; a refused handshake is a bare HTTP 403
+            await self.accept()
+            await self.close(code=CLOSE_TRY_LATER)
+            return
+        await super().websocket_connect(message)
+
+    async def accept(self, subprotocol=None, headers=None):
+        # A client that sent its token as a subprotocol must get that subprotocol back (see JWTAuthMiddleware)
+        await super().accept(subprotocol or self.scope.get('auth_subprotocol'), headers)
 
     async def disconnect(self, close_code):
-        # Leave group
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
-        print(f"WebSocket disconnected: {self.channel_name} left {self.group_name} with code {close_code}")
-
-    # Receive message from room group
-    async def feed_message(self, event):
+        connections.release(self)
+        self.broadcaster.discard(self)
+        if self._writer is not None:
+            self._writer.cancel()
+
+    def push(self, frame):
         """
-        Receives a 'feed.message' event from the channel layer and sends it to the WebSocket.
-        This method name must match the 'type' field in the group_send message (e.g., 'feed.message' calls 'feed_message').
+        Queues a frame for sending. Never waits, so one slow client cannot hold up the others.
         """
-        message = event['message']
+        if self.evicted:
+            return
+        now = asyncio.get_running_loop().time()
+        if self.behind_since is None:
+            self.behind_since = now
+        elif now - self.behind_since > websocket_limit('max_lag'):
+            self.evict()
+            return
+        if len(self.outbox) >= websocket_limit('max_queued_frames'):
+            resync = self.broadcaster.resync_frame()
+            if resync is None:
+                self.evict()
+                return
+            self.outbox.clear()
+            connections.coalesced += 1
+            frame = resync
+        self.outbox.append(frame)
+        self._ready.set()
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write())
 
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'activity_update',
-            'message': message
-        }))
-        # print(f"Sent message to WebSocket {self.channel_name}: {message}")
+    def evict(self):
+        """
+        Stops delivering to a connection that fell behind and closes it with CLOSE_TOO_SLOW.
+        """
+        self.evicted = True
+        connections.evicted += 1
+        self.broadcaster.discard(self)
+        self.outbox.clear()
+        self.behind_since = None
+        if self._writer is not None:
+            self._writer.cancel()
+        logger.info("Evicting slow WebSocket client %s from %s.", client_ip(self.scope), self.scope.get('path'))
+        asyncio.ensure_future(self.close(code=CLOSE_TOO_SLOW))
+
+    async def _write(self):
+        try:
+            while True:
+                while self.outbox:
+                    await self.send(text_data=self.outbox.popleft())
+                self.behind_since = None
+                self._ready.clear()
+                await self._ready.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The connection is gone; its disconnect handler may never run
+            self.broadcaster.discard(self)
 
     async def receive(self, text_data=None, bytes_data=None):
-        # We don't expect clients to send messages to this consumer,
+        # We don't expect clients to send messages to these consumers,
         # but if they do, we can log it or ignore it.
-        # print(f"Received message from WebSocket {self.channel_name}: {text_data}")
         pass
+
+
+class ActivityConsumer(BroadcastConsumer):
+    """
+    WebSocket consumer for broadcasting real-time activity (e.g., flag solves).
+    Clients connect to 'ws/activity/' and receive the frames of the activity broadcaster (see api/broadcast.py):
+    'activity_update' frames with one event, or 'activity_batch' frames with the events of a burst.
+    On connect, the latest events are replayed as one 'activity_batch' frame; a reconnecting client passes
+    '?last_id=<id of the last event it saw>' to get exactly the events it missed instead.
+    """
+    broadcaster = activity_broadcaster
+
+    async def connect(self):
+        await self.accept()
+        last_id = parse_qs(self.scope.get('query_string', b'').decode()).get('last_id', [None])[0]
+        await self.broadcaster.attach(self, last_id if last_id and EVENT_ID_RE.match(last_id) else None)
+
+
+class LeaderboardConsumer(BroadcastConsumer):
+    """
+    WebSocket consumer for the live team leaderboard. Clients connect to 'ws/leaderboard/', get a
+    'leaderboard_snapshot' frame and then 'leaderboard_delta' frames listing only the teams that moved
+    (see LeaderboardBroadcaster in api/leaderboard_stream.py). A reconnecting client simply gets a new snapshot.
+    """
+    broadcaster = leaderboard_broadcaster
+
+    async def connect(self):
+        await self.accept()
+        await self.broadcaster.attach(self)
+
+
+class NotificationConsumer(BroadcastConsumer):
+    """
+    WebSocket consumer for a user's private notifications: their hint unlocks, write-up approvals and team
+    changes, and their teammates' solves and membership changes (see api/notifications.py).
+    Clients connect to 'ws/notifications/' with an access token; other connections are closed with code 4401.
+    """
+    broadcaster = notification_broadcaster
+
+    async def connect(self):
+        # The only consumer that needs the user; it comes from the user cache, not a query per connect
+        user = await get_scope_user(self.scope)
+        if not user.is_authenticated:
+            # Accepted first so the client sees the close code, as for turned-away connections
+            await self.accept()
+            await self.close(code=4401)
+            return
+        await self.accept()
+        groups = [user_group(user.pk)]
+        if user.team_id is not None:
+            groups.append(team_group(user.team_id))
+        self.broadcaster.join(self, *groups)
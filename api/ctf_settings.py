@@ -0,0 +1,126 @@
+# api/ctf_settings.py
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from .models import CTFSetting
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Pub/sub channel on which every save of the settings is announced to all worker processes
+INVALIDATION_CHANNEL = 'ctf_settings:invalidate'
+
+# Upper bound on staleness if an invalidation message is missed (e.g. while Redis was unreachable)
+SETTINGS_CACHE_TTL = 5.0
+
+# Pause before resubscribing after the connection to Redis was lost
+RECONNECT_DELAY = 1.0
+
+
+class SettingsCache:
+    """
+    Process-local cache of the CTFSetting singleton.
+
+    Reads are a lock-free attribute check. Saves are announced on a Redis pub/sub channel, and a
+    listener thread in every process (started lazily, once per forked worker) drops the cached
+    instance as soon as the message arrives, so changes propagate within one Redis round trip.
+    The TTL only bounds staleness when messages are lost.
+    """
+
+    def __init__(self, ttl=SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self._entry = None # (instance, loaded at)
+        self._generation = 0 # Bumped by clear(), so a load that raced an invalidation is not kept
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+
+    def get(self):
+        """
+        Returns the cached settings. The instance is shared between requests and must be treated as read-only;
+        use CTFSetting.load() to obtain an instance to modify.
+        """
+        self._ensure_listening()
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        generation = self._generation
+        instance = CTFSetting.load()
+        with self._lock:
+            if generation == self._generation:
+                self._entry = (instance, time.monotonic())
+        return instance
+
+    async def aget(self):
+        # A fresh entry is returned without leaving the event loop; loading one needs a query
+        entry = self._entry
+        if entry is not None and self._pid == os.getpid() and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return await sync_to_async(self.get)()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entry = None
+
+    def _ensure_listening(self):
+        if self._pid == os.getpid() and self._listener is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._listener is not None:
+                return
+            self._pid = os.getpid()
+            self._generation += 1
+            self._entry = None # Never trust an entry inherited from the parent process
+            self._listener = threading.Thread(target=self._listen, name='ctf-settings-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything published while unsubscribed was missed
+                self.clear()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.clear()
+            except RedisError:
+                logger.warning("Settings invalidation listener lost Redis; resubscribing.", exc_info=True)
+            except Exception:
+                logger.exception("Settings invalidation listener failed; resubscribing.")
+            self.clear()
+            time.sleep(RECONNECT_DELAY)
+
+
+settings_cache = SettingsCache()
+
+
+def get_ctf_settings():
+    """
+    The current CTF settings, read from the process-local cache (see SettingsCache).
+    """
+    return settings_cache.get()
+
+
+async def aget_ctf_settings():
+    return await settings_cache.aget()
+
+
+def announce_settings_change():
+    """
+    Drops the cached settings in every worker process once the surrounding transaction commits.
+    Saves of the model do this through a signal; code that changes the row with QuerySet.update()
+    must call it itself.
+    """
+    def publish():
+        settings_cache.clear()
+        get_redis().publish(INVALIDATION_CHANNEL, 1)
+
+    transaction.on_commit(publish, robust=True)
@@ -0,0 +1,133 @@
+# api/flags.py
+import hashlib
+import hmac
+import re
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+
+from .models import Challenge, Flag
+
+# Challenges whose flag material is kept in memory per process
+FLAG_CACHE_SIZE = 4096
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode('utf-8')).digest()
+
+
+def normalize_flag(value, case_sensitive=False):
+    """
+    The normalization applied to both stored and submitted flags: surrounding whitespace is ignored,
+    and so is letter case unless the flag is case-sensitive.
+    """
+    value = value.strip()
+    return value if case_sensitive else value.lower()
+
+
+class FlagMatcher:
+    """
+    Pre-normalized flag material for one challenge: SHA-256 digests of the static flags and
+    compiled regular expressions. Only digests are kept, never the plaintext flags.
+    """
+    __slots__ = ('version', 'digests', 'patterns')
+
+    def __init__(self, version, static_flags, regex_flags):
+        self.version = version
+        # (case_sensitive, digest) pairs
+        self.digests = [(case_sensitive, _digest(normalize_flag(flag, case_sensitive))) for flag, case_sensitive in static_flags]
+        self.patterns = [
+            re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+            for pattern, case_sensitive in regex_flags
+        ]
+
+    def matches(self, submitted):
+        submitted_digests = {
+            False: _digest(normalize_flag(submitted)),
+            True: _digest(normalize_flag(submitted, case_sensitive=True)),
+        }
+        # Compare against every static flag in constant time, without stopping at the first match
+        matched = False
+        for case_sensitive, digest in self.digests:
+            matched |= hmac.compare_digest(submitted_digests[case_sensitive], digest)
+        if matched:
+            return True
+        text = submitted.strip()
+        return any(pattern.fullmatch(text) for pattern in self.patterns)
+
+
+class FlagCache:
+    """
+    Process-local LRU cache of FlagMatcher objects keyed by challenge id.
+    Entries are tagged with the challenge's updated_at, which every admin save and every Flag
+    change bumps (see api/signals.py), so other worker processes notice edits on their next
+    submission without any extra query; invalidate() drops an entry in this process right away.
+    """
+
+    def __init__(self, max_size=FLAG_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, challenge):
+        return self._cached(challenge) or self._store(challenge, self._load(challenge))
+
+    async def aget(self, challenge):
+        """
+        get() for async views; a miss loads the flags outside the event loop.
+        """
+        return self._cached(challenge) or self._store(challenge, await sync_to_async(self._load)(challenge))
+
+    def _cached(self, challenge):
+        with self._lock:
+            matcher = self._entries.get(challenge.pk)
+            if matcher is not None and matcher.version == challenge.updated_at:
+                self._entries.move_to_end(challenge.pk)
+                return matcher
+        return None
+
+    def _store(self, challenge, matcher):
+        with self._lock:
+            self._entries[challenge.pk] = matcher
+            self._entries.move_to_end(challenge.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return matcher
+
+    def invalidate(self, challenge_id=None):
+        with self._lock:
+            if challenge_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(challenge_id, None)
+
+    @staticmethod
+    def _load(challenge):
+        primary_flag = Challenge.objects.filter(pk=challenge.pk).values_list('flag', flat=True).first() or ''
+        static_flags = [(primary_flag, False)] if primary_flag.strip() else []
+        regex_flags = []
+        for flag_type, content, case_sensitive in Flag.objects.filter(challenge_id=challenge.pk).values_list(
+            'flag_type', 'content', 'case_sensitive'
+        ):
+            (regex_flags if flag_type == 'regex' else static_flags).append((content, case_sensitive))
+        return FlagMatcher(challenge.updated_at, static_flags, regex_flags)
+
+
+flag_cache = FlagCache()
+
+
+def check_flag(challenge, submitted):
+    """
+    Returns True if `submitted` matches any of the challenge's accepted flags.
+    `challenge` only needs its pk and updated_at loaded; the flags themselves come from the cache.
+    """
+    return flag_cache.get(challenge).matches(submitted)
+
+
+async def acheck_flag(challenge, submitted):
+    return (await flag_cache.aget(challenge)).matches(submitted)
+
+
+def invalidate_flags(challenge_id=None):
+    flag_cache.invalidate(challenge_id)
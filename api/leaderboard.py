@@ -0,0 +1,456 @@
+# api/leaderboard.py
+import datetime
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import User, Team, Solve
+from .redis_client import get_redis, get_async_redis
+from .timeline import team_timeline
+
+# Each ranking is a Redis sorted set whose member scores pack (score, last solve time) into one number:
+#   score * TIEBREAK_SPAN + (TIEBREAK_SPAN - 1 - last_solve_epoch_seconds)
+# A higher score ranks first and, on equal score, the earlier last solve (to the second) wins. Members that never
+# solved anything get a tie-break of 0 and rank after every solver with the same score.
+# Both parts stay well below 2**53, so the packed value is exact in Redis' double-precision scores.
+TIEBREAK_SPAN = 2 ** 32
+
+# Atomically applies a score delta (and optionally a new solve time) and re-ranks the member.
+# KEYS: ranking zset, scores hash, last-solve hash. ARGV: member, delta, solve timestamp or '', TIEBREAK_SPAN.
+_INCR_SCRIPT = """
+local score = redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+local last = redis.call('HGET', KEYS[3], ARGV[1])
+if ARGV[3] ~= '' and (not last or tonumber(ARGV[3]) > tonumber(last)) then
+    last = ARGV[3]
+    redis.call('HSET', KEYS[3], ARGV[1], last)
+end
+local span = tonumber(ARGV[4])
+local tiebreak = 0
+if last then
+    tiebreak = span - 1 - math.floor(tonumber(last))
+end
+redis.call('ZADD', KEYS[1], string.format('%.0f', score * span + tiebreak), ARGV[1])
+return score
+"""
+
+# Announces a change of the ranking on its pub/sub channel, numbered by a version counter. The notice carries the
+# member's state as stored when it is sent, so notices are ordered by version and always describe the latest state:
+#   {"version": v, "id": id, "score": s, "last_solve": epoch seconds or null, "renamed": bool}
+#   {"version": v, "id": id, "removed": true}
+#   {"version": v, "reset": true} (the whole ranking changed; reload it)
+# KEYS: ranking zset, scores hash, last-solve hash, version counter. ARGV: member or '', 'true'/'false'/'reset', channel.
+_ANNOUNCE_SCRIPT = """
+local version = redis.call('INCR', KEYS[4])
+local message
+if ARGV[2] == 'reset' then
+    message = '{"version": ' .. version .. ', "reset": true}'
+elseif not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    message = '{"version": ' .. version .. ', "id": ' .. ARGV[1] .. ', "removed": true}'
+else
+    local score = redis.call('HGET', KEYS[2], ARGV[1]) or '0'
+    local last = redis.call('HGET', KEYS[3], ARGV[1]) or 'null'
+    message = '{"version": ' .. version .. ', "id": ' .. ARGV[1] .. ', "score": ' .. score
+        .. ', "last_solve": ' .. last .. ', "renamed": ' .. ARGV[2] .. '}'
+end
+redis.call('PUBLISH', ARGV[3], message)
+return version
+"""
+
+# Channel on which every change of the team ranking is announced (see api/leaderboard_stream.py)
+TEAM_CHANGES_CHANNEL = 'leaderboard:teams:changes'
+
+# Rows of a ranked listing served when '?limit=' is not given, and the largest page served at once
+LEADERBOARD_PAGE_SIZE = 100
+LEADERBOARD_PAGE_MAX = 500
+
+
+def _to_timestamp(value):
+    return repr(value.timestamp()) if value is not None else None
+
+
+def from_timestamp(value):
+    return datetime.datetime.fromtimestamp(float(value), tz=datetime.timezone.utc) if value is not None else None
+
+
+def encode_rank_score(score, last_solve_time):
+    """
+    Packs a score and last solve time into the sorted-set score used for ordering.
+    """
+    tiebreak = TIEBREAK_SPAN - 1 - int(last_solve_time.timestamp()) if last_solve_time is not None else 0
+    return score * TIEBREAK_SPAN + tiebreak
+
+
+class Leaderboard:
+    """
+    A ranking of members (teams, players) by score, tie-broken by earliest last solve.
+    Writes are O(log n) and reads are O(log n + page size); nothing is aggregated at read time.
+    With a `channel`, every write is announced there with a version number (see _ANNOUNCE_SCRIPT).
+    """
+
+    def __init__(self, name, channel=None):
+        self.ranking_key = f'leaderboard:{name}'
+        self.scores_key = f'leaderboard:{name}:scores'
+        self.last_solve_key = f'leaderboard:{name}:last_solve'
+        self.version_key = f'leaderboard:{name}:version'
+        self.channel = channel
+        self._incr_script = None
+        self._announce_script = None
+
+    @property
+    def keys(self):
+        return [self.ranking_key, self.scores_key, self.last_solve_key]
+
+    def incr(self, member_id, delta, solved_at=None):
+        """
+        Adds `delta` to a member's score and, if `solved_at` is given and is later than the
+        recorded last solve, moves the last solve time forward. Returns the new score.
+        """
+        if self._incr_script is None:
+            self._incr_script = get_redis().register_script(_INCR_SCRIPT)
+        score = int(self._incr_script(
+            keys=self.keys,
+            args=[member_id, int(delta), _to_timestamp(solved_at) or '', TIEBREAK_SPAN],
+        ))
+        self.announce(member_id)
+        return score
+
+    def announce(self, member_id=None, renamed=False):
+        """
+        Publishes the member's current entry (or, without a member, a reset of the whole ranking) on the
+        leaderboard's channel. `renamed` tells listeners to reload the member's name.
+        """
+        if self.channel is None:
+            return
+        if self._announce_script is None:
+            self._announce_script = get_redis().register_script(_ANNOUNCE_SCRIPT)
+        if member_id is None:
+            args = ['', 'reset', self.channel]
+        else:
+            args = [int(member_id), 'true' if renamed else 'false', self.channel]
+        self._announce_script(keys=[*self.keys, self.version_key], args=args)
+
+    def set(self, member_id, score, last_solve_time):
+        """
+        Overwrites a member's entry with absolute values.
+        """
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.hset(self.scores_key, member_id, int(score))
+        if last_solve_time is not None:
+            pipe.hset(self.last_solve_key, member_id, _to_timestamp(last_solve_time))
+        else:
+            pipe.hdel(self.last_solve_key, member_id)
+        pipe.zadd(self.ranking_key, {member_id: encode_rank_score(int(score), last_solve_time)})
+        pipe.execute()
+        self.announce(member_id)
+
+    def remove(self, member_id):
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.zrem(self.ranking_key, member_id)
+        pipe.hdel(self.scores_key, member_id)
+        pipe.hdel(self.last_solve_key, member_id)
+        pipe.execute()
+        self.announce(member_id)
+
+    def replace(self, standings):
+        """
+        Atomically replaces the whole ranking with `standings`, a mapping of
+        member id -> (score, last solve time). Returns the number of members written.
+        """
+        tmp_keys = [f'{key}:rebuild' for key in self.keys]
+        redis = get_redis()
+        pipe = redis.pipeline(transaction=False)
+        pipe.delete(*tmp_keys)
+        for member_id, (score, last_solve_time) in standings.items():
+            pipe.zadd(tmp_keys[0], {member_id: encode_rank_score(int(score), last_solve_time)})
+            pipe.hset(tmp_keys[1], member_id, int(score))
+            if last_solve_time is not None:
+                pipe.hset(tmp_keys[2], member_id, _to_timestamp(last_solve_time))
+        pipe.execute()
+
+        # RENAME fails on missing keys, so only swap in the temporary keys that were populated.
+        populated = [bool(standings), bool(standings), any(last for _, last in standings.values())]
+        pipe = redis.pipeline(transaction=True)
+        pipe.delete(*self.keys)
+        for is_populated, tmp_key, key in zip(populated, tmp_keys, self.keys):
+            if is_populated:
+                pipe.rename(tmp_key, key)
+        pipe.execute()
+        self.announce()
+        return len(standings)
+
+    def _entries(self, member_ids, first_rank=None):
+        if not member_ids:
+            return []
+        pipe = get_redis().pipeline(transaction=False)
+        self._queue_entry_reads(pipe, member_ids)
+        return self._parse_entries(member_ids, *pipe.execute(), first_rank)
+
+    async def _aentries(self, member_ids, first_rank=None):
+        if not member_ids:
+            return []
+        pipe = get_async_redis().pipeline(transaction=False)
+        self._queue_entry_reads(pipe, member_ids)
+        return self._parse_entries(member_ids, *await pipe.execute(), first_rank)
+
+    def _queue_entry_reads(self, pipe, member_ids):
+        pipe.hmget(self.scores_key, member_ids)
+        pipe.hmget(self.last_solve_key, member_ids)
+
+    @staticmethod
+    def _parse_entries(member_ids, scores, last_solves, first_rank):
+        return [
+            {
+                'id': int(member_id),
+                'rank': first_rank + index if first_rank is not None else None,
+                'score': int(score or 0),
+                'last_solve_time': from_timestamp(last_solve),
+            }
+            for index, (member_id, score, last_solve) in enumerate(zip(member_ids, scores, last_solves))
+        ]
+
+    def page(self, offset=0, limit=None):
+        """
+        Returns ranked entries starting at `offset` (0-based). `limit=None` returns the rest of the ranking.
+        """
+        stop = -1 if limit is None else offset + limit - 1
+        member_ids = get_redis().zrevrange(self.ranking_key, offset, stop)
+        return self._entries(member_ids, first_rank=offset + 1)
+
+    async def apage(self, offset=0, limit=None):
+        stop = -1 if limit is None else offset + limit - 1
+        member_ids = await get_async_redis().zrevrange(self.ranking_key, offset, stop)
+        return await self._aentries(member_ids, first_rank=offset + 1)
+
+    def rank(self, member_id):
+        """
+        Returns the member's 1-based rank, or None if it is not ranked.
+        """
+        position = get_redis().zrevrank(self.ranking_key, member_id)
+        return position + 1 if position is not None else None
+
+    def entry(self, member_id):
+        """
+        Returns a single member's ranked entry in one round trip, or None if it is not ranked.
+        """
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zrevrank(self.ranking_key, member_id)
+        pipe.hget(self.scores_key, member_id)
+        pipe.hget(self.last_solve_key, member_id)
+        position, score, last_solve = pipe.execute()
+        if position is None:
+            return None
+        return {
+            'id': int(member_id),
+            'rank': position + 1,
+            'score': int(score or 0),
+            'last_solve_time': from_timestamp(last_solve),
+        }
+
+    def count(self):
+        return get_redis().zcard(self.ranking_key)
+
+    def check(self, standings):
+        """
+        Compares the stored ranking against `standings` (member id -> (score, last solve time))
+        computed from the database. Returns a list of human-readable inconsistencies.
+        """
+        redis = get_redis()
+        pipe = redis.pipeline(transaction=False)
+        pipe.zrange(self.ranking_key, 0, -1, withscores=True)
+        pipe.hgetall(self.scores_key)
+        pipe.hgetall(self.last_solve_key)
+        ranking, scores, last_solves = pipe.execute()
+        ranking = {int(member_id): int(rank_score) for member_id, rank_score in ranking}
+
+        problems = []
+        for member_id in sorted(set(ranking) - set(standings)):
+            problems.append(f"{member_id}: ranked but missing from the database")
+        for member_id, (score, last_solve_time) in sorted(standings.items()):
+            if member_id not in ranking:
+                problems.append(f"{member_id}: missing from the ranking")
+                continue
+            stored_score = int(scores.get(str(member_id), 0))
+            stored_last_solve = from_timestamp(last_solves.get(str(member_id)))
+            if stored_score != score:
+                problems.append(f"{member_id}: score is {stored_score}, expected {score}")
+            if stored_last_solve != last_solve_time and (
+                stored_last_solve is None or last_solve_time is None
+                or abs((stored_last_solve - last_solve_time).total_seconds()) > 1e-3
+            ):
+                problems.append(f"{member_id}: last solve is {stored_last_solve}, expected {last_solve_time}")
+            if ranking[member_id] != encode_rank_score(score, last_solve_time):
+                problems.append(f"{member_id}: ranking position does not match its score")
+        return problems
+
+
+team_leaderboard = Leaderboard('teams', channel=TEAM_CHANGES_CHANNEL)
+player_leaderboard = Leaderboard('players')
+
+
+def team_rows(offset=0, limit=None):
+    """
+    A page of the team leaderboard as LeaderboardSerializer rows, with team names attached by a
+    single primary-key lookup, so the cost depends only on the page size.
+    """
+    if limit == 0:
+        return []
+    entries = team_leaderboard.page(offset, limit)
+    names = dict(Team.objects.filter(pk__in=[entry['id'] for entry in entries]).values_list('id', 'name'))
+    return _team_rows(entries, names)
+
+
+async def ateam_rows(offset=0, limit=None):
+    if limit == 0:
+        return []
+    entries = await team_leaderboard.apage(offset, limit)
+    names = {
+        team_id: name
+        async for team_id, name in Team.objects.filter(pk__in=[entry['id'] for entry in entries]).values_list('id', 'name')
+    }
+    return _team_rows(entries, names)
+
+
+def _team_rows(entries, names):
+    return [
+        {
+            'id': entry['id'],
+            'name': names[entry['id']],
+            'total_score': entry['score'],
+            'last_solve_time': entry['last_solve_time'],
+        }
+        for entry in entries
+        if entry['id'] in names # Skip teams deleted since the entry was read
+    ]
+
+
+def player_rows(offset=0, limit=None):
+    """
+    A page of the player leaderboard as PlayerLeaderboardSerializer rows, with usernames attached by a
+    single primary-key lookup.
+    """
+    if limit == 0:
+        return []
+    entries = player_leaderboard.page(offset, limit)
+    usernames = dict(User.objects.filter(pk__in=[entry['id'] for entry in entries]).values_list('id', 'username'))
+    return [
+        {
+            'id': entry['id'],
+            'username': usernames[entry['id']],
+            'score': entry['score'],
+            'last_solve_time': entry['last_solve_time'],
+        }
+        for entry in entries
+        if entry['id'] in usernames # Skip users deleted since the entry was read
+    ]
+
+
+def team_standings_from_db(team_ids=None):
+    """
+    Aggregates team totals (sum of member scores) and last solve times from the database.
+    This is the expensive query the leaderboard replaces; it only runs for rebuilds, checks
+    and single-team refreshes.
+    """
+    teams = Team.objects.all()
+    solves = Solve.objects.filter(user__team__isnull=False)
+    if team_ids is not None:
+        teams = teams.filter(pk__in=team_ids)
+        solves = solves.filter(user__team__in=team_ids)
+    # Sum and Max are aggregated separately; joining members and solves in one query would
+    # multiply every member's score by their number of solves.
+    scores = dict(teams.annotate(total_score=Coalesce(Sum('members__score'), 0)).values_list('id', 'total_score'))
+    last_solves = dict(
+        solves.order_by().values('user__team').annotate(last_solve_time=Max('solved_at'))
+        .values_list('user__team', 'last_solve_time')
+    )
+    return {team_id: (score, last_solves.get(team_id)) for team_id, score in scores.items()}
+
+
+def player_standings_from_db(user_ids=None):
+    """
+    Reads player scores and last solve times from the database for rebuilds, checks and single-player refreshes.
+    Staff and deactivated accounts are not ranked.
+    """
+    users = User.objects.filter(is_active=True, is_staff=False)
+    solves = Solve.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        solves = solves.filter(user__in=user_ids)
+    scores = dict(users.values_list('id', 'score'))
+    last_solves = dict(
+        solves.order_by().values('user').annotate(last_solve_time=Max('solved_at'))
+        .values_list('user', 'last_solve_time')
+    )
+    return {user_id: (score, last_solves.get(user_id)) for user_id, score in scores.items()}
+
+
+def rebuild_team_leaderboard():
+    return team_leaderboard.replace(team_standings_from_db())
+
+
+def check_team_leaderboard():
+    return team_leaderboard.check(team_standings_from_db())
+
+
+def rebuild_player_leaderboard():
+    return player_leaderboard.replace(player_standings_from_db())
+
+
+def check_player_leaderboard():
+    return player_leaderboard.check(player_standings_from_db())
+
+
+def record_score(user, delta, solved_at=None):
+    """
+    Applies a change to a user's score to the player and team rankings, and appends the team's new
+    total to its score timeline, once the surrounding transaction commits.
+    Failures are logged rather than raised; `manage.py rebuild_leaderboard` repairs any drift.
+    """
+    user_id, team_id = user.pk, user.team_id
+    ranked = user.is_active and not user.is_staff # As in player_standings_from_db()
+
+    def apply():
+        if ranked:
+            player_leaderboard.incr(user_id, delta, solved_at)
+        if team_id is not None:
+            team_score = team_leaderboard.incr(team_id, delta, solved_at)
+            team_timeline.append(team_id, solved_at or timezone.now(), team_score)
+
+    transaction.on_commit(apply, robust=True)
+
+
+def _refresh_player(user_id):
+    standing = player_standings_from_db([user_id]).get(user_id)
+    if standing is None:
+        player_leaderboard.remove(user_id)
+    else:
+        player_leaderboard.set(user_id, *standing)
+
+
+def refresh_players(*user_ids):
+    """
+    Recomputes the given players' entries from the database once the surrounding transaction commits.
+    Used when a score is edited directly rather than changed by a solve, hint or write-up.
+    """
+    for user_id in {user_id for user_id in user_ids if user_id is not None}:
+        transaction.on_commit(lambda user_id=user_id: _refresh_player(user_id), robust=True)
+
+
+def _refresh_team(team_id):
+    standing = team_standings_from_db([team_id]).get(team_id)
+    if standing is None:
+        team_leaderboard.remove(team_id)
+        team_timeline.remove(team_id)
+    else:
+        team_leaderboard.set(team_id, *standing)
+        team_timeline.append(team_id, timezone.now(), standing[0])
+
+
+def refresh_teams(*team_ids):
+    """
+    Recomputes the given teams' entries from the database once the surrounding transaction commits.
+    Used when membership changes, which moves a member's whole score and solve history between teams.
+    """
+    for team_id in {team_id for team_id in team_ids if team_id is not None}:
+        transaction.on_commit(lambda team_id=team_id: _refresh_team(team_id), robust=True)
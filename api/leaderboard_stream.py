@@ -0,0 +1,193 @@
+# api/leaderboard_stream.py
+import bisect
+import json
+
+from channels.db import database_sync_to_async
+from rest_framework.renderers import JSONRenderer
+
+from .broadcast import Broadcaster
+from .leaderboard import team_leaderboard, encode_rank_score, from_timestamp
+from .models import Team
+from .scoreboard_freeze import SNAPSHOT_KEY
+from .serializers import LeaderboardSerializer
+
+
+def _render(data):
+    return JSONRenderer().render(data).decode('utf-8')
+
+
+def _team_names(team_ids=None):
+    teams = Team.objects.all() if team_ids is None else Team.objects.filter(pk__in=team_ids)
+    return dict(teams.values_list('id', 'name'))
+
+
+class RankingMirror:
+    """
+    In-memory copy of the team ranking, ordered exactly like the Redis sorted set (rank score, then
+    member id as a string, both descending). Kept in step by applying the ranking's change notices.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.entries = {} # team id -> (name, score, last solve time)
+        self._order = [] # (rank score, str(team id)), ascending
+
+    def load(self, version, entries):
+        self.version = version
+        self.entries = dict(entries)
+        self._order = sorted(self._key(team_id) for team_id in self.entries)
+
+    def _key(self, team_id):
+        _, score, last_solve_time = self.entries[team_id]
+        return encode_rank_score(score, last_solve_time), str(team_id)
+
+    def rank(self, team_id):
+        return len(self._order) - bisect.bisect_left(self._order, self._key(team_id))
+
+    def put(self, team_id, name, score, last_solve_time):
+        """
+        Stores a team's entry. Returns its new rank, or None when nothing visible changed.
+        """
+        entry = (name, score, last_solve_time)
+        if self.entries.get(team_id) == entry:
+            return None
+        self.remove(team_id)
+        self.entries[team_id] = entry
+        bisect.insort(self._order, self._key(team_id))
+        return self.rank(team_id)
+
+    def remove(self, team_id):
+        """
+        Drops a team. Returns whether it was ranked.
+        """
+        if team_id not in self.entries:
+            return False
+        del self._order[bisect.bisect_left(self._order, self._key(team_id))]
+        del self.entries[team_id]
+        return True
+
+    def row(self, team_id):
+        name, score, last_solve_time = self.entries[team_id]
+        return {'id': team_id, 'name': name, 'total_score': score, 'last_solve_time': last_solve_time}
+
+    def rows(self):
+        return [self.row(int(team_id)) for _, team_id in reversed(self._order)]
+
+
+class LeaderboardBroadcaster(Broadcaster):
+    """
+    Streams the team leaderboard to WebSocket consumers as a versioned snapshot followed by deltas.
+
+    Every change of the ranking is announced on TEAM_CHANGES_CHANNEL (see Leaderboard.announce()).
+    Each ASGI process keeps a RankingMirror in step with those notices, so a connecting client gets
+    the snapshot from memory, and after each coalescing window connected clients get one frame with
+    the teams that moved, each with its new rank. Applying the changes in order (take the team out,
+    put it back at `rank`, or leave it out when `rank` is null) reproduces the ranking at `version`.
+    A missed notice (e.g. Redis reconnect) or a reset (rebuild, freeze, unfreeze) reloads the mirror
+    and resends the snapshot. While the scoreboard is frozen, the snapshot is the frozen leaderboard
+    and no deltas are sent.
+
+    Frames:
+        {"type": "leaderboard_snapshot", "version": v, "frozen": bool, "rankings": [rows]}
+        {"type": "leaderboard_delta", "version": v, "changes": [{"rank": r or null, "id": ..., row fields}]}
+    """
+
+    def __init__(self, leaderboard, **kwargs):
+        super().__init__(
+            leaderboard.channel, update_type='leaderboard_delta', batch_type='leaderboard_delta', **kwargs,
+        )
+        self.leaderboard = leaderboard
+        self.mirror = RankingMirror()
+        self.frozen_rankings = None # Pre-encoded frozen leaderboard while the scoreboard is frozen
+        self._snapshot_frame = None
+
+    async def attach(self, consumer):
+        # The snapshot is read from the mirror without awaiting anything, so no delta can slip in between
+        await self.wait_subscribed()
+        await super().attach(consumer)
+
+    async def initial_frame(self):
+        return self.snapshot_frame()
+
+    def snapshot_frame(self):
+        if self._snapshot_frame is None:
+            rankings = self.frozen_rankings
+            if rankings is None:
+                rankings = _render(LeaderboardSerializer(self.mirror.rows(), many=True).data)
+            self._snapshot_frame = (
+                f'{{"type": "leaderboard_snapshot", "version": {self.mirror.version}, '
+                f'"frozen": {"true" if self.frozen_rankings is not None else "false"}, "rankings": {rankings}}}'
+            )
+        return self._snapshot_frame
+
+    def resync_frame(self):
+        # A client that fell behind skips the deltas it has not received yet
+        return self.snapshot_frame()
+
+    async def on_subscribed(self):
+        # Anything announced while unsubscribed was missed
+        await self._reload()
+
+    async def _reload(self):
+        # The version is read first: entries read afterwards can only be newer, and replaying the
+        # notices after that version on top of them converges on the same ranking.
+        version = int(await self._client.get(self.leaderboard.version_key) or 0)
+        pipe = self._client.pipeline(transaction=True)
+        pipe.zrange(self.leaderboard.ranking_key, 0, -1)
+        pipe.hgetall(self.leaderboard.scores_key)
+        pipe.hgetall(self.leaderboard.last_solve_key)
+        pipe.hget(SNAPSHOT_KEY, 'leaderboard')
+        team_ids, scores, last_solves, frozen_rankings = await pipe.execute()
+        names = await database_sync_to_async(_team_names)()
+        self.mirror.load(version, {
+            int(team_id): (names[int(team_id)], int(scores.get(team_id, 0)), from_timestamp(last_solves.get(team_id)))
+            for team_id in team_ids
+            if int(team_id) in names # Skip teams deleted since the ranking was read
+        })
+        self.frozen_rankings = frozen_rankings
+        self._snapshot_frame = None
+
+    async def deliver(self, payloads):
+        changes, reloaded, version = [], False, self.mirror.version
+        for payload in payloads:
+            notice = json.loads(payload)
+            if notice['version'] <= self.mirror.version:
+                continue # Already part of the loaded ranking
+            if notice.get('reset') or notice['version'] != self.mirror.version + 1:
+                await self._reload()
+                changes, reloaded = [], True
+                continue
+            change = await self._apply(notice)
+            self.mirror.version = notice['version']
+            if change is not None:
+                changes.append(change)
+
+        if self.mirror.version != version:
+            self._snapshot_frame = None
+        if reloaded:
+            self._fan_out(self.snapshot_frame())
+        if changes and self.frozen_rankings is None:
+            self._fan_out(
+                f'{{"type": "leaderboard_delta", "version": {self.mirror.version}, "changes": {_render(changes)}}}'
+            )
+
+    async def _apply(self, notice):
+        """
+        Applies one change notice to the mirror. Returns the change to send, or None.
+        """
+        team_id = notice['id']
+        if notice.get('removed'):
+            return {'rank': None, 'id': team_id} if self.mirror.remove(team_id) else None
+        if team_id in self.mirror.entries and not notice['renamed']:
+            name = self.mirror.entries[team_id][0]
+        else:
+            name = (await database_sync_to_async(_team_names)([team_id])).get(team_id)
+            if name is None:
+                return {'rank': None, 'id': team_id} if self.mirror.remove(team_id) else None
+        rank = self.mirror.put(team_id, name, notice['score'], from_timestamp(notice['last_solve']))
+        if rank is None:
+            return None
+        return {'rank': rank, **LeaderboardSerializer(self.mirror.row(team_id)).data}
+
+
+leaderboard_broadcaster = LeaderboardBroadcaster(team_leaderboard)
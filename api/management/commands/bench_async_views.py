@@ -0,0 +1,173 @@
+# api/management/commands/bench_async_views.py
+import asyncio
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncRequestFactory
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import User, Challenge
+from api.views import ProfileView, ChallengeListView, SubmitFlagView, LeaderboardView
+from api.async_views import AsyncProfileView, AsyncChallengeListView, AsyncSubmitFlagView, AsyncLeaderboardView
+from api.submission_log import submission_buffer
+from api.management.commands.bench_submit import percentile
+
+# Endpoint -> (sync view, async view, expected status)
+ENDPOINTS = {
+    'challenges': (ChallengeListView, AsyncChallengeListView, 200),
+    'leaderboard': (LeaderboardView, AsyncLeaderboardView, 200),
+    'profile': (ProfileView, AsyncProfileView, 200),
+    'submit': (SubmitFlagView, AsyncSubmitFlagView, 400), # Wrong flags; each player can solve only once
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the requests per second of the DRF views and their async versions (see api/async_views.py) "
+        "for the challenge list, leaderboard, profile and flag submission, under concurrent load on one event "
+        "loop, as daphne runs them. Sync views are called through sync_to_async, exactly as Django's ASGI handler "
+        "does; middleware and the HTTP server are left out (use loadtest for end-to-end numbers). Creates throwaway "
+        "'bench-*' players and challenges, and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint and view (default: 2000).")
+        parser.add_argument('--concurrency', type=int, default=64, help="Requests in flight at once (default: 64).")
+        parser.add_argument('--players', type=int, default=200, help="Distinct authenticated players (default: 200).")
+        parser.add_argument('--challenges', type=int, default=20, help="Published challenges to create (default: 20).")
+        parser.add_argument(
+            '--endpoint', action='append', choices=sorted(ENDPOINTS), dest='endpoints',
+            help="Endpoint to benchmark; repeat for several (default: all).",
+        )
+        parser.add_argument('--keep', action='store_true', help="Keep the generated players and challenges.")
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['players'], options['challenges']) < 1:
+            raise CommandError("--requests, --concurrency, --players and --challenges must be positive.")
+        # All generated players share one address; the rate limiter has its own benchmark (bench_ratelimit)
+        with override_settings(RATE_LIMIT_ENABLED=False):
+            self.report(asyncio.run(self.main(options)))
+
+    async def main(self, options):
+        """
+        Every query, including the setup and the cleanup, runs in the thread that the async ORM and
+        sync_to_async use, as under daphne, so the database connection is never shared between threads.
+        """
+        prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        users, challenges = await sync_to_async(self.setup)(prefix, options)
+        try:
+            return await self.run(options, users, challenges)
+        finally:
+            await sync_to_async(self.cleanup)(prefix, options['keep'])
+
+    @staticmethod
+    def setup(prefix, options):
+        # Created one by one, so the challenge cache is invalidated as by any other change
+        challenges = [
+            Challenge.objects.create(
+                name=f"{prefix}-{i}", description="Async view benchmark", flag=f"FLAG{{{prefix}}}", is_published=True,
+            )
+            for i in range(options['challenges'])
+        ]
+        password = make_password(None) # One unusable hash shared by every generated user
+        User.objects.bulk_create(
+            [User(username=f"{prefix}-{i}", password=password) for i in range(options['players'])],
+            batch_size=1000,
+        )
+        return list(User.objects.filter(username__startswith=f"{prefix}-")), challenges
+
+    @staticmethod
+    def cleanup(prefix, keep):
+        submission_buffer.flush() # The attempts reference the challenges about to be deleted
+        if not keep:
+            User.objects.filter(username__startswith=f"{prefix}-").delete()
+            Challenge.objects.filter(name__startswith=f"{prefix}-").delete()
+        connection.close()
+
+    async def run(self, options, users, challenges):
+        tokens = [f'Bearer {AccessToken.for_user(user)}' for user in users]
+        factory = AsyncRequestFactory()
+        counter = iter(range(10 ** 12))
+
+        def make_request(endpoint):
+            index = next(counter)
+            headers = {'Authorization': tokens[index % len(tokens)]}
+            if endpoint == 'submit':
+                challenge = challenges[index % len(challenges)]
+                request = factory.post(
+                    f'/api/challenges/{challenge.pk}/submit/', {'flag': f'wrong-{index}'},
+                    content_type='application/json', headers=headers,
+                )
+                return request, {'pk': challenge.pk}
+            path = {'challenges': '/api/challenges/', 'leaderboard': '/api/leaderboard/', 'profile': '/api/profile/'}[endpoint]
+            return factory.get(path, headers=headers), {}
+
+        def call_sync(view, request, kwargs):
+            response = view(request, **kwargs)
+            response.render()
+            return response
+
+        # Thread-sensitive, as Django's ASGI handler runs sync views
+        sync_call = sync_to_async(call_sync)
+        results = []
+        for endpoint in options['endpoints'] or list(ENDPOINTS):
+            sync_view, async_view, expected = ENDPOINTS[endpoint]
+            handlers = {
+                'sync': lambda request, kwargs, view=sync_view.as_view(): sync_call(view, request, kwargs),
+                'async': lambda request, kwargs, view=async_view.as_view(): view(request, **kwargs),
+            }
+            for mode, handler in handlers.items():
+                # One warm-up request fills the caches either view relies on
+                await handler(*make_request(endpoint))
+                elapsed, latencies, unexpected = await self.load(
+                    handler, lambda: make_request(endpoint), expected, options['requests'], options['concurrency'],
+                )
+                results.append((endpoint, mode, elapsed, latencies, unexpected))
+        return results
+
+    @staticmethod
+    async def load(handler, make_request, expected, total, concurrency):
+        """
+        Keeps `concurrency` requests in flight until `total` have been answered.
+        Returns (wall seconds, sorted latencies, responses with an unexpected status).
+        """
+        remaining = total
+        latencies = []
+        unexpected = 0
+
+        async def worker():
+            nonlocal remaining, unexpected
+            while remaining > 0:
+                remaining -= 1
+                request, kwargs = make_request()
+                started = time.perf_counter()
+                response = await handler(request, kwargs)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != expected:
+                    unexpected += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+        return time.perf_counter() - started, sorted(latencies), unexpected
+
+    def report(self, results):
+        self.stdout.write(f"{'Endpoint':<12} {'View':<6} {'Req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Unexpected':>11}")
+        throughput = {}
+        for endpoint, mode, elapsed, latencies, unexpected in results:
+            throughput[endpoint, mode] = len(latencies) / elapsed
+            self.stdout.write(
+                f"{endpoint:<12} {mode:<6} {throughput[endpoint, mode]:>9.1f} "
+                f"{percentile(latencies, 0.50) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.1f} {unexpected:>11}"
+            )
+        for endpoint in dict.fromkeys(endpoint for endpoint, *_ in results):
+            if (endpoint, 'sync') in throughput and (endpoint, 'async') in throughput:
+                speedup = throughput[endpoint, 'async'] / throughput[endpoint, 'sync']
+                self.stdout.write(f"{endpoint}: async serves {speedup:.2f}x the requests per second of sync")
+        if any(unexpected for *_, unexpected in results):
+            raise CommandError("Some responses had an unexpected status code.")
@@ -0,0 +1,145 @@
+# api/management/commands/bench_broadcast.py
+import asyncio
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.broadcast import Broadcaster
+from api.consumers import ActivityConsumer
+from api.redis_client import get_redis
+from api.management.commands.bench_submit import percentile
+
+
+class BenchActivityConsumer(ActivityConsumer):
+    # A separate channel, so real viewers never see benchmark events
+    broadcaster = Broadcaster('activity-bench:events', update_type='activity_update', batch_type='activity_batch')
+
+
+class Deliveries:
+    """
+    Records the frames received by all simulated connections. Every connection gets the same frame
+    object, so each distinct frame is decoded once, however many connections received it.
+    """
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.delivered = 0
+        self.frames = {} # frame -> [send times of its events, first delivery, last delivery, connections]
+        self.done = asyncio.Event()
+
+    def record(self, text):
+        now = time.time()
+        entry = self.frames.get(text)
+        if entry is None:
+            data = json.loads(text)
+            messages = data['messages'] if data['type'] == 'activity_batch' else [data['message']]
+            entry = self.frames[text] = [[message['sent_at'] for message in messages], now, now, 0]
+        entry[2] = now
+        entry[3] += 1
+        self.delivered += len(entry[0])
+        if self.delivered >= self.expected:
+            self.done.set()
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens many in-process activity feed connections, publishes solve events through Redis at a fixed rate "
+        "and measures throughput and fan-out latency (publish to delivery on the first and the last connection)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10000, help="Simulated viewers (default: 10000).")
+        parser.add_argument('--events', type=int, default=2000, help="Events to publish (default: 2000).")
+        parser.add_argument('--rate', type=float, default=500.0, help="Events published per second (default: 500).")
+        parser.add_argument('--timeout', type=float, default=120.0, help="Give up waiting for deliveries after this many seconds.")
+
+    def handle(self, *args, **options):
+        if min(options['connections'], options['events'], options['rate']) <= 0:
+            raise CommandError("--connections, --events and --rate must be positive.")
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        connections, events = options['connections'], options['events']
+        deliveries = Deliveries(expected=connections * events)
+        application = BenchActivityConsumer.as_asgi()
+
+        opened_at = time.perf_counter()
+        clients = [await self.connect(application, deliveries, index) for index in range(connections)]
+        self.stdout.write(f"Connections:   {connections} opened in {time.perf_counter() - opened_at:.2f}s")
+        await BenchActivityConsumer.broadcaster.wait_subscribed()
+
+        publisher = threading.Thread(target=self.publish, args=(events, options['rate']))
+        started = time.time()
+        publisher.start()
+        try:
+            await asyncio.wait_for(deliveries.done.wait(), timeout=options['timeout'])
+        except asyncio.TimeoutError:
+            raise CommandError(
+                f"Only {deliveries.delivered} of {deliveries.expected} deliveries arrived within {options['timeout']}s."
+            )
+        finally:
+            publisher.join()
+            for inbox, task in clients:
+                await inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.gather(*(task for _, task in clients), return_exceptions=True)
+        self.report(deliveries, connections, events, started)
+
+    @staticmethod
+    async def connect(application, deliveries, index):
+        inbox = asyncio.Queue()
+        accepted = asyncio.Event()
+
+        async def send(message):
+            if message['type'] == 'websocket.send':
+                deliveries.record(message['text'])
+            elif message['type'] == 'websocket.accept':
+                accepted.set()
+
+        scope = {
+            'type': 'websocket', 'path': '/ws/activity/', 'headers': [], 'query_string': b'', 'subprotocols': [],
+            # One address per viewer, so the per-IP connection limit does not apply
+            'client': (f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}', 50000),
+        }
+        task = asyncio.ensure_future(application(scope, inbox.get, send))
+        await inbox.put({'type': 'websocket.connect'})
+        await accepted.wait()
+        return inbox, task
+
+    @staticmethod
+    def publish(events, rate):
+        redis = get_redis()
+        channel = BenchActivityConsumer.broadcaster.channel
+        started = time.perf_counter()
+        for seq in range(events):
+            delay = started + seq / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            redis.publish(channel, json.dumps({'seq': seq, 'user': 'bench', 'challenge': 'bench', 'sent_at': time.time()}))
+
+    def report(self, deliveries, connections, events, started):
+        first_latencies, last_latencies = [], []
+        finished = started
+        for sent_ats, first, last, _ in deliveries.frames.values():
+            finished = max(finished, last)
+            first_latencies += [first - sent_at for sent_at in sent_ats]
+            last_latencies += [last - sent_at for sent_at in sent_ats]
+        first_latencies.sort()
+        last_latencies.sort()
+        elapsed = finished - started
+        frames_sent = sum(entry[3] for entry in deliveries.frames.values())
+
+        def summary(latencies):
+            return (
+                f"p50 {percentile(latencies, 0.50) * 1000:.1f}  p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f}  max {percentile(latencies, 1.0) * 1000:.1f}"
+            )
+
+        self.stdout.write(f"Events:        {events} in {elapsed:.2f}s, {events / elapsed:.0f} events/s fully fanned out")
+        self.stdout.write(
+            f"Frames:        {len(deliveries.frames)} distinct, {frames_sent} sent "
+            f"({events / len(deliveries.frames):.1f} events per frame), {deliveries.delivered / elapsed:.0f} event deliveries/s"
+        )
+        self.stdout.write(f"First viewer (ms): {summary(first_latencies)}")
+        self.stdout.write(f"Last viewer (ms):  {summary(last_latencies)}")
@@ -0,0 +1,115 @@
+# api/management/commands/bench_ratelimit.py
+import threading
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import User
+from api.redis_client import get_redis
+from api.throttling import RateLimiter, SubmitFlagThrottle
+from api.management.commands.bench_submit import percentile
+
+
+class BenchSubmitFlagThrottle(SubmitFlagThrottle):
+    # Separate keys, so the benchmark never counts against (or is limited by) real players
+    limiter = RateLimiter(prefix='ratelimit-bench')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the per-request overhead of the shared flag submission rate limiter (all of its limits, "
+        "one Redis script call) from concurrent threads, and checks that limits and Retry-After are enforced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="Rate limit checks to time (default: 20000).")
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent checking threads (default: 8).")
+        parser.add_argument('--users', type=int, default=5000, help="Distinct simulated players (default: 5000).")
+        parser.add_argument('--budget-ms', type=float, default=1.0, help="Fail if p99 overhead exceeds this (default: 1.0).")
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['threads'], options['users']) < 1:
+            raise CommandError("--requests, --threads and --users must be positive.")
+        factory = APIRequestFactory()
+        try:
+            with override_settings(RATE_LIMIT_ENABLED=True):
+                self.check_enforcement(factory)
+                latencies, throttled = self.measure(factory, options['requests'], options['threads'], options['users'])
+        finally:
+            redis = get_redis()
+            stale_keys = list(redis.scan_iter(match='ratelimit-bench:*', count=1000))
+            if stale_keys:
+                redis.delete(*stale_keys)
+
+        latencies.sort()
+        p99_ms = percentile(latencies, 0.99) * 1000
+        self.stdout.write(f"Checks:        {len(latencies)} from {options['threads']} threads, {throttled} throttled")
+        self.stdout.write(
+            f"Overhead (ms): mean {sum(latencies) / len(latencies) * 1000:.3f}  p50 {percentile(latencies, 0.50) * 1000:.3f}  "
+            f"p95 {percentile(latencies, 0.95) * 1000:.3f}  p99 {p99_ms:.3f}  max {percentile(latencies, 1.0) * 1000:.3f}"
+        )
+        if p99_ms > options['budget_ms']:
+            raise CommandError(f"p99 overhead {p99_ms:.3f} ms exceeds the {options['budget_ms']} ms budget.")
+        self.stdout.write(self.style.SUCCESS(f"p99 overhead is within the {options['budget_ms']} ms budget."))
+
+    @staticmethod
+    def request_for(factory, user, challenge_id, address='127.0.0.1'):
+        request = Request(factory.post(f'/api/challenges/{challenge_id}/submit/', REMOTE_ADDR=address))
+        request.user = user
+        return request, SimpleNamespace(kwargs={'pk': challenge_id})
+
+    def check_enforcement(self, factory):
+        """
+        One player submitting at one challenge must be cut off after the per-challenge limit,
+        with a positive Retry-After.
+        """
+        throttle = BenchSubmitFlagThrottle()
+        user = User(pk=2 ** 40, username='bench-ratelimit', team_id=None) # Never saved
+        request, view = self.request_for(factory, user, 1)
+        allowed = 0
+        while throttle.allow_request(request, view):
+            allowed += 1
+            if allowed > 1000:
+                raise CommandError("The rate limiter never throttled; is RATE_LIMITS['submit'] empty?")
+        if not throttle.wait() or throttle.wait() <= 0:
+            raise CommandError("A throttled request got no Retry-After.")
+        self.stdout.write(f"Enforcement:   throttled after {allowed} submissions, Retry-After {throttle.wait():.1f}s")
+
+    def measure(self, factory, total, thread_count, user_count):
+        """
+        Times allow_request() for requests spread over many players, teams and challenges.
+        Returns ([seconds per check], number throttled).
+        """
+        latencies, throttled = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(thread_count)
+
+        def worker(index):
+            throttle = BenchSubmitFlagThrottle()
+            local_latencies, local_throttled = [], 0
+            prepared = []
+            for n in range(index, total, thread_count):
+                player = n % user_count
+                user = User(pk=2 ** 40 + 1 + player, username='bench', team_id=2 ** 40 + player % 1000)
+                address = f'10.{player // 65536 % 256}.{player // 256 % 256}.{player % 256}'
+                prepared.append(self.request_for(factory, user, n % 50, address))
+            barrier.wait()
+            for request, view in prepared:
+                started = time.perf_counter()
+                allowed = throttle.allow_request(request, view)
+                local_latencies.append(time.perf_counter() - started)
+                local_throttled += not allowed
+            with lock:
+                latencies.extend(local_latencies)
+                throttled.append(local_throttled)
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return latencies, sum(throttled)
@@ -0,0 +1,163 @@
+# api/management/commands/bench_submit.py
+import threading
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import User, Challenge, Solve, CTFSetting
+from api.views import SubmitFlagView
+from api.ctf_settings import announce_settings_change
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires concurrent correct flag submissions from many players at one challenge and reports "
+        "throughput, latency percentiles and score correctness. Creates throwaway 'bench-*' users and "
+        "a challenge, and removes them afterwards. Run it against PostgreSQL; SQLite serializes writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=2000, help="Number of distinct solvers (default: 2000).")
+        parser.add_argument('--threads', type=int, default=32, help="Number of concurrent submitting threads (default: 32).")
+        parser.add_argument('--repeat', type=int, default=1, help="Correct submissions per player; extras must be rejected as duplicates (default: 1).")
+        parser.add_argument('--dynamic', action='store_true', help="Use a decaying challenge with dynamic scoring enabled for the run.")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated users and challenge.")
+
+    def handle(self, *args, **options):
+        players, threads, repeat = options['players'], options['threads'], options['repeat']
+        if players < 1 or threads < 1 or repeat < 1:
+            raise CommandError("--players, --threads and --repeat must be positive.")
+
+        prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        flag = f"FLAG{{{prefix}}}"
+        settings_obj = CTFSetting.load()
+        previous_mode = settings_obj.scoring_mode
+        if options['dynamic']:
+            CTFSetting.objects.filter(pk=settings_obj.pk).update(scoring_mode='dynamic')
+            announce_settings_change()
+
+        challenge = Challenge.objects.create(
+            name=prefix, description="Submission benchmark", flag=flag,
+            is_published=True, is_dynamic=options['dynamic'],
+        )
+        password = make_password(None) # One unusable hash shared by every generated user
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}-{i}", password=password) for i in range(players)],
+            batch_size=1000,
+        )
+        if users[0].pk is None: # Backends without RETURNING on bulk inserts
+            users = list(User.objects.filter(username__startswith=f"{prefix}-"))
+
+        try:
+            # All generated players share one address; the rate limiter has its own benchmark (bench_ratelimit)
+            with override_settings(RATE_LIMIT_ENABLED=False):
+                results = self.run(challenge, flag, users * repeat, threads)
+            self.report(challenge, users, results, repeat, options['dynamic'])
+        finally:
+            if options['dynamic']:
+                CTFSetting.objects.filter(pk=settings_obj.pk).update(scoring_mode=previous_mode)
+                announce_settings_change()
+            if not options['keep']:
+                User.objects.filter(username__startswith=f"{prefix}-").delete()
+                challenge.delete()
+
+    def run(self, challenge, flag, submitters, thread_count):
+        """
+        Splits the submissions across threads that all start at the same instant.
+        Each thread uses its own database connection, as request threads do under daphne.
+        Returns (wall seconds, [(status code, latency seconds)], [exceptions]).
+        """
+        factory = APIRequestFactory()
+        view = SubmitFlagView.as_view()
+        results, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(thread_count + 1)
+
+        def worker(chunk):
+            local_results, local_errors = [], []
+            barrier.wait()
+            try:
+                for user in chunk:
+                    request = factory.post(f'/api/challenges/{challenge.pk}/submit/', {'flag': flag}, format='json')
+                    force_authenticate(request, user=user)
+                    started = time.perf_counter()
+                    try:
+                        response = view(request, pk=challenge.pk)
+                        local_results.append((response.status_code, time.perf_counter() - started))
+                    except Exception as exc: # Report rather than abort the whole run
+                        local_errors.append(exc)
+            finally:
+                connection.close()
+                with lock:
+                    results.extend(local_results)
+                    errors.extend(local_errors)
+
+        chunks = [submitters[i::thread_count] for i in range(thread_count)]
+        workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - started, results, errors
+
+    def report(self, challenge, users, run_result, repeat, dynamic):
+        elapsed, results, errors = run_result
+        latencies = sorted(latency for _, latency in results)
+        accepted = sum(1 for code, _ in results if code == 200)
+        rejected = sum(1 for code, _ in results if code == 400)
+        total = len(results) + len(errors)
+
+        self.stdout.write(f"Submissions:   {total} from {len(users)} players ({repeat} each)")
+        self.stdout.write(f"Wall time:     {elapsed:.2f}s")
+        self.stdout.write(f"Throughput:    {total / elapsed:.1f} req/s")
+        self.stdout.write(
+            f"Latency (ms):  p50 {percentile(latencies, 0.50) * 1000:.1f}  p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}  max {percentile(latencies, 1.0) * 1000:.1f}"
+        )
+        self.stdout.write(f"Responses:     {accepted} accepted, {rejected} rejected, {len(errors)} errors")
+
+        # Score correctness: exactly one solve per player, scores equal to what was awarded,
+        # a gap-free decay sequence for dynamic challenges, and a single first blood.
+        problems = []
+        solves = list(Solve.objects.filter(challenge=challenge).order_by('id').values_list('user_id', 'points_awarded'))
+        if accepted != len(users) or len(solves) != len(users):
+            problems.append(f"expected {len(users)} solves, got {len(solves)} rows and {accepted} accepted responses")
+        if rejected != len(users) * (repeat - 1):
+            problems.append(f"expected {len(users) * (repeat - 1)} duplicate rejections, got {rejected}")
+        awarded = dict(solves)
+        scores = dict(User.objects.filter(pk__in=[user.pk for user in users]).values_list('id', 'score'))
+        wrong_scores = sum(1 for user_id, score in scores.items() if score != awarded.get(user_id, 0))
+        if wrong_scores:
+            problems.append(f"{wrong_scores} players have a score different from their awarded points")
+        challenge.refresh_from_db()
+        if dynamic:
+            expected = [
+                max(challenge.minimum_points, challenge.initial_points - n * challenge.decay_factor)
+                for n in range(len(solves))
+            ]
+            if [points for _, points in solves] != expected:
+                problems.append("awarded points do not follow the decay sequence (lost or duplicated decay steps)")
+        if solves and challenge.first_blood_id != solves[0][0]:
+            problems.append("first blood does not belong to the first recorded solve")
+        if errors:
+            problems.append(f"{len(errors)} submissions raised, first: {errors[0]!r}")
+
+        if problems:
+            for problem in problems:
+                self.stderr.write(f"INCORRECT: {problem}")
+            raise CommandError("Score correctness check failed.")
+        self.stdout.write(self.style.SUCCESS("Score correctness: OK"))
@@ -0,0 +1,372 @@
+# api/management/commands/loadtest.py
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import User, Team, Challenge
+from api.leaderboard import rebuild_team_leaderboard, rebuild_player_leaderboard
+from api.management.commands.bench_submit import percentile
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+# Close codes of sockets turned away or evicted by the server (see api/connection_limits.py)
+CLOSE_REASONS = {4013: 'try later', 4008: 'too slow'}
+
+# Statuses that are a correct answer to each kind of request (200 otherwise); 429s are reported on their own
+EXPECTED_STATUSES = {'submit wrong': (400,), 'submit right': (200, 400)} # 400: wrong flag, or already solved
+
+
+def flag_for(challenge_name):
+    """
+    The flag of a generated challenge; players derive it from the name, so the run needs no database access.
+    """
+    return f'FLAG{{{challenge_name}}}'
+
+
+class HTTPClient:
+    """
+    Minimal keep-alive HTTP/1.1 client over asyncio streams, one per simulated player, so thousands of
+    players cost no threads. Handles the responses the API sends (Content-Length or chunked bodies).
+    """
+
+    def __init__(self, base_url, forwarded_for=None):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.ssl = url.scheme == 'https'
+        self.host_header = url.netloc
+        self.forwarded_for = forwarded_for
+        self.token = None
+        self._reader = self._writer = None
+
+    async def request(self, method, path, data=None):
+        """
+        Returns (status, body bytes). Raises OSError or asyncio.IncompleteReadError if the connection fails.
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        body = json.dumps(data).encode() if data is not None else b''
+        headers = [
+            f'{method} {path} HTTP/1.1', f'Host: {self.host_header}', 'Accept: application/json',
+            f'Content-Length: {len(body)}',
+        ]
+        if data is not None:
+            headers.append('Content-Type: application/json')
+        if self.token:
+            headers.append(f'Authorization: Bearer {self.token}')
+        if self.forwarded_for:
+            headers.append(f'X-Forwarded-For: {self.forwarded_for}')
+        try:
+            self._writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+            await self._writer.drain()
+            return await self._read_response()
+        except BaseException:
+            self.close()
+            raise
+
+    async def _read_response(self):
+        status = int((await self._reader.readuntil(b'\r\n')).split()[1])
+        headers = {}
+        while (line := await self._reader.readuntil(b'\r\n')) != b'\r\n':
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while size := int((await self._reader.readuntil(b'\r\n')).split(b';')[0], 16):
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            while await self._reader.readuntil(b'\r\n') != b'\r\n': # Trailers
+                pass
+            body = b''.join(chunks)
+        else:
+            body = await self._reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, body
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Results:
+    """
+    Everything measured during a run, shared by all simulated players.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list) # request name -> seconds
+        self.statuses = defaultdict(Counter) # request name -> status code (or exception name) -> count
+        self.solves_sent = {} # (username, challenge name) -> time the correct flag was sent
+        self.broadcast_latencies = [] # Submission to delivery, for every socket that saw the solve
+        self.solves_seen = set()
+        self.sockets = Counter() # 'opened', 'failed' and close codes
+        self.frames = 0
+        self.open_sockets = 0
+        self.peak_sockets = 0
+
+    def record(self, name, status, elapsed):
+        self.latencies[name].append(elapsed)
+        self.statuses[name][status] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates players against a running stack (e.g. the docker-compose one): each logs in through "
+        "/api/token/, holds a ws/activity/ socket, browses challenges, submits right and wrong flags and polls "
+        "the leaderboard. Reports throughput, latency percentiles, error rates and the delay from a correct "
+        "submission to its activity event on every socket. Generate the players and challenges first with "
+        "--setup (in the backend container, so it reaches the database) and remove them with --cleanup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8080', help="Stack to load (default: http://localhost:8080, the nginx of docker-compose).")
+        parser.add_argument('--players', type=int, default=1000, help="Simulated players (default: 1000).")
+        parser.add_argument('--duration', type=float, default=60.0, help="Seconds of load after the ramp-up starts (default: 60).")
+        parser.add_argument('--ramp-up', type=float, default=30.0, help="Seconds over which players join (default: 30).")
+        parser.add_argument('--think-time', type=float, default=2.0, help="Mean pause between a player's actions, in seconds (default: 2).")
+        parser.add_argument('--wrong-ratio', type=float, default=0.7, help="Share of submissions with a wrong flag (default: 0.7).")
+        parser.add_argument('--prefix', default='load', help="Name prefix of the generated players, teams and challenges (default: load).")
+        parser.add_argument('--password', default='load-test-password', help="Password of the generated players.")
+        parser.add_argument('--spoof-ips', action='store_true', help=(
+            "Send a distinct X-Forwarded-For per player, so per-IP rate and connection limits see separate clients. "
+            "Only effective when --base-url is daphne itself (e.g. http://backend:8000), not a proxy in front of it."
+        ))
+        parser.add_argument('--setup', action='store_true', help="Create the players, their teams and the challenges, then exit.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the generated players, teams and challenges, then exit.")
+        parser.add_argument('--challenges', type=int, default=20, help="Challenges created by --setup (default: 20).")
+        parser.add_argument('--team-size', type=int, default=4, help="Players per team created by --setup; 0 for no teams (default: 4).")
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            return self.setup(options)
+        if options['cleanup']:
+            return self.cleanup(options['prefix'])
+        if options['players'] < 1 or options['duration'] <= 0:
+            raise CommandError("--players and --duration must be positive.")
+        try:
+            import websockets # noqa: F401
+        except ImportError:
+            raise CommandError("The load test needs the 'websockets' package (pip install websockets).")
+        self.raise_file_limit(options['players'])
+        results = Results()
+        started = time.perf_counter()
+        asyncio.run(self.run(options, results))
+        self.report(results, time.perf_counter() - started, options)
+
+    def setup(self, options):
+        prefix, players = options['prefix'], options['players']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Players named '{prefix}-*' already exist; run --cleanup first or pick another --prefix.")
+        teams = []
+        if options['team_size'] > 0:
+            teams = Team.objects.bulk_create(
+                [Team(name=f'{prefix}-team-{i}') for i in range(-(-players // options['team_size']))], batch_size=1000,
+            )
+            if teams and teams[0].pk is None: # Backends without RETURNING on bulk inserts
+                teams = list(Team.objects.filter(name__startswith=f'{prefix}-team-').order_by('pk'))
+        password = make_password(options['password']) # Hashed once, shared by every generated player
+        User.objects.bulk_create(
+            [
+                User(username=f'{prefix}-{i}', password=password,
+                     team=teams[i // options['team_size']] if teams else None)
+                for i in range(players)
+            ],
+            batch_size=1000,
+        )
+        Challenge.objects.bulk_create([
+            Challenge(name=f'{prefix}-{i}', description="Load test challenge", flag=flag_for(f'{prefix}-{i}'),
+                      points=100, is_published=True)
+            for i in range(options['challenges'])
+        ])
+        # Bulk inserts send no signals, so the rankings are rebuilt once rather than per row
+        rebuild_team_leaderboard()
+        rebuild_player_leaderboard()
+        self.stdout.write(f"Created {players} players, {len(teams)} teams and {options['challenges']} challenges.")
+
+    def cleanup(self, prefix):
+        users, _ = User.objects.filter(username__startswith=f'{prefix}-').delete()
+        teams, _ = Team.objects.filter(name__startswith=f'{prefix}-team-').delete()
+        challenges, _ = Challenge.objects.filter(name__startswith=f'{prefix}-').delete()
+        self.stdout.write(f"Deleted {users} player, {teams} team and {challenges} challenge rows (with related rows).")
+
+    def raise_file_limit(self, players):
+        # Every player holds an HTTP connection and a socket
+        if resource is None:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = 2 * players + 100
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard == resource.RLIM_INFINITY else min(hard, max(wanted, soft)), hard))
+            soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if soft < wanted:
+            self.stderr.write(f"Open file limit is {soft}; {players} players need about {wanted} (ulimit -n).")
+
+    async def run(self, options, results):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + options['duration']
+        ramp_step = options['ramp_up'] / options['players']
+        players = [
+            asyncio.ensure_future(self.player(index, index * ramp_step, deadline, options, results))
+            for index in range(options['players'])
+        ]
+        await asyncio.gather(*players)
+
+    async def timed(self, results, name, http, method, path, data=None):
+        """
+        Sends one request and records its latency and status. Returns (status, body), or (None, None) on failure.
+        """
+        started = time.perf_counter()
+        try:
+            status, body = await http.request(method, path, data)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+            results.record(name, type(exc).__name__, time.perf_counter() - started)
+            return None, None
+        results.record(name, status, time.perf_counter() - started)
+        return status, body
+
+    async def player(self, index, delay, deadline, options, results):
+        await asyncio.sleep(delay)
+        loop = asyncio.get_running_loop()
+        username = f"{options['prefix']}-{index}"
+        forwarded_for = f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}' if options['spoof_ips'] else None
+        http = HTTPClient(options['base_url'], forwarded_for)
+        socket_task = None
+        try:
+            status, body = await self.timed(
+                results, 'login', http, 'POST', '/api/token/', {'username': username, 'password': options['password']},
+            )
+            if status != 200:
+                return
+            http.token = json.loads(body)['access']
+            socket_task = asyncio.ensure_future(self.hold_socket(http.token, forwarded_for, options, results))
+
+            challenges, solved = [], set()
+            while loop.time() < deadline:
+                await asyncio.sleep(min(random.expovariate(1 / options['think_time']), max(deadline - loop.time(), 0)))
+                if loop.time() >= deadline:
+                    break
+                action = random.random()
+                if action < 0.4 or not challenges:
+                    status, body = await self.timed(results, 'challenge list', http, 'GET', '/api/challenges/')
+                    if status == 200:
+                        challenges = [
+                            (challenge['id'], challenge['name']) for challenge in json.loads(body)
+                            if challenge['name'].startswith(f"{options['prefix']}-")
+                        ]
+                    if challenges:
+                        await self.timed(results, 'challenge detail', http, 'GET', f'/api/challenges/{random.choice(challenges)[0]}/')
+                elif action < 0.7:
+                    await self.submit(http, username, challenges, solved, options, results)
+                else:
+                    await self.timed(results, 'leaderboard', http, 'GET', '/api/leaderboard/')
+        finally:
+            http.close()
+            if socket_task is not None:
+                socket_task.cancel()
+                await asyncio.gather(socket_task, return_exceptions=True)
+
+    async def submit(self, http, username, challenges, solved, options, results):
+        challenge_id, name = random.choice(challenges)
+        unsolved = [challenge for challenge in challenges if challenge[0] not in solved]
+        if random.random() < options['wrong_ratio'] or not unsolved:
+            await self.timed(results, 'submit wrong', http, 'POST', f'/api/challenges/{challenge_id}/submit/', {'flag': 'FLAG{wrong}'})
+            return
+        challenge_id, name = random.choice(unsolved)
+        results.solves_sent[(username, name)] = time.perf_counter()
+        status, _ = await self.timed(
+            results, 'submit right', http, 'POST', f'/api/challenges/{challenge_id}/submit/', {'flag': flag_for(name)},
+        )
+        if status in (200, 400): # 400: already solved in an earlier run
+            solved.add(challenge_id)
+        if status != 200:
+            results.solves_sent.pop((username, name), None)
+
+    async def hold_socket(self, token, forwarded_for, options, results):
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+        url = urlsplit(options['base_url'])
+        ws_url = f"{'wss' if url.scheme == 'https' else 'ws'}://{url.netloc}/ws/activity/?token={token}"
+        headers = {'X-Forwarded-For': forwarded_for} if forwarded_for else None
+        try:
+            async with connect(ws_url, additional_headers=headers, max_size=None, open_timeout=30) as socket:
+                results.sockets['opened'] += 1
+                results.open_sockets += 1
+                results.peak_sockets = max(results.peak_sockets, results.open_sockets)
+                opened_at = time.perf_counter()
+                try:
+                    async for frame in socket: # Ends on a normal close, raises ConnectionClosed on others
+                        self.record_frame(frame, opened_at, results)
+                finally:
+                    results.open_sockets -= 1
+        except ConnectionClosed as exc:
+            results.sockets[exc.rcvd.code if exc.rcvd else 1006] += 1
+        except (OSError, InvalidHandshake, asyncio.TimeoutError):
+            results.sockets['failed'] += 1
+
+    def record_frame(self, frame, opened_at, results):
+        received = time.perf_counter()
+        results.frames += 1
+        data = json.loads(frame)
+        messages = data.get('messages') or [data.get('message') or {}]
+        for message in messages:
+            key = (message.get('user'), message.get('challenge'))
+            sent = results.solves_sent.get(key)
+            # Solves sent before the socket opened arrive in the replay on connect, not live
+            if sent is not None and sent >= opened_at:
+                results.broadcast_latencies.append(received - sent)
+                results.solves_seen.add(key)
+
+    def report(self, results, elapsed, options):
+        def summary(latencies):
+            latencies = sorted(latencies)
+            return (
+                f"p50 {percentile(latencies, 0.50) * 1000:.1f}  p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f}  max {percentile(latencies, 1.0) * 1000:.1f}"
+            )
+
+        total = sum(len(latencies) for latencies in results.latencies.values())
+        self.stdout.write(f"Players:       {options['players']} over {elapsed:.1f}s against {options['base_url']}")
+        self.stdout.write(f"Requests:      {total}, {total / elapsed:.1f} req/s")
+        for name in sorted(results.latencies):
+            statuses = results.statuses[name]
+            count = len(results.latencies[name])
+            expected = EXPECTED_STATUSES.get(name, (200,))
+            errors = sum(n for status, n in statuses.items() if status not in expected and status != 429)
+            self.stdout.write(
+                f"  {name:<17} {count:>7}  (ms) {summary(results.latencies[name])}  "
+                f"errors {errors / count:.1%}  throttled {statuses.get(429, 0) / count:.1%}  "
+                f"[{', '.join(f'{status}: {n}' for status, n in statuses.most_common())}]"
+            )
+
+        sockets = results.sockets
+        closes = ', '.join(
+            f"{code} ({CLOSE_REASONS.get(code, 'closed')}): {n}" for code, n in sockets.items() if code not in ('opened', 'failed')
+        )
+        self.stdout.write(
+            f"Sockets:       {sockets['opened']} opened (peak {results.peak_sockets} open), {sockets['failed']} failed"
+            + (f", closed by server: {closes}" if closes else "")
+        )
+        if sockets.get(4013):
+            self.stdout.write(
+                "               Sockets were turned away by the connection limits; without --spoof-ips all players share "
+                "one address, so raise WEBSOCKET_MAX_CONNECTIONS_PER_IP for the run."
+            )
+        solves = len(results.solves_sent)
+        self.stdout.write(
+            f"Broadcast:     {results.frames} frames received; {len(results.solves_seen)} of {solves} solves seen, "
+            f"{len(results.broadcast_latencies) / max(solves, 1):.1f} deliveries per solve"
+        )
+        if results.broadcast_latencies:
+            self.stdout.write(f"  submit to delivery (ms) {summary(results.broadcast_latencies)}")
@@ -0,0 +1,42 @@
+# api/management/commands/rebuild_leaderboard.py
+from django.core.management.base import BaseCommand, CommandError
+
+from api.leaderboard import (
+    rebuild_team_leaderboard,
+    check_team_leaderboard,
+    rebuild_player_leaderboard,
+    check_player_leaderboard,
+)
+from api.timeline import rebuild_team_timeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the Redis team and player leaderboards and the team score timelines from Solve/User data, "
+        "or checks the leaderboards for drift with --check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the leaderboards against the database and report inconsistencies.",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            problems = [f"team {problem}" for problem in check_team_leaderboard()]
+            problems += [f"player {problem}" for problem in check_player_leaderboard()]
+            for problem in problems:
+                self.stderr.write(problem)
+            if problems:
+                raise CommandError(f"{len(problems)} leaderboard inconsistencies found. Run without --check to rebuild.")
+            self.stdout.write(self.style.SUCCESS("Leaderboards are consistent with the database."))
+            return
+
+        teams = rebuild_team_leaderboard()
+        players = rebuild_player_leaderboard()
+        timelines = rebuild_team_timeline()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt leaderboards with {teams} teams and {players} players, and {timelines} team timelines."
+        ))
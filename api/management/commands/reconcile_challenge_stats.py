@@ -0,0 +1,32 @@
+# api/management/commands/reconcile_challenge_stats.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.challenge_stats import reconcile_challenge_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconciles the incrementally maintained challenge statistics against Solve "
+        "(and the Submission log for missing attempt data). With --interval it keeps running as a background task."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help="Repeat every INTERVAL seconds instead of running once.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            close_old_connections()
+            corrected = reconcile_challenge_stats()
+            self.stdout.write(f"Reconciled challenge statistics; {corrected} challenges corrected.")
+            if interval is None:
+                return
+            time.sleep(interval)
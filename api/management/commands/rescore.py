@@ -0,0 +1,28 @@
+# api/management/commands/rescore.py
+from django.core.management.base import BaseCommand
+
+from api.scoring import rescore
+
+
+class Command(BaseCommand):
+    help = (
+        "Retroactively recomputes challenge points and every earlier Solve.points_awarded, "
+        "User.score and team total. Rescores the whole event unless challenges are given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--challenge',
+            type=int,
+            action='append',
+            dest='challenge_ids',
+            help="ID of a challenge to rescore. May be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        report = rescore(options['challenge_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {report['challenges_rescored']} challenges in {report['seconds']:.3f}s: "
+            f"{report['challenges_updated']} challenges, {report['solves_updated']} solves, "
+            f"{report['users_updated']} users and {report['teams_updated']} teams updated."
+        ))
@@ -0,0 +1,317 @@
+# api/management/commands/seed_event.py
+import csv
+import datetime
+import io
+import time
+
+import numpy as np
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import User, Team, Tag, Challenge, Hint, Solve, UnlockedHint, CTFSetting
+from api.leaderboard import rebuild_team_leaderboard, rebuild_player_leaderboard
+from api.timeline import rebuild_team_timeline
+from api.challenge_stats import reconcile_challenge_stats
+from api.challenge_cache import bump_challenge_version
+from api.scoring import evaluate_decay, DECAY_FUNCTION_CODES
+
+CATEGORIES = ['Web', 'Crypto', 'Pwn', 'Reverse', 'Forensics', 'Misc']
+
+# Point values of the challenge difficulty tiers, easiest first
+POINT_TIERS = [100, 200, 300, 400, 500]
+
+# Users generated per chunk when choosing which challenges each one solves
+PLAN_CHUNK_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a large synthetic event for local load and performance work: users, teams, challenges "
+        "with hints, and millions of solves and hint unlocks with realistic distributions. A few strong players "
+        "solve most challenges, easy challenges are solved by many and early, hard ones by few and late. The "
+        "same --seed gives the same event. Rows are written with bulk inserts (COPY on PostgreSQL) and every "
+        "player shares one precomputed password hash; leaderboards, timelines and challenge statistics are "
+        "rebuilt once at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help="Players to generate (default: 100000).")
+        parser.add_argument('--teams', type=int, default=10000, help="Teams to generate (default: 10000).")
+        parser.add_argument('--challenges', type=int, default=1000, help="Challenges to generate (default: 1000).")
+        parser.add_argument('--solves-per-user', type=float, default=20.0, help="Mean solves per player (default: 20).")
+        parser.add_argument('--solo-ratio', type=float, default=0.1, help="Share of players without a team (default: 0.1).")
+        parser.add_argument('--dynamic-ratio', type=float, default=0.3, help="Share of challenges with decaying points (default: 0.3).")
+        parser.add_argument('--hours', type=float, default=48.0, help="Length of the event, ending now (default: 48).")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed (default: 1).")
+        parser.add_argument('--prefix', default='seed', help="Name prefix of everything generated (default: seed).")
+        parser.add_argument('--password', default='seed-password', help="Password of every generated player.")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows per insert batch (default: 10000).")
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['challenges'], options['batch_size']) < 1 or options['teams'] < 0:
+            raise CommandError("--users, --challenges and --batch-size must be positive.")
+        if options['hours'] <= 0 or options['solves_per_user'] < 0:
+            raise CommandError("--hours must be positive and --solves-per-user must not be negative.")
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Players named '{prefix}-*' already exist; pick another --prefix or reset the database.")
+
+        self.started = time.perf_counter()
+        self.batch_size = options['batch_size']
+        rng = np.random.default_rng(options['seed'])
+        dynamic_mode = CTFSetting.load().scoring_mode == 'dynamic'
+        end = timezone.now()
+        start = end - datetime.timedelta(hours=options['hours'])
+
+        plan = self.plan(rng, options, dynamic_mode)
+        self.progress(f"Planned {len(plan['solve_users'])} solves and {len(plan['unlock_users'])} hint unlocks")
+
+        with transaction.atomic():
+            self.write(plan, options, start, end)
+
+        # Bulk inserts send no signals, so the derived state is rebuilt once
+        rebuild_team_leaderboard()
+        rebuild_player_leaderboard()
+        rebuild_team_timeline()
+        reconcile_challenge_stats()
+        bump_challenge_version()
+        self.progress("Rebuilt leaderboards, timelines and challenge statistics")
+
+    def progress(self, message):
+        self.stdout.write(f"[{time.perf_counter() - self.started:7.1f}s] {message}")
+
+    def plan(self, rng, options, dynamic_mode):
+        """
+        Decides everything by position (user index, challenge index, hint index) before touching the database.
+        Times are fractions of the event, 0 at its start and 1 now.
+        """
+        users, challenges = options['users'], options['challenges']
+
+        # Challenges: a random difficulty order, then points, popularity and scoring by difficulty
+        difficulty = rng.permutation(challenges) / max(challenges - 1, 1) # 0 easiest, 1 hardest
+        tiers = np.minimum((difficulty * len(POINT_TIERS)).astype(np.int64), len(POINT_TIERS) - 1)
+        initial_points = np.array(POINT_TIERS)[tiers]
+        popularity = 1.0 / (1.0 + difficulty * challenges) ** 0.8 # Zipf-like: easy challenges draw most solvers
+        is_dynamic = rng.random(challenges) < options['dynamic_ratio']
+        decay_function = rng.choice(['linear', 'logarithmic', 'quadratic'], size=challenges)
+        minimum_points = np.full(challenges, 50)
+        decay_factor = np.where(decay_function == 'linear', 1, np.maximum(users // 20, 1))
+        category = rng.integers(0, len(CATEGORIES), challenges)
+
+        # Players: a heavy-tailed skill sets how many challenges each solves and how hard they can go (the
+        # hardest ones fall to the very best only); they join over the first part of the event and solve
+        # easy challenges early and hard ones late
+        skill = rng.lognormal(0.0, 1.0, users)
+        ability = (np.argsort(np.argsort(skill)) / max(users - 1, 1)) ** 2 # Hardest solvable difficulty
+        solvable = np.floor(ability * (challenges - 1)).astype(np.int64) + 1
+        solve_counts = np.minimum(rng.poisson(options['solves_per_user'] * skill / np.exp(0.5)), solvable)
+        joined = np.minimum(rng.exponential(0.1, users), 0.9)
+        teams = rng.integers(0, max(options['teams'], 1), users)
+        solo = (rng.random(users) < options['solo_ratio']) | (options['teams'] == 0)
+
+        # Each player's challenges are a weighted sample without replacement (Gumbel top-k), a chunk at a time
+        solve_users, solve_challenges = [], []
+        log_popularity = np.log(popularity)
+        for chunk_start in range(0, users, PLAN_CHUNK_SIZE):
+            counts = solve_counts[chunk_start:chunk_start + PLAN_CHUNK_SIZE]
+            widest = int(counts.max(initial=0))
+            if not widest:
+                continue
+            keys = log_popularity - np.log(-np.log(rng.random((len(counts), challenges))))
+            keys[difficulty > ability[chunk_start:chunk_start + len(counts), None]] = -np.inf
+            picked = np.argsort(-keys, axis=1)[:, :widest]
+            taken = np.arange(widest) < counts[:, None]
+            solve_users.append(np.repeat(np.arange(chunk_start, chunk_start + len(counts)), counts))
+            solve_challenges.append(picked[taken])
+        solve_users = np.concatenate(solve_users) if solve_users else np.zeros(0, dtype=np.int64)
+        solve_challenges = np.concatenate(solve_challenges) if solve_challenges else np.zeros(0, dtype=np.int64)
+
+        hard = difficulty[solve_challenges]
+        solve_times = joined[solve_users] + (1 - joined[solve_users]) * rng.beta(1 + 2 * hard, 4 - 2 * hard)
+
+        # Points: decaying challenges award by solve order in dynamic scoring mode, others their fixed points
+        order = np.lexsort((solve_times, solve_challenges))
+        solves_before = np.empty(len(order), dtype=np.int64)
+        group_starts = np.r_[0, np.flatnonzero(np.diff(solve_challenges[order])) + 1]
+        group_sizes = np.diff(np.r_[group_starts, len(order)])
+        solves_before[order] = np.arange(len(order)) - np.repeat(group_starts, group_sizes)
+        decaying = is_dynamic[solve_challenges] & dynamic_mode
+        function_codes = np.array([DECAY_FUNCTION_CODES[name] for name in decay_function])
+        awarded = np.where(decaying, evaluate_decay(
+            function_codes[solve_challenges], initial_points[solve_challenges], minimum_points[solve_challenges],
+            decay_factor[solve_challenges], solves_before,
+        ), initial_points[solve_challenges])
+        current_points = initial_points.copy()
+        if dynamic_mode:
+            # A decaying challenge is worth what its latest solver got
+            latest = order[group_starts + group_sizes - 1] if len(order) else np.zeros(0, dtype=np.int64)
+            solved = solve_challenges[latest]
+            current_points[solved] = np.where(is_dynamic[solved], awarded[latest], current_points[solved])
+        first_solves = order[group_starts] if len(order) else np.zeros(0, dtype=np.int64)
+        first_blood = np.full(challenges, -1)
+        first_blood[solve_challenges[first_solves]] = solve_users[first_solves]
+
+        # Hints: up to three per challenge, cheapest first, each costing a tenth of the challenge's points.
+        # Solvers of harder challenges unlock more of them, shortly before solving.
+        hint_counts = rng.integers(0, 4, challenges)
+        hint_starts = np.r_[0, np.cumsum(hint_counts)[:-1]]
+        hint_challenges = np.repeat(np.arange(challenges), hint_counts)
+        hint_costs = (initial_points[hint_challenges] // 10) * (np.arange(len(hint_challenges)) - hint_starts[hint_challenges] + 1)
+        unlock_chance = 0.05 + 0.4 * hard
+        unlocked = np.minimum(
+            np.floor(np.log(rng.random(len(solve_users))) / np.log(unlock_chance)).astype(np.int64),
+            hint_counts[solve_challenges],
+        )
+        unlock_solves = np.repeat(np.arange(len(solve_users)), unlocked)
+        unlock_rank = np.arange(len(unlock_solves)) - np.repeat(np.cumsum(unlocked) - unlocked, unlocked)
+        unlock_hints = hint_starts[solve_challenges[unlock_solves]] + unlock_rank
+        unlock_users = solve_users[unlock_solves]
+        unlock_times = np.maximum(solve_times[unlock_solves] - rng.random(len(unlock_solves)) * 0.02, joined[unlock_users])
+
+        # Scores: solves minus hint costs. Players who would end up in debt did not unlock their hints.
+        earned = np.bincount(solve_users, weights=awarded, minlength=users).astype(np.int64)
+        spent = np.bincount(unlock_users, weights=hint_costs[unlock_hints], minlength=users).astype(np.int64)
+        affordable = (earned >= spent)[unlock_users]
+        unlock_users, unlock_hints, unlock_times = unlock_users[affordable], unlock_hints[affordable], unlock_times[affordable]
+        spent = np.bincount(unlock_users, weights=hint_costs[unlock_hints], minlength=users).astype(np.int64)
+
+        return {
+            'difficulty': difficulty, 'initial_points': initial_points, 'current_points': current_points,
+            'is_dynamic': is_dynamic, 'decay_function': decay_function, 'minimum_points': minimum_points,
+            'decay_factor': decay_factor, 'category': category, 'first_blood': first_blood,
+            'joined': joined, 'teams': np.where(solo, -1, teams), 'scores': earned - spent,
+            'solve_users': solve_users, 'solve_challenges': solve_challenges, 'solve_times': solve_times,
+            'awarded': awarded,
+            'hint_challenges': hint_challenges, 'hint_costs': hint_costs,
+            'unlock_users': unlock_users, 'unlock_hints': unlock_hints, 'unlock_times': unlock_times,
+        }
+
+    def write(self, plan, options, start, end):
+        prefix, batch_size = options['prefix'], self.batch_size
+        span = (end - start).total_seconds()
+
+        def at(fraction):
+            return start + datetime.timedelta(seconds=float(fraction) * span)
+
+        tags = [Tag.objects.get_or_create(name=name)[0] for name in CATEGORIES]
+
+        team_ids = np.zeros(0, dtype=np.int64)
+        if options['teams']:
+            teams = Team.objects.bulk_create(
+                [Team(name=f'{prefix}-team-{i}') for i in range(options['teams'])], batch_size=batch_size,
+            )
+            if teams[0].pk is None: # Backends without RETURNING on bulk inserts
+                teams = Team.objects.filter(name__startswith=f'{prefix}-team-').order_by('pk')
+            team_ids = np.array([team.pk for team in teams])
+        self.progress(f"Created {len(team_ids)} teams")
+
+        password = make_password(options['password']) # Hashed once, shared by every generated player
+        users = User.objects.bulk_create(
+            [
+                User(username=f'{prefix}-{i}', password=password, score=int(score),
+                     team_id=int(team_ids[team]) if team >= 0 else None, date_joined=at(joined))
+                for i, (score, team, joined) in enumerate(zip(plan['scores'], plan['teams'], plan['joined']))
+            ],
+            batch_size=batch_size,
+        )
+        if users[0].pk is None:
+            users = User.objects.filter(username__startswith=f'{prefix}-').order_by('pk')
+        user_ids = np.array([user.pk for user in users])
+        self.progress(f"Created {len(user_ids)} players")
+
+        challenges = Challenge.objects.bulk_create(
+            [
+                Challenge(
+                    name=f'{prefix}-{CATEGORIES[plan["category"][i]].lower()}-{i}',
+                    description=f"Generated {CATEGORIES[plan['category'][i]]} challenge, difficulty {plan['difficulty'][i]:.2f}.",
+                    flag=f'FLAG{{{prefix}-{i}}}', points=int(plan['current_points'][i]),
+                    initial_points=int(plan['initial_points'][i]), minimum_points=int(plan['minimum_points'][i]),
+                    decay_factor=int(plan['decay_factor'][i]), decay_function=str(plan['decay_function'][i]),
+                    is_dynamic=bool(plan['is_dynamic'][i]), is_published=True,
+                    first_blood_id=int(user_ids[plan['first_blood'][i]]) if plan['first_blood'][i] >= 0 else None,
+                )
+                for i in range(len(plan['difficulty']))
+            ],
+            batch_size=batch_size,
+        )
+        if challenges[0].pk is None:
+            challenges = Challenge.objects.filter(name__startswith=f'{prefix}-').order_by('pk')
+        challenge_ids = np.array([challenge.pk for challenge in challenges])
+        Challenge.tags.through.objects.bulk_create(
+            [
+                Challenge.tags.through(challenge_id=int(challenge_id), tag_id=tags[category].pk)
+                for challenge_id, category in zip(challenge_ids, plan['category'])
+            ],
+            batch_size=batch_size,
+        )
+        hints = Hint.objects.bulk_create(
+            [
+                Hint(challenge_id=int(challenge_ids[challenge]), text=f"Hint {i + 1} for a generated challenge.", cost=int(cost))
+                for i, (challenge, cost) in enumerate(zip(plan['hint_challenges'], plan['hint_costs']))
+            ],
+            batch_size=batch_size,
+        )
+        if hints and hints[0].pk is None:
+            hints = Hint.objects.filter(challenge__in=challenge_ids.tolist()).order_by('pk')
+        hint_ids = np.array([hint.pk for hint in hints])
+        self.progress(f"Created {len(challenge_ids)} challenges with {len(hint_ids)} hints")
+
+        solves = self.insert_rows(
+            Solve, ['user', 'challenge', 'solved_at', 'points_awarded'],
+            (
+                (int(user_ids[user]), int(challenge_ids[challenge]), at(fraction), int(points))
+                for user, challenge, fraction, points in zip(
+                    plan['solve_users'], plan['solve_challenges'], plan['solve_times'], plan['awarded'],
+                )
+            ),
+        )
+        self.progress(f"Inserted {solves} solves")
+        unlocks = self.insert_rows(
+            UnlockedHint, ['user', 'hint', 'unlocked_at'],
+            (
+                (int(user_ids[user]), int(hint_ids[hint]), at(fraction))
+                for user, hint, fraction in zip(plan['unlock_users'], plan['unlock_hints'], plan['unlock_times'])
+            ),
+        )
+        self.progress(f"Inserted {unlocks} hint unlocks")
+
+    def insert_rows(self, model, field_names, rows):
+        """
+        Inserts plain value tuples in batches, without model instances: COPY on PostgreSQL, multi-row
+        INSERTs elsewhere. Unlike bulk_create, it keeps the given timestamps of auto_now_add fields.
+        Returns the number of rows inserted.
+        """
+        fields = [model._meta.get_field(name) for name in field_names]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        inserted = 0
+        batch = []
+        with connection.cursor() as cursor:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    inserted += self._insert_batch(cursor, table, columns, fields, batch)
+                    batch = []
+            if batch:
+                inserted += self._insert_batch(cursor, table, columns, fields, batch)
+        return inserted
+
+    @staticmethod
+    def _insert_batch(cursor, table, columns, fields, batch):
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                [value.isoformat() if isinstance(value, datetime.datetime) else value for value in row] for row in batch
+            )
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                [[field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] for row in batch],
+            )
+        return len(batch)
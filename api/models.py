@@ -1,9 +1,13 @@
 # api/models.py
+import re
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class Team(models.Model):
@@ -69,6 +73,11 @@ class Challenge(models.Model):
     """
     Represents a CTF challenge.
     """
+    DECAY_FUNCTION_CHOICES = [
+        ('linear', 'Linear'),
+        ('logarithmic', 'Logarithmic'),
+        ('quadratic', 'Quadratic (CTFd-style)'),
+    ]
     name = models.CharField(max_length=255, unique=True, help_text="The name of the challenge.")
     description = models.TextField(help_text="Detailed description of the challenge.")
     points = models.IntegerField(
@@ -89,7 +98,14 @@ class Challenge(models.Model):
     decay_factor = models.IntegerField(
         default=10,
         validators=[MinValueValidator(0)],
-        help_text="Points to deduct per solve for dynamic challenges. E.g., 10 points per solve."
+        help_text="Linear decay: points to deduct per solve, e.g. 10 points per solve. "
+                  "Logarithmic/quadratic decay: number of solves after which the minimum points are reached."
+    )
+    decay_function = models.CharField(
+        max_length=12,
+        choices=DECAY_FUNCTION_CHOICES,
+        default='linear',
+        help_text="Curve used to decay points with each solve (used in dynamic scoring)."
     )
     flag = models.CharField(max_length=255, unique=False, help_text="The flag string for this challenge.")
     tags = models.ManyToManyField(
@@ -165,6 +181,48 @@ class Hint(models.Model):
         return f"Hint for '{self.challenge.name}' (Cost: {self.cost})"
 
 
+class Flag(models.Model):
+    """
+    An additional accepted flag for a challenge: an exact string or a regular expression.
+    The challenge's own 'flag' field is always accepted as well.
+    """
+    FLAG_TYPE_CHOICES = [
+        ('static', 'Static'),
+        ('regex', 'Regular Expression'),
+    ]
+    challenge = models.ForeignKey(
+        Challenge,
+        on_delete=models.CASCADE,
+        related_name='flags',
+        help_text="The challenge this flag belongs to."
+    )
+    flag_type = models.CharField(
+        max_length=10,
+        choices=FLAG_TYPE_CHOICES,
+        default='static',
+        help_text="Static flags must match exactly; regex flags must match the whole submission."
+    )
+    content = models.CharField(max_length=255, help_text="The flag string or regular expression.")
+    case_sensitive = models.BooleanField(default=False, help_text="Whether letter case must match.")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Flag"
+        verbose_name_plural = "Flags"
+        ordering = ['challenge', 'id']
+
+    def __str__(self):
+        return f"{self.get_flag_type_display()} flag for '{self.challenge.name}'"
+
+    def clean(self):
+        if self.flag_type == 'regex':
+            try:
+                re.compile(self.content)
+            except re.error as exc:
+                raise ValidationError({'content': f"Invalid regular expression: {exc}"})
+
+
 class UnlockedHint(models.Model):
     """
     Tracks which users have unlocked which hints.
@@ -209,6 +267,32 @@ class Solve(models.Model):
         return f"{self.user.username} solved {self.challenge.name} at {self.solved_at.strftime('%Y-%m-%d %H:%M:%S')}"
 
 
+class Submission(models.Model):
+    """
+    Append-only log of every flag submission attempt, correct or not.
+    Rows are written in batches by the submission log buffer (see api/submission_log.py),
+    so 'submitted_at' is set when the attempt is made rather than when the row is inserted.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submissions', help_text="The user who made the attempt.")
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='submissions', help_text="The challenge the attempt was for.")
+    flag = models.CharField(max_length=255, help_text="The submitted flag, as sent.")
+    is_correct = models.BooleanField(help_text="Whether the submitted flag was accepted.")
+    ip_address = models.GenericIPAddressField(null=True, blank=True, help_text="The client address the attempt came from.")
+    submitted_at = models.DateTimeField(default=timezone.now, db_index=True, help_text="Timestamp of the attempt.")
+
+    class Meta:
+        verbose_name = "Submission"
+        verbose_name_plural = "Submissions"
+        ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['challenge', 'submitted_at'], name='submission_challenge_time'),
+            models.Index(fields=['user', 'submitted_at'], name='submission_user_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} submitted to '{self.challenge.name}' ({'correct' if self.is_correct else 'incorrect'})"
+
+
 class CTFSetting(models.Model):
     """
     Singleton model to store global CTF settings like scoring mode.
@@ -224,6 +308,16 @@ class CTFSetting(models.Model):
         default='static',
         help_text="Defines how challenge points are awarded and updated."
     )
+    scoreboard_frozen = models.BooleanField(
+        default=False,
+        help_text="Freeze the public scoreboard. Players see a snapshot taken at freeze time; admins keep seeing live data."
+    )
+    frozen_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="When the scoreboard was frozen. Set automatically."
+    )
     # Add other global settings here as needed (e.g., event start/end times)
 
     class Meta:
@@ -234,6 +328,11 @@ class CTFSetting(models.Model):
         return "CTF Global Settings"
 
     def save(self, *args, **kwargs):
+        # Stamp the freeze time when the scoreboard gets frozen, and clear it when it is unfrozen
+        if not self.scoreboard_frozen:
+            self.frozen_at = None
+        elif self.frozen_at is None:
+            self.frozen_at = timezone.now()
         # Ensure only one instance of CTFSetting exists
         if CTFSetting.objects.exists() and not self.pk:
             # If an instance already exists and we are trying to create a new one,
@@ -242,6 +341,8 @@ class CTFSetting(models.Model):
             self.pk = existing_setting.pk
             # Update fields from the new instance to the existing one.
             existing_setting.scoring_mode = self.scoring_mode
+            existing_setting.scoreboard_frozen = self.scoreboard_frozen
+            existing_setting.frozen_at = self.frozen_at
             # ... update other fields as they are added
             super(CTFSetting, existing_setting).save(*args, **kwargs)
         else:
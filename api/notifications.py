@@ -0,0 +1,63 @@
+# api/notifications.py
+from .broadcast import notification_broadcaster
+
+# Every connection of a user is in the user's group, and in their team's group while they have a team.
+# Events are {"event": <name>, ...} and reach the client as {"type": "notification", "message": <event>}.
+
+
+def user_group(user_id):
+    return f'user:{user_id}'
+
+
+def team_group(team_id):
+    return f'team:{team_id}'
+
+
+def notify_user(user_id, event, /, **data):
+    """
+    Sends an event to the user's open connections once the surrounding transaction commits.
+    """
+    notification_broadcaster.publish_to(user_group(user_id), {'event': event, **data})
+
+
+def notify_team(team_id, event, /, **data):
+    """
+    Sends an event to the open connections of the team's members once the surrounding transaction commits.
+    """
+    notification_broadcaster.publish_to(team_group(team_id), {'event': event, **data})
+
+
+def notify_solve(user, challenge, points):
+    """
+    Tells the solver's team (or, without a team, the solver's other connections) about a solve.
+    """
+    notification_broadcaster.publish_to(*_solve_event(user, challenge, points))
+
+
+async def anotify_solve(user, challenge, points):
+    """
+    notify_solve() for async views, published right away.
+    """
+    await notification_broadcaster.apublish_to(*_solve_event(user, challenge, points))
+
+
+def _solve_event(user, challenge, points):
+    data = {'user_id': user.pk, 'username': user.username, 'challenge_id': challenge.pk,
+            'challenge': challenge.name, 'points': points}
+    group = team_group(user.team_id) if user.team_id is not None else user_group(user.pk)
+    return group, {'event': 'solve', **data}
+
+
+def notify_team_change(user, old_team_id, new_team_id):
+    """
+    Moves the user's open connections from the old team's group to the new one, and tells the user
+    and both teams. The old team hears about it before the connections leave, the new one after they joined.
+    """
+    if old_team_id is not None:
+        notify_team(old_team_id, 'member_left', user_id=user.pk, username=user.username)
+    notification_broadcaster.regroup(
+        user_group(user.pk), 'team:', team_group(new_team_id) if new_team_id is not None else None,
+    )
+    notify_user(user.pk, 'team_changed', team_id=new_team_id)
+    if new_team_id is not None:
+        notify_team(new_team_id, 'member_joined', user_id=user.pk, username=user.username)
@@ -0,0 +1,48 @@
+# api/redis_client.py
+import asyncio
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_async_client = None # (event loop, client)
+
+# Connections of the shared asyncio client. Concurrent requests beyond that wait up to ASYNC_POOL_TIMEOUT
+# seconds for a free connection; redis-py's default pool raises MaxConnectionsError instead.
+ASYNC_POOL_SIZE = 100
+ASYNC_POOL_TIMEOUT = 10
+
+
+def get_redis():
+    """
+    Returns the process-wide Redis client used for shared runtime state (leaderboards, caches).
+    The client's connection pool is thread-safe, so a single instance is shared by all request threads.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def new_async_redis():
+    """
+    Returns a new asyncio Redis client. Async clients are bound to the event loop they are used in,
+    so each long-lived task (e.g. a pub/sub subscriber) creates its own and closes it when done.
+    """
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def get_async_redis():
+    """
+    Returns the asyncio Redis client of the running event loop, shared by every async view it serves
+    (under daphne, all requests of the process), as get_redis()'s client is shared by request threads.
+    """
+    global _async_client
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client[0] is not loop:
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            settings.REDIS_URL, decode_responses=True, max_connections=ASYNC_POOL_SIZE, timeout=ASYNC_POOL_TIMEOUT,
+        )
+        _async_client = (loop, redis.asyncio.Redis(connection_pool=pool))
+    return _async_client[1]
@@ -5,4 +5,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/activity/$', consumers.ActivityConsumer.as_asgi()),
+    re_path(r'ws/leaderboard/$', consumers.LeaderboardConsumer.as_asgi()),
+    re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
 ]
@@ -0,0 +1,251 @@
+# api/scoreboard_freeze.py
+import hashlib
+import json
+import logging
+import threading
+import uuid
+
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+
+from .models import Team, CTFSetting
+from .redis_client import get_redis, get_async_redis
+from .ctf_settings import settings_cache, get_ctf_settings, aget_ctf_settings
+from .leaderboard import team_rows, player_rows
+from .timeline import TIMELINE_MAX_TOP, top_team_timeline
+from .serializers import LeaderboardSerializer, PlayerLeaderboardSerializer, TeamDetailSerializer
+
+logger = logging.getLogger(__name__)
+
+# Redis hash holding the frozen scoreboard: 'id', 'frozen_at' and one pre-serialized JSON document per view
+SNAPSHOT_KEY = 'scoreboard_snapshot'
+
+# Reads of a document that keep racing new snapshots being swapped in before giving up
+SNAPSHOT_READ_ATTEMPTS = 3
+
+
+class SnapshotUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The scoreboard is frozen and its snapshot is not available yet. Try again shortly."
+    default_code = 'snapshot_unavailable'
+
+
+def _render(data):
+    return JSONRenderer().render(data)
+
+
+def _etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()}"'
+
+
+def take_snapshot(frozen_at):
+    """
+    Serializes the public leaderboard, player leaderboard, top team timeline (ending at `frozen_at`)
+    and every team's detail view once, and stores them as the frozen scoreboard.
+    The documents are swapped in atomically, so readers see either the old or the new snapshot.
+    """
+    team_ranking = team_rows()
+    timeline_ids = [row['id'] for row in team_ranking[:TIMELINE_MAX_TOP]]
+    documents = {
+        'leaderboard': _render(LeaderboardSerializer(team_ranking, many=True).data),
+        'players': _render(PlayerLeaderboardSerializer(player_rows(), many=True).data),
+        'timeline': _render(top_team_timeline(
+            timeline_ids, {row['id']: row['name'] for row in team_ranking[:TIMELINE_MAX_TOP]}, end=frozen_at,
+        )),
+    }
+    for team in Team.objects.prefetch_related('members').iterator(chunk_size=500):
+        documents[f'team:{team.pk}'] = _render(TeamDetailSerializer(team).data)
+
+    redis = get_redis()
+    pipe = redis.pipeline(transaction=True)
+    pipe.delete(f'{SNAPSHOT_KEY}:new')
+    pipe.hset(f'{SNAPSHOT_KEY}:new', mapping={
+        'id': uuid.uuid4().hex,
+        'frozen_at': frozen_at.isoformat(),
+        **documents,
+    })
+    pipe.rename(f'{SNAPSHOT_KEY}:new', SNAPSHOT_KEY)
+    pipe.execute()
+    return len(documents)
+
+
+def drop_snapshot():
+    """
+    Unfreezes the scoreboard. Returns whether there was a snapshot.
+    """
+    return bool(get_redis().delete(SNAPSHOT_KEY))
+
+
+def snapshot_frozen_at():
+    """
+    The freeze time recorded in the current snapshot, as an ISO string, or None when there is no snapshot.
+    """
+    return get_redis().hget(SNAPSHOT_KEY, 'frozen_at')
+
+
+class FrozenDocument:
+    """
+    One pre-serialized view of the frozen scoreboard and its strong ETag.
+    """
+    __slots__ = ('body', 'etag', '_data', '_positions')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = _etag(body)
+        self._data = None
+        self._positions = None
+
+    @property
+    def data(self):
+        # Parsed lazily, and only for requests that need a slice of the document
+        if self._data is None:
+            self._data = json.loads(self.body)
+        return self._data
+
+    def position(self, row_id):
+        """
+        The 0-based position of the row with this id in a ranking document, or None if it has no such row.
+        """
+        if self._positions is None:
+            self._positions = {row['id']: position for position, row in enumerate(self.data)}
+        return self._positions.get(row_id)
+
+
+class SnapshotStore:
+    """
+    Process-local copy of the frozen scoreboard. A snapshot never changes once taken, so each
+    document is fetched from Redis once per process and afterwards served from memory; a request
+    only asks Redis for the snapshot's id (a few bytes) to notice a new freeze or an unfreeze.
+    """
+
+    def __init__(self):
+        self._snapshot_id = None
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def document(self, name):
+        """
+        Returns the named FrozenDocument, or None when there is no snapshot.
+        Raises KeyError when the snapshot has no such document.
+        """
+        redis = get_redis()
+        snapshot_id = redis.hget(SNAPSHOT_KEY, 'id')
+        for _ in range(SNAPSHOT_READ_ATTEMPTS):
+            if snapshot_id is None:
+                return None
+            document = self._cached(snapshot_id, name)
+            if document is not None:
+                return document
+            body, current_id = redis.hmget(SNAPSHOT_KEY, [name, 'id'])
+            if current_id == snapshot_id:
+                return self._store(snapshot_id, name, body)
+            snapshot_id = current_id # Another snapshot was swapped in between the two reads
+        return None
+
+    async def adocument(self, name):
+        redis = get_async_redis()
+        snapshot_id = await redis.hget(SNAPSHOT_KEY, 'id')
+        for _ in range(SNAPSHOT_READ_ATTEMPTS):
+            if snapshot_id is None:
+                return None
+            document = self._cached(snapshot_id, name)
+            if document is not None:
+                return document
+            body, current_id = await redis.hmget(SNAPSHOT_KEY, [name, 'id'])
+            if current_id == snapshot_id:
+                return self._store(snapshot_id, name, body)
+            snapshot_id = current_id
+        return None
+
+    def _cached(self, snapshot_id, name):
+        with self._lock:
+            if snapshot_id != self._snapshot_id:
+                self._snapshot_id, self._documents = snapshot_id, {}
+            return self._documents.get(name)
+
+    def _store(self, snapshot_id, name, body):
+        if body is None:
+            raise KeyError(name)
+        document = FrozenDocument(body.encode('utf-8'))
+        with self._lock:
+            if self._snapshot_id == snapshot_id:
+                self._documents[name] = document
+        return document
+
+
+snapshot_store = SnapshotStore()
+
+
+def frozen_document(request, name):
+    """
+    The named snapshot document for non-admin users while the scoreboard is frozen, or None when
+    the live view should answer. Whether the scoreboard is frozen is read from the CTF settings, never
+    inferred from the snapshot, so a missing snapshot (Redis flushed, or the snapshot could not be taken)
+    never exposes live standings: the request fails with 503 until the snapshot is taken again.
+    A document the snapshot lacks, such as a team created after the freeze, is a 404.
+    """
+    if request.user.is_staff or not get_ctf_settings().scoreboard_frozen:
+        return None
+    try:
+        document = snapshot_store.document(name)
+    except KeyError:
+        raise NotFound()
+    if document is None and not _missing_snapshot(CTFSetting.objects.filter(scoreboard_frozen=True).exists()):
+        return None
+    return document
+
+
+async def afrozen_document(request, name):
+    if request.user.is_staff or not (await aget_ctf_settings()).scoreboard_frozen:
+        return None
+    try:
+        document = await snapshot_store.adocument(name)
+    except KeyError:
+        raise NotFound()
+    if document is None and not _missing_snapshot(await CTFSetting.objects.filter(scoreboard_frozen=True).aexists()):
+        return None
+    return document
+
+
+def _missing_snapshot(frozen):
+    """
+    Handles a freeze without a snapshot, given whether the database still says the scoreboard is frozen.
+    Returns False when it does not: the cached settings predate an unfreeze, and are dropped.
+    """
+    if not frozen:
+        settings_cache.clear()
+        return False
+    logger.error("The scoreboard is frozen but its snapshot is missing; save the CTF settings to take it again.")
+    raise SnapshotUnavailable()
+
+
+def frozen_response(request, name, select=None, variant=None):
+    """
+    Serves the named snapshot document to non-admin users while the scoreboard is frozen, honouring
+    If-None-Match. Returns None when the live view should answer instead (see frozen_document()).
+    `select` narrows the parsed document (e.g. to one page); `variant` then distinguishes its ETag.
+    """
+    return _document_response(request, frozen_document(request, name), select, variant)
+
+
+async def afrozen_response(request, name, select=None, variant=None):
+    return _document_response(request, await afrozen_document(request, name), select, variant)
+
+
+def _document_response(request, document, select, variant):
+    if document is None:
+        return None
+
+    body, etag = document.body, document.etag
+    if select is not None:
+        body = _render(select(document.data))
+        etag = f'{document.etag[:-1]}-{variant}"'
+
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
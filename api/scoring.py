@@ -0,0 +1,200 @@
+# api/scoring.py
+import functools
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import User, Challenge, Solve, CTFSetting
+from .leaderboard import rebuild_player_leaderboard, rebuild_team_leaderboard
+from .timeline import rebuild_team_timeline
+from .challenge_cache import bump_challenge_version
+
+# Rows per UPDATE statement when writing rescored values back
+RESCORE_BATCH_SIZE = 1000
+
+# Point tables stop growing here; later solve counts are evaluated directly (only reachable with extreme settings)
+MAX_POINT_TABLE_SIZE = 10000
+
+DECAY_FUNCTION_CODES = {'linear': 0, 'logarithmic': 1, 'quadratic': 2}
+
+
+def evaluate_decay(function_codes, initial_points, minimum_points, decay_factors, solves_before):
+    """
+    Vectorized evaluation of the decay curves; all arguments are broadcastable integer arrays.
+    - linear:      initial - solves * decay_factor
+    - logarithmic: initial - (initial - minimum) * log(1 + solves) / log(1 + decay_factor)
+    - quadratic:   initial - (initial - minimum) * solves**2 / decay_factor**2 (CTFd's dynamic value)
+    For the logarithmic and quadratic curves, decay_factor is the solve count at which the minimum is reached,
+    and a decay_factor of 0 disables decay. Results are clamped to the minimum points.
+    """
+    codes = np.asarray(function_codes, dtype=np.int64)
+    initial = np.asarray(initial_points, dtype=np.int64)
+    minimum = np.asarray(minimum_points, dtype=np.int64)
+    decay = np.asarray(decay_factors, dtype=np.int64)
+    solves = np.asarray(solves_before, dtype=np.int64)
+
+    span = initial - minimum
+    steps = np.minimum(solves, np.maximum(decay, 1)) # Past decay_factor solves the curves sit at the minimum
+    divisor = np.maximum(decay, 1)
+    linear = initial - solves * decay
+    logarithmic = initial - np.floor(span * np.log1p(steps) / np.log1p(divisor)).astype(np.int64)
+    quadratic = initial - (span * steps * steps) // (divisor * divisor)
+    curved = np.where(decay == 0, initial, np.where(solves >= decay, minimum, np.where(codes == 1, logarithmic, quadratic)))
+    return np.maximum(np.where(codes == 0, linear, curved), minimum)
+
+
+@functools.lru_cache(maxsize=4096)
+def point_table(decay_function, initial_points, minimum_points, decay_factor):
+    """
+    Points awarded for each solve count, evaluated once per distinct set of scoring parameters.
+    The table ends at the first solve count that reaches the curve's final value, so it stays short;
+    editing a challenge's parameters simply selects a different table.
+    """
+    code = DECAY_FUNCTION_CODES[decay_function]
+    if decay_factor == 0:
+        length = 1
+    elif code == 0:
+        length = max(-(-(initial_points - minimum_points) // decay_factor), 0) + 1
+    else:
+        length = decay_factor + 1
+    solves = np.arange(min(length, MAX_POINT_TABLE_SIZE))
+    return tuple(int(points) for points in evaluate_decay(code, initial_points, minimum_points, decay_factor, solves))
+
+
+def decayed_points(challenge, solves_before):
+    """
+    Points for the solver who finds `solves_before` earlier solves of a dynamic challenge.
+    A lookup in the challenge's precomputed point table.
+    """
+    table = point_table(challenge.decay_function, challenge.initial_points, challenge.minimum_points, challenge.decay_factor)
+    if solves_before < len(table):
+        return table[solves_before]
+    if len(table) < MAX_POINT_TABLE_SIZE:
+        return table[-1]
+    return int(evaluate_decay(
+        DECAY_FUNCTION_CODES[challenge.decay_function], challenge.initial_points,
+        challenge.minimum_points, challenge.decay_factor, solves_before,
+    ))
+
+
+def bulk_current_points(challenges, solve_counts, dynamic_mode):
+    """
+    The value every solve of each challenge is worth once rescored, for many challenges at once.
+    Decaying challenges are worth what their latest solver was awarded, which is also what
+    SubmitFlagView stores in Challenge.points; other challenges keep their configured points.
+    Decay curves are evaluated in one vectorized pass rather than challenge by challenge.
+    """
+    points = [challenge.initial_points if not challenge.is_dynamic else challenge.points for challenge in challenges]
+    decaying = [index for index, challenge in enumerate(challenges) if dynamic_mode and challenge.is_dynamic]
+    if decaying:
+        values = evaluate_decay(
+            [DECAY_FUNCTION_CODES[challenges[index].decay_function] for index in decaying],
+            [challenges[index].initial_points for index in decaying],
+            [challenges[index].minimum_points for index in decaying],
+            [challenges[index].decay_factor for index in decaying],
+            [max(solve_counts[index] - 1, 0) for index in decaying],
+        )
+        for index, value in zip(decaying, values):
+            points[index] = int(value)
+    return points
+
+
+def rescore(challenge_ids=None):
+    """
+    Retroactively recomputes Challenge.points for the given challenges (all when None) and brings every
+    earlier Solve.points_awarded, User.score and team total in line with it.
+
+    Everything is set-based: one GROUP BY for solve counts, batched bulk updates for challenges,
+    one read of the stale solves, batched UPDATEs for the solves and one CASE update per batch of users.
+    User scores are adjusted by deltas rather than recomputed, so bonuses, hint costs and admin
+    adjustments are preserved. The affected challenges are locked for the duration.
+
+    Solves of challenges that do not decay (or whose first blood is claimed) are recorded without that
+    lock, so they can commit while a rescore runs. Only the solves read in that single pass are updated
+    and counted in the deltas; one that commits later, even with an id below the watermark, keeps the
+    points it was awarded and its solver's score stays consistent with them. Running the rescore again
+    brings it in line.
+
+    Returns a report dict with row counts and the elapsed time in seconds.
+    """
+    started = time.perf_counter()
+    dynamic_mode = CTFSetting.load().scoring_mode == 'dynamic'
+
+    with transaction.atomic():
+        challenges = Challenge.objects.select_for_update().order_by('pk').only(
+            'id', 'points', 'initial_points', 'minimum_points', 'decay_function', 'decay_factor', 'is_dynamic'
+        )
+        if challenge_ids is not None:
+            challenges = challenges.filter(pk__in=challenge_ids)
+        challenges = list(challenges)
+        ids = [challenge.pk for challenge in challenges]
+
+        # Only solves that exist now take part; later ones are left for the next rescore
+        watermark = Solve.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        solves = Solve.objects.filter(challenge__in=ids, pk__lte=watermark)
+        solve_counts = dict(
+            solves.order_by().values('challenge').annotate(solve_count=Count('id')).values_list('challenge', 'solve_count')
+        )
+
+        changed_challenges = []
+        new_points = bulk_current_points(challenges, [solve_counts.get(pk, 0) for pk in ids], dynamic_mode)
+        for challenge, points in zip(challenges, new_points):
+            if points != challenge.points:
+                challenge.points = points
+                changed_challenges.append(challenge)
+        Challenge.objects.bulk_update(changed_challenges, ['points'], batch_size=RESCORE_BATCH_SIZE)
+        if changed_challenges:
+            bump_challenge_version()
+
+        # Read once: under READ COMMITTED, a second statement could also see solves that committed in
+        # between, and update their points without counting them in their solver's delta
+        stale_solves = list(
+            solves.exclude(points_awarded=F('challenge__points')).order_by().values_list(
+                'pk', 'user', F('challenge__points') - Coalesce('points_awarded', 0)
+            )
+        )
+        deltas = defaultdict(int)
+        for _, user_id, delta in stale_solves:
+            deltas[user_id] += delta
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+
+        new_points = Subquery(Challenge.objects.filter(pk=OuterRef('challenge_id')).values('points')[:1])
+        solves_updated = 0
+        for start in range(0, len(stale_solves), RESCORE_BATCH_SIZE):
+            batch = [pk for pk, _, _ in stale_solves[start:start + RESCORE_BATCH_SIZE]]
+            solves_updated += Solve.objects.filter(pk__in=batch).update(points_awarded=new_points)
+
+        user_deltas = list(deltas.items())
+        for start in range(0, len(user_deltas), RESCORE_BATCH_SIZE):
+            batch = user_deltas[start:start + RESCORE_BATCH_SIZE]
+            User.objects.filter(pk__in=[user_id for user_id, _ in batch]).update(
+                score=F('score') + Case(
+                    *[When(pk=user_id, then=Value(delta)) for user_id, delta in batch],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+        teams_updated = (
+            User.objects.filter(pk__in=deltas, team__isnull=False).values('team').distinct().count()
+            if deltas else 0
+        )
+
+        # Team totals are sums of member scores, so both rankings (and the team score histories,
+        # whose earlier points changed too) are rebuilt once the new scores are visible
+        transaction.on_commit(rebuild_player_leaderboard, robust=True)
+        transaction.on_commit(rebuild_team_leaderboard, robust=True)
+        transaction.on_commit(rebuild_team_timeline, robust=True)
+
+    return {
+        'challenges_rescored': len(challenges),
+        'challenges_updated': len(changed_challenges),
+        'solves_updated': solves_updated,
+        'users_updated': len(deltas),
+        'teams_updated': teams_updated,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -1,7 +1,11 @@
 # api/serializers.py
+import re
+
 from rest_framework import serializers
 from django.contrib.auth.hashers import make_password
-from .models import User, Team, Tag, Challenge, Hint, UnlockedHint, Solve, WriteUp, ContentPage
+from .models import User, Team, Tag, Challenge, Hint, Flag, UnlockedHint, Solve, Submission, WriteUp, ContentPage
+from .user_progress import solved_challenges, unlocked_hints
+from .authentication import bump_user_version
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -52,6 +56,7 @@ class UserSerializer(serializers.ModelSerializer):
         # Handle password update separately to ensure it's hashed
         if 'password' in validated_data:
             instance.password = make_password(validated_data.pop('password'))
+            bump_user_version(instance.pk) # Reload the user in every worker's authentication cache
             
         # Update other allowed fields (email, first_name, last_name)
         return super().update(instance, validated_data)
@@ -80,12 +85,17 @@ class HintSerializer(serializers.ModelSerializer):
     def get_is_unlocked(self, obj):
         """
         Determines if the request user has unlocked this hint.
-        Requires 'request' in the serializer context.
+        Uses the 'unlocked_hint_ids' set from the serializer context; when the caller did not provide it,
+        it is read once from the requesting user's unlocked-hint set and stored in the (shared) context,
+        so rendering many hints never costs one lookup per hint.
         """
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UnlockedHint.objects.filter(user=request.user, hint=obj).exists()
-        return False
+        unlocked_hint_ids = self.context.get('unlocked_hint_ids')
+        if unlocked_hint_ids is None:
+            request = self.context.get('request')
+            if not (request and request.user.is_authenticated):
+                return False
+            unlocked_hint_ids = self.context['unlocked_hint_ids'] = unlocked_hints.ids(request.user.pk)
+        return obj.pk in unlocked_hint_ids
 
     def to_representation(self, instance):
         """
@@ -97,16 +107,43 @@ class HintSerializer(serializers.ModelSerializer):
         return representation
 
 
+def solved_by_request_user(serializer, challenge):
+    """
+    True if the requesting user has solved the challenge, from their solved-challenge set.
+    """
+    request = serializer.context.get('request')
+    if request and request.user.is_authenticated:
+        return solved_challenges.contains(request.user.pk, challenge.pk)
+    return False
+
+
+def challenge_stats_for(serializer, challenge):
+    """
+    Looks up a challenge's solve/attempt statistics in the 'challenge_stats' serializer context,
+    which the views fill for all serialized challenges at once.
+    """
+    stats = serializer.context.get('challenge_stats', {}).get(challenge.pk)
+    return stats or {'solves': 0, 'attempts': 0, 'attempters': 0, 'solve_rate': None}
+
+
 class ChallengeListSerializer(serializers.ModelSerializer):
     """
     Serializer for listing challenges.
-    Includes id, name, points, and tags.
+    Includes id, name, points, tags, the requesting user's solved badge, and solve/attempt statistics.
     """
     tags = TagSerializer(many=True, read_only=True)
+    solved = serializers.SerializerMethodField(help_text="True if the current user has solved this challenge.")
+    stats = serializers.SerializerMethodField(help_text="Solve count, attempt count, unique attempters and solve rate.")
 
     class Meta:
         model = Challenge
-        fields = ('id', 'name', 'points', 'tags')
+        fields = ('id', 'name', 'points', 'tags', 'solved', 'stats')
+
+    def get_solved(self, obj):
+        return solved_by_request_user(self, obj)
+
+    def get_stats(self, obj):
+        return challenge_stats_for(self, obj)
 
 
 class ChallengeDetailSerializer(serializers.ModelSerializer):
@@ -117,13 +154,58 @@ class ChallengeDetailSerializer(serializers.ModelSerializer):
     """
     tags = TagSerializer(many=True, read_only=True)
     hints = HintSerializer(many=True, read_only=True) # Nested hints using the new serializer
-    file = serializers.FileField(read_only=True, source='file.url', allow_null=True) # Get URL for the file
+    file = serializers.SerializerMethodField(help_text="URL of the attached file, or null.")
+    solved = serializers.SerializerMethodField(help_text="True if the current user has solved this challenge.")
+    stats = serializers.SerializerMethodField(help_text="Solve count, attempt count, unique attempters and solve rate.")
 
     class Meta:
         model = Challenge
-        fields = ('id', 'name', 'points', 'description', 'file', 'tags', 'hints')
+        fields = ('id', 'name', 'points', 'description', 'file', 'tags', 'hints', 'solved', 'stats')
         # Explicitly exclude the 'flag' field for security reasons
-        read_only_fields = ('id', 'name', 'points', 'description', 'file', 'tags', 'hints', 'is_published', 'is_dynamic', 'created_at', 'updated_at', 'first_blood')
+        read_only_fields = ('id', 'name', 'points', 'description', 'file', 'tags', 'hints', 'solved', 'stats', 'is_published', 'is_dynamic', 'created_at', 'updated_at', 'first_blood')
+
+    def get_file(self, obj):
+        # FieldFile.url raises for challenges without an attachment
+        return obj.file.url if obj.file else None
+
+    def get_solved(self, obj):
+        return solved_by_request_user(self, obj)
+
+    def get_stats(self, obj):
+        return challenge_stats_for(self, obj)
+
+
+class SharedHintSerializer(serializers.ModelSerializer):
+    """
+    Every hint field including the text, for the cached challenge payload.
+    The text is removed per user when the payload is served (see api/challenge_cache.py).
+    """
+    class Meta:
+        model = Hint
+        fields = ('id', 'cost', 'text')
+
+
+class SharedChallengeListSerializer(ChallengeListSerializer):
+    """
+    The user-independent part of ChallengeListSerializer, cached per challenge-set version.
+    """
+    solved = None
+    stats = None
+
+    class Meta(ChallengeListSerializer.Meta):
+        fields = ('id', 'name', 'points', 'tags')
+
+
+class SharedChallengeDetailSerializer(ChallengeDetailSerializer):
+    """
+    The user-independent part of ChallengeDetailSerializer, cached per challenge-set version.
+    """
+    hints = SharedHintSerializer(many=True, read_only=True)
+    solved = None
+    stats = None
+
+    class Meta(ChallengeDetailSerializer.Meta):
+        fields = ('id', 'name', 'points', 'description', 'file', 'tags', 'hints')
 
 
 class FlagSubmissionSerializer(serializers.Serializer):
@@ -186,6 +268,27 @@ class LeaderboardSerializer(serializers.Serializer):
     last_solve_time = serializers.DateTimeField(read_only=True, allow_null=True)
 
 
+class PlayerLeaderboardSerializer(serializers.Serializer):
+    """
+    Serializer for the individual leaderboard, showing user ID, username, score, and last solve time.
+    """
+    id = serializers.IntegerField(read_only=True)
+    username = serializers.CharField(read_only=True)
+    score = serializers.IntegerField(read_only=True)
+    last_solve_time = serializers.DateTimeField(read_only=True, allow_null=True)
+
+
+class PlayerRankSerializer(serializers.Serializer):
+    """
+    Serializer for the authenticated user's position on the individual leaderboard.
+    'rank' is 1-based and null if the user is not ranked yet.
+    """
+    rank = serializers.IntegerField(read_only=True, allow_null=True)
+    total_players = serializers.IntegerField(read_only=True)
+    score = serializers.IntegerField(read_only=True)
+    last_solve_time = serializers.DateTimeField(read_only=True, allow_null=True)
+
+
 class WriteUpSubmitSerializer(serializers.ModelSerializer):
     """
     Serializer for submitting a write-up.
@@ -233,6 +336,10 @@ class AdminUserSerializer(serializers.ModelSerializer):
         """
         if 'password' in validated_data:
             instance.set_password(validated_data.pop('password'))
+            bump_user_version(instance.pk)
+        # Authorization-relevant changes must reach every worker's authentication cache
+        if any(field in validated_data for field in ('is_active', 'is_staff', 'is_superuser', 'team')):
+            bump_user_version(instance.pk)
         return super().update(instance, validated_data)
 
 
@@ -266,13 +373,47 @@ class AdminChallengeSerializer(serializers.ModelSerializer):
         model = Challenge
         fields = (
             'id', 'name', 'description', 'points', 'initial_points',
-            'minimum_points', 'decay_factor', 'flag', 'tags',
+            'minimum_points', 'decay_function', 'decay_factor', 'flag', 'tags',
             'is_published', 'is_dynamic', 'file', 'created_at',
             'updated_at', 'first_blood'
         )
         read_only_fields = ('created_at', 'updated_at', 'first_blood') # These are managed by the system
 
 
+class AdminFlagSerializer(serializers.ModelSerializer):
+    """
+    Serializer for additional accepted flags, for administrative purposes.
+    Regular expressions are validated on write.
+    """
+    class Meta:
+        model = Flag
+        fields = ('id', 'challenge', 'flag_type', 'content', 'case_sensitive', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
+
+    def validate(self, attrs):
+        flag_type = attrs.get('flag_type', getattr(self.instance, 'flag_type', 'static'))
+        content = attrs.get('content', getattr(self.instance, 'content', ''))
+        if flag_type == 'regex':
+            try:
+                re.compile(content)
+            except re.error as exc:
+                raise serializers.ValidationError({'content': f"Invalid regular expression: {exc}"})
+        return attrs
+
+
+class AdminSubmissionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the submission attempt log, for administrative purposes.
+    """
+    username = serializers.CharField(source='user.username', read_only=True)
+    challenge_name = serializers.CharField(source='challenge.name', read_only=True)
+
+    class Meta:
+        model = Submission
+        fields = ('id', 'user', 'username', 'challenge', 'challenge_name', 'flag', 'is_correct', 'ip_address', 'submitted_at')
+        read_only_fields = fields
+
+
 class ContentPageSerializer(serializers.ModelSerializer):
     """
     Serializer for ContentPage model, used for both public viewing and admin management.
@@ -0,0 +1,142 @@
+# api/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import User, Team, Tag, Challenge, Hint, Flag, Solve, UnlockedHint, CTFSetting
+from .leaderboard import team_leaderboard, player_leaderboard, refresh_players, refresh_teams
+from .timeline import team_timeline
+from .flags import invalidate_flags
+from .challenge_cache import bump_challenge_version
+from .user_progress import solved_challenges, unlocked_hints
+from .ctf_settings import announce_settings_change
+from .authentication import bump_user_version
+from .scoreboard_freeze import take_snapshot, drop_snapshot, snapshot_frozen_at
+
+
+@receiver(post_save, sender=Team)
+def add_team_to_leaderboard(sender, instance, created, **kwargs):
+    """
+    New teams appear on the leaderboard with zero points, whichever path created them.
+    Other saves may have renamed the team, which live leaderboard viewers are told about.
+    """
+    if created:
+        refresh_teams(instance.pk)
+    else:
+        team_id = instance.pk
+        transaction.on_commit(lambda: team_leaderboard.announce(team_id, renamed=True), robust=True)
+
+
+@receiver(post_delete, sender=Team)
+def remove_team_from_leaderboard(sender, instance, **kwargs):
+    team_id = instance.pk # Captured now; the instance's pk is cleared once the delete finishes
+    transaction.on_commit(lambda: team_leaderboard.remove(team_id), robust=True)
+    transaction.on_commit(lambda: team_timeline.remove(team_id), robust=True)
+
+
+@receiver(pre_delete, sender=Team)
+def expire_cached_members(sender, instance, **kwargs):
+    """
+    Deleting a team clears its members' team with a bulk update, which sends no User signals,
+    so the members are evicted from the authentication cache here.
+    """
+    bump_user_version(*instance.members.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def add_player_to_leaderboard(sender, instance, created, **kwargs):
+    """
+    New players are ranked from the start. Later saves are ignored here; the code paths that
+    change a score update the ranking themselves, so the hot submit path pays nothing extra.
+    """
+    if created:
+        refresh_players(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def remove_player_from_leaderboard(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: player_leaderboard.remove(user_id), robust=True)
+    bump_user_version(user_id) # Tokens of a deleted user must stop working right away
+
+
+@receiver(post_save, sender=Flag)
+@receiver(post_delete, sender=Flag)
+def expire_cached_flags(sender, instance, **kwargs):
+    """
+    Bumps the challenge's updated_at so every worker's flag cache reloads it on the next submission.
+    """
+    Challenge.objects.filter(pk=instance.challenge_id).update(updated_at=timezone.now())
+    invalidate_flags(instance.challenge_id)
+
+
+@receiver(post_save, sender=Solve)
+def add_to_solved_set(sender, instance, created, **kwargs):
+    """
+    Writes every new solve through to the user's solved-challenge set, whichever path created it.
+    """
+    if created:
+        solved_challenges.add(instance.user_id, instance.challenge_id)
+
+
+@receiver(post_save, sender=UnlockedHint)
+def add_to_unlocked_set(sender, instance, created, **kwargs):
+    if created:
+        unlocked_hints.add(instance.user_id, instance.hint_id)
+
+
+@receiver(post_delete, sender=Solve)
+def expire_solved_set(sender, instance, **kwargs):
+    """
+    Removed solves (admin deletions, cascades) drop the user's set; it is reloaded on the next read.
+    """
+    solved_challenges.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=UnlockedHint)
+def expire_unlocked_set(sender, instance, **kwargs):
+    unlocked_hints.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Challenge)
+@receiver(post_delete, sender=Challenge)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Hint)
+@receiver(post_delete, sender=Hint)
+@receiver(m2m_changed, sender=Challenge.tags.through)
+def expire_challenge_payloads(sender, **kwargs):
+    """
+    Any saved or deleted challenge, tag or hint, and any change to a challenge's tags, invalidates
+    the cached challenge payloads, whether it came from the Django admin or the admin API.
+    Point changes made with QuerySet.update() bump the version where they happen.
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_challenge_version()
+
+
+@receiver(post_save, sender=CTFSetting)
+def sync_scoreboard_snapshot(sender, instance, **kwargs):
+    """
+    Tells every worker to drop its cached settings, takes the frozen scoreboard snapshot when the
+    scoreboard gets frozen and drops it when it is unfrozen. Other saves while frozen keep the existing
+    snapshot, or take it again if it is missing.
+    Views decide from the settings whether the scoreboard is frozen (see api/scoreboard_freeze.py), so a
+    freeze is announced once its snapshot is in place, and an unfreeze before its snapshot is dropped.
+    """
+    frozen_at = instance.frozen_at if instance.scoreboard_frozen else None
+
+    def sync():
+        changed = False
+        try:
+            if frozen_at is not None and snapshot_frozen_at() != frozen_at.isoformat():
+                changed = take_snapshot(frozen_at)
+        finally:
+            announce_settings_change() # Runs right away: there is no transaction left to wait for
+        if frozen_at is None:
+            changed = drop_snapshot()
+        if changed:
+            team_leaderboard.announce() # Live leaderboard viewers switch to or from the frozen ranking
+
+    transaction.on_commit(sync, robust=True)
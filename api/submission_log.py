@@ -0,0 +1,182 @@
+# api/submission_log.py
+import atexit
+import ipaddress
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, connection, transaction
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+
+class SubmissionBuffer:
+    """
+    Write-behind buffer for the submission log.
+
+    Request threads only append to an in-memory list; a background thread inserts the rows with
+    bulk_create once `batch_size` attempts are pending or `flush_interval` seconds have passed,
+    and the buffer is drained when the process exits. A crash therefore loses at most one
+    interval's (or one batch's) worth of attempts. If the database is unavailable, rows are kept
+    for the next flush, up to `max_pending`; beyond that the oldest are dropped and counted.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_pending=50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+
+    def record(self, user_id, challenge_id, flag, is_correct, ip_address=None):
+        """
+        Queues one attempt. Never touches the database on the calling thread.
+        """
+        entry = Submission(
+            user_id=user_id,
+            challenge_id=challenge_id,
+            flag=flag[:255],
+            is_correct=is_correct,
+            ip_address=ip_address,
+            submitted_at=timezone.now(),
+        )
+        with self._lock:
+            self._pending.append(entry)
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+            full = len(self._pending) >= self.batch_size
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Inserts everything queued so far. Returns the number of rows written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            close_old_connections()
+            try:
+                with transaction.atomic():
+                    Submission.objects.bulk_create(batch, batch_size=self.batch_size)
+            except (OperationalError, InterfaceError):
+                logger.exception("Failed to write %d submission log entries; will retry.", len(batch))
+                self._requeue(batch)
+                return 0
+            except DatabaseError:
+                # Some row can never be written, e.g. its user or challenge was deleted after it was queued.
+                # Retrying the batch would block the log for good, so the rows are written one at a time.
+                return self._write_rows(batch)
+            return len(batch)
+
+    def _write_rows(self, batch):
+        written = dropped = 0
+        for index, entry in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    Submission.objects.bulk_create([entry])
+            except (OperationalError, InterfaceError):
+                logger.exception("Failed to write %d submission log entries; will retry.", len(batch) - index)
+                self._requeue(batch[index:])
+                break
+            except DatabaseError:
+                dropped += 1
+            else:
+                written += 1
+        if dropped:
+            with self._lock:
+                self.dropped += dropped
+            logger.warning("Dropped %d submission log entries that cannot be written, e.g. of deleted users or challenges.", dropped)
+        return written
+
+    def _requeue(self, entries):
+        with self._lock:
+            self._pending[:0] = entries
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+
+    def shutdown(self):
+        """
+        Stops the background thread and writes out whatever is still queued.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=max(self.flush_interval, 1.0) * 5)
+        self.flush()
+
+    def _ensure_started(self):
+        # (Re)start the flusher lazily, so forked worker processes each get their own thread
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='submission-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self.flush()
+        finally:
+            connection.close()
+
+
+submission_buffer = SubmissionBuffer(
+    batch_size=getattr(settings, 'SUBMISSION_LOG_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'SUBMISSION_LOG_FLUSH_INTERVAL', 1.0),
+    max_pending=getattr(settings, 'SUBMISSION_LOG_MAX_PENDING', 50000),
+)
+atexit.register(submission_buffer.shutdown)
+
+
+def client_address(request):
+    """
+    The client address of a request, from X-Forwarded-For behind NUM_PROXIES proxies exactly as the
+    rate limiter identifies clients (see api/throttling.py), or None if it is not a valid IP address.
+    """
+    ident = BaseThrottle().get_ident(request)
+    try:
+        return str(ipaddress.ip_address(ident))
+    except ValueError:
+        return None
+
+
+def log_submission(request, challenge, flag, is_correct):
+    """
+    Records a flag submission attempt from a request in the write-behind submission log.
+    """
+    submission_buffer.record(
+        user_id=request.user.pk,
+        challenge_id=challenge.pk,
+        flag=flag,
+        is_correct=is_correct,
+        ip_address=client_address(request),
+    )
@@ -1,4 +1,311 @@
 # api/tests.py
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import challenge_stats, scoring, views
+from .leaderboard import (
+    check_player_leaderboard, check_team_leaderboard, rebuild_player_leaderboard, rebuild_team_leaderboard, record_score,
+)
+from .models import User, Team, Tag, Challenge, Hint, UnlockedHint, Solve, Submission, CTFSetting
+from .redis_client import get_redis
+from .scoreboard_freeze import SNAPSHOT_KEY
+from .serializers import ChallengeDetailSerializer
+from .submission_log import SubmissionBuffer
+from .user_progress import solved_challenges, unlocked_hints
+
+
+class ChallengeDetailQueryCountTests(TestCase):
+    """
+    Rendering a challenge's hints must cost a fixed number of queries, however many hints it has.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('player', password='x', score=1000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.forget_progress()
+        self.addCleanup(self.forget_progress)
+
+    def forget_progress(self):
+        # User ids repeat between test runs, while the Redis database persists
+        get_redis().delete(solved_challenges.key(self.user.pk), unlocked_hints.key(self.user.pk))
+
+    def make_challenge(self, hint_count, unlocked_count=0):
+        # Run the on-commit hooks so the challenge cache version is bumped as in production
+        with self.captureOnCommitCallbacks(execute=True):
+            challenge = Challenge.objects.create(
+                name=f'challenge-{hint_count}', description='d', flag='FLAG{x}', is_published=True,
+            )
+            challenge.tags.add(Tag.objects.create(name=f'tag-{hint_count}'))
+            Hint.objects.bulk_create(
+                [Hint(challenge=challenge, text=f'hint {i}', cost=i) for i in range(hint_count)]
+            )
+            hints = list(challenge.hints.order_by('pk'))
+            for hint in hints[:unlocked_count]:
+                UnlockedHint.objects.create(user=self.user, hint=hint)
+        return challenge
+
+    def detail_queries(self, challenge):
+        # Each challenge is new to the challenge cache, so this measures the cache's miss path (its prefetch)
+        self.forget_progress()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/challenges/{challenge.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def serializer_queries(self, challenge):
+        request = APIRequestFactory().get(f'/api/challenges/{challenge.pk}/')
+        request.user = self.user
+        self.forget_progress()
+        with CaptureQueriesContext(connection) as queries:
+            challenge = Challenge.objects.prefetch_related('tags', 'hints').get(pk=challenge.pk)
+            data = ChallengeDetailSerializer(challenge, context={'request': request}).data
+        return len(queries), data
+
+    def test_detail_view_query_count_is_flat(self):
+        few_queries, _ = self.detail_queries(self.make_challenge(hint_count=1, unlocked_count=1))
+        many_queries, data = self.detail_queries(self.make_challenge(hint_count=30, unlocked_count=10))
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(len(data['hints']), 30)
+
+    def test_cached_detail_view_does_not_query_challenge_data(self):
+        challenge = self.make_challenge(hint_count=30)
+        self.detail_queries(challenge) # Fills the challenge cache and the user's unlocked-hint set
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/challenges/{challenge.pk}/')
+        self.assertEqual(len(queries), 0)
+
+    def test_detail_serializer_query_count_is_flat(self):
+        few_queries, _ = self.serializer_queries(self.make_challenge(hint_count=1, unlocked_count=1))
+        many_queries, data = self.serializer_queries(self.make_challenge(hint_count=30, unlocked_count=10))
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(len(data['hints']), 30)
+
+    def test_only_unlocked_hints_include_text(self):
+        challenge = self.make_challenge(hint_count=4, unlocked_count=2)
+        for render in (self.detail_queries, self.serializer_queries):
+            _, data = render(challenge)
+            self.assertEqual([hint['is_unlocked'] for hint in data['hints']], [True, True, False, False])
+            self.assertEqual(['text' in hint for hint in data['hints']], [True, True, False, False])
+
+
+class SubmissionBufferTests(TransactionTestCase):
+    """
+    A buffered attempt that can never be written must not block the rest of the submission log.
+    """
+
+    def setUp(self):
+        # Never flushes on its own; the test flushes explicitly
+        self.buffer = SubmissionBuffer(batch_size=1000, flush_interval=3600)
+        self.addCleanup(self.buffer.shutdown)
+        self.challenge = Challenge.objects.create(name='c', description='d', flag='FLAG{x}', is_published=True)
+
+    def test_attempts_of_deleted_users_are_dropped(self):
+        player = User.objects.create_user('player', password='x')
+        deleted = User.objects.create_user('deleted', password='x')
+        self.buffer.record(player.pk, self.challenge.pk, 'FLAG{no}', False, '10.0.0.1')
+        self.buffer.record(deleted.pk, self.challenge.pk, 'FLAG{no}', False, '10.0.0.2')
+        deleted.delete()
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.pending, 0)
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(list(Submission.objects.values_list('user_id', flat=True)), [player.pk])
+
+        # Later attempts are written as usual
+        self.buffer.record(player.pk, self.challenge.pk, 'FLAG{x}', True, '10.0.0.1')
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Submission.objects.count(), 2)
+
+
+class RescoreTests(TestCase):
+    """
+    Rescoring brings every earlier solve of a challenge to its current value, and moves scores and
+    rankings by the same amounts.
+    """
+
+    def setUp(self):
+        settings = CTFSetting.load()
+        settings.scoring_mode = 'dynamic'
+        settings.save()
+        team = Team.objects.create(name='team')
+        self.challenge = Challenge.objects.create(
+            name='dynamic', description='d', flag='FLAG{x}', is_published=True, is_dynamic=True,
+            initial_points=500, minimum_points=100, decay_factor=100, decay_function='linear',
+        )
+        # Four solves as SubmitFlagView awards them: 500, 400, 300, then 200
+        self.players = []
+        for index, points in enumerate([500, 400, 300, 200]):
+            player = User.objects.create_user(f'player-{index}', password='x', team=team, score=points)
+            Solve.objects.create(user=player, challenge=self.challenge, points_awarded=points)
+            self.players.append(player)
+        Challenge.objects.filter(pk=self.challenge.pk).update(points=200)
+        # The first player paid 30 points for a hint, the second got a 50 point write-up bonus
+        User.objects.filter(pk=self.players[0].pk).update(score=500 - 30)
+        User.objects.filter(pk=self.players[1].pk).update(score=400 + 50)
+        # Now each solve costs only 50 points
+        Challenge.objects.filter(pk=self.challenge.pk).update(decay_factor=50)
+
+    def rescore(self):
+        # Run the on-commit hooks, which rebuild the rankings
+        with self.captureOnCommitCallbacks(execute=True):
+            return scoring.rescore([self.challenge.pk])
+
+    def scores(self):
+        players = User.objects.filter(pk__in=[player.pk for player in self.players]).order_by('pk')
+        return list(players.values_list('score', flat=True))
+
+    def test_rescore_keeps_hint_costs_and_bonuses(self):
+        report = self.rescore()
+
+        self.challenge.refresh_from_db()
+        self.assertEqual(self.challenge.points, 350) # 500 - 3 * 50 after four solves
+        self.assertEqual(
+            list(Solve.objects.filter(challenge=self.challenge).order_by('pk').values_list('points_awarded', flat=True)),
+            [350, 350, 350, 350],
+        )
+        self.assertEqual(self.scores(), [350 - 30, 350 + 50, 350, 350])
+        self.assertEqual((report['solves_updated'], report['users_updated'], report['teams_updated']), (4, 4, 1))
+        self.assertEqual(check_player_leaderboard(), [])
+        self.assertEqual(check_team_leaderboard(), [])
+
+    def test_solves_recorded_during_a_rescore_wait_for_the_next_one(self):
+        late_player = User.objects.create_user('late', password='x', team=self.players[0].team, score=200)
+        self.players.append(late_player)
+        real_bulk_current_points = scoring.bulk_current_points
+
+        def solve_during_rescore(*args, **kwargs):
+            # Recorded after the watermark was read, at the points the challenge had before
+            Solve.objects.create(user=late_player, challenge=self.challenge, points_awarded=200)
+            return real_bulk_current_points(*args, **kwargs)
+
+        with mock.patch.object(scoring, 'bulk_current_points', solve_during_rescore):
+            self.rescore()
+        late_solve = Solve.objects.get(user=late_player)
+        self.assertEqual(late_solve.points_awarded, 200)
+        self.assertEqual(self.scores(), [350 - 30, 350 + 50, 350, 350, 200])
+        self.assertEqual(check_player_leaderboard(), [])
+        self.assertEqual(check_team_leaderboard(), [])
+
+        self.rescore()
+        self.assertEqual(
+            list(Solve.objects.filter(challenge=self.challenge).values_list('points_awarded', flat=True)), [300] * 5,
+        )
+        self.assertEqual(self.scores(), [300 - 30, 300 + 50, 300, 300, 300])
+        self.assertEqual(check_player_leaderboard(), [])
+        self.assertEqual(check_team_leaderboard(), [])
+
+
+class ScoreboardFreezeTests(TestCase):
+    """
+    While the scoreboard is frozen, players never see live standings, even when the snapshot is missing.
+    """
+
+    def setUp(self):
+        self.team = Team.objects.create(name='team')
+        self.player = User.objects.create_user('player', password='x', team=self.team)
+        # The rankings persist in Redis between tests, while user and team ids repeat
+        rebuild_player_leaderboard()
+        rebuild_team_leaderboard()
+        self.client = APIClient()
+        self.client.force_authenticate(self.player)
+        self.set_frozen(True)
+        self.addCleanup(self.set_frozen, False)
+
+    def set_frozen(self, frozen):
+        # Run the on-commit hooks, which take or drop the snapshot and refresh the cached settings
+        with self.captureOnCommitCallbacks(execute=True):
+            settings = CTFSetting.load()
+            settings.scoreboard_frozen = frozen
+            settings.save()
+
+    def test_frozen_views_fail_closed_without_a_snapshot(self):
+        response = self.client.get('/api/leaderboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+
+        get_redis().delete(SNAPSHOT_KEY)
+        for path in ['/api/leaderboard/', '/api/leaderboard/players/', f'/api/teams/{self.team.pk}/', '/api/profile/rank/']:
+            self.assertEqual(self.client.get(path).status_code, 503, path)
+
+        # Saving the settings takes the snapshot again
+        self.set_frozen(True)
+        self.assertEqual(self.client.get('/api/leaderboard/').status_code, 200)
+
+    def test_teams_created_after_the_freeze_are_not_found(self):
+        late_team = Team.objects.create(name='late')
+        self.assertEqual(self.client.get(f'/api/teams/{late_team.pk}/').status_code, 404)
+
+    def test_rank_is_read_from_the_snapshot(self):
+        rival = User.objects.create_user('rival', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=rival.pk).update(score=100)
+            record_score(rival, 100)
+
+        data = self.client.get('/api/profile/rank/').json()
+        self.assertEqual((data['rank'], data['total_players'], data['score']), (1, 1, 0))
+
+
+class ChallengeStatsReconcileTests(TestCase):
+    """
+    Reconciling the solve counters must not lose solves counted while it runs.
+    """
+
+    def setUp(self):
+        self.challenge = Challenge.objects.create(name='c', description='d', flag='FLAG{x}', is_published=True)
+        self.players = [User.objects.create_user(f'player-{index}', password='x') for index in range(2)]
+        get_redis().hdel(challenge_stats.SOLVES_KEY, self.challenge.pk) # Challenge ids repeat between test runs
+
+    def solve_count(self):
+        return challenge_stats.get_challenge_stats([self.challenge.pk])[self.challenge.pk]['solves']
+
+    def test_solves_counted_during_a_reconcile_are_kept(self):
+        # A solve whose counter increment was lost
+        Solve.objects.create(user=self.players[0], challenge=self.challenge)
+        correct = get_redis().register_script(challenge_stats._CORRECT_SCRIPT)
+        calls = []
+
+        def solve_before_correcting(keys, args):
+            # Another solve commits and is counted after the counters and the database were read
+            if not calls:
+                Solve.objects.create(user=self.players[1], challenge=self.challenge)
+                get_redis().hincrby(challenge_stats.SOLVES_KEY, self.challenge.pk, 1)
+            calls.append(args)
+            return correct(keys=keys, args=args)
+
+        with mock.patch.object(challenge_stats, '_correct_script', solve_before_correcting):
+            self.assertEqual(challenge_stats.reconcile_challenge_stats(), 1)
+        self.assertEqual(len(calls), 2) # The counter moved, so it was read again
+        self.assertEqual(self.solve_count(), 2)
+        self.assertEqual(challenge_stats.reconcile_challenge_stats(), 0)
+
+
+class PlayerLeaderboardTests(TestCase):
+    """
+    The player ranking is paged by default and leaves out staff and deactivated accounts.
+    """
+
+    def setUp(self):
+        for index in range(4):
+            User.objects.create_user(f'player-{index}', password='x', score=100 * index)
+        User.objects.create_user('staff', password='x', score=1000, is_staff=True)
+        User.objects.create_user('inactive', password='x', score=1000, is_active=False)
+        rebuild_player_leaderboard()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username='player-0'))
+
+    def usernames(self, path):
+        return [row['username'] for row in self.client.get(path).json()]
+
+    def test_staff_and_inactive_accounts_are_not_ranked(self):
+        self.assertEqual(self.usernames('/api/leaderboard/players/'), ['player-3', 'player-2', 'player-1', 'player-0'])
+        self.assertEqual(check_player_leaderboard(), [])
+
+    def test_pages_have_a_default_and_a_maximum_size(self):
+        with mock.patch.object(views, 'LEADERBOARD_PAGE_SIZE', 2), mock.patch.object(views, 'LEADERBOARD_PAGE_MAX', 3):
+            self.assertEqual(self.usernames('/api/leaderboard/players/'), ['player-3', 'player-2'])
+            self.assertEqual(self.usernames('/api/leaderboard/players/?offset=1&limit=100'), ['player-2', 'player-1', 'player-0'])
@@ -0,0 +1,165 @@
+# api/throttling.py
+import logging
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.throttling import BaseThrottle
+
+from .redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# GCRA (generic cell rate algorithm): each limit keeps a single "theoretical arrival time" (TAT) per key,
+# which makes it a smooth sliding window in O(1) memory. All limits of a request are checked and
+# consumed in one atomic script call, so a request rejected by one limit does not use up the others.
+# KEYS: one per limit. ARGV: (emission interval ms, period ms) per key. Returns 0 if allowed, else the
+# milliseconds until the request would be allowed. The server clock is used so all workers agree.
+_GCRA_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local new_tats = {}
+local retry_after = 0
+for i = 1, #KEYS do
+    local interval = tonumber(ARGV[2 * i - 1])
+    local period = tonumber(ARGV[2 * i])
+    local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+    if tat < now then
+        tat = now
+    end
+    new_tats[i] = tat + interval
+    local allowed_at = new_tats[i] - period
+    if allowed_at > now and allowed_at - now > retry_after then
+        retry_after = allowed_at - now
+    end
+end
+if retry_after > 0 then
+    return retry_after
+end
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], new_tats[i], 'PX', new_tats[i] - now)
+end
+return 0
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Parses '<count>/<period>' where the period starts with s, m, h or d (e.g. '10/m', '100/hour').
+    Returns (count, period in seconds).
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0].lower()]
+
+
+class RateLimiter:
+    """
+    Shared rate limiter: every worker checks the same Redis keys through one atomic script.
+    """
+
+    def __init__(self, prefix='ratelimit'):
+        self.prefix = prefix
+        self._script = None
+        self._async_script = None
+
+    def hit(self, limits):
+        """
+        Counts one request against `limits`, a list of (key, rate) pairs, if every limit allows it.
+        Returns 0.0 when allowed, otherwise the seconds to wait before retrying.
+        """
+        if not limits:
+            return 0.0
+        if self._script is None:
+            self._script = get_redis().register_script(_GCRA_SCRIPT)
+        return int(self._script(**self._arguments(limits))) / 1000
+
+    async def ahit(self, limits):
+        if not limits:
+            return 0.0
+        client = get_async_redis()
+        if self._async_script is None or self._async_script.registered_client is not client:
+            self._async_script = client.register_script(_GCRA_SCRIPT)
+        return int(await self._async_script(**self._arguments(limits))) / 1000
+
+    def _arguments(self, limits):
+        keys, args = [], []
+        for key, rate in limits:
+            count, period = parse_rate(rate)
+            keys.append(f'{self.prefix}:{key}')
+            args += [period * 1000 // count, period * 1000]
+        return {'keys': keys, 'args': args}
+
+
+rate_limiter = RateLimiter()
+
+
+class RedisRateThrottle(BaseThrottle):
+    """
+    DRF throttle enforcing the limits configured in settings.RATE_LIMITS[scope], a mapping of
+    identity ('user', 'team', 'ip', 'challenge') to rate. Limits are shared across all worker processes.
+    Rejected requests get a 429 with a Retry-After header. If Redis is unreachable, requests are let through.
+    """
+    scope = None
+    limiter = rate_limiter
+
+    def get_identities(self, request, view):
+        """
+        The identity values this request is counted under; None skips that limit (e.g. users without a team).
+        """
+        user = request.user
+        is_authenticated = bool(user and user.is_authenticated)
+        challenge_id = view.kwargs.get('pk')
+        return {
+            'ip': self.get_ident(request),
+            'user': user.pk if is_authenticated else None,
+            'team': user.team_id if is_authenticated else None,
+            # Attempts at one challenge by one user
+            'challenge': f'{user.pk}:{challenge_id}' if is_authenticated and challenge_id is not None else None,
+        }
+
+    def get_limits(self, request, view):
+        """
+        The (key, rate) pairs this request is counted against; none while rate limiting is disabled.
+        """
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return []
+        rates = getattr(settings, 'RATE_LIMITS', {}).get(self.scope, {})
+        identities = self.get_identities(request, view)
+        return [
+            (f'{self.scope}:{identity}:{identities[identity]}', rate)
+            for identity, rate in rates.items()
+            if identities.get(identity) is not None
+        ]
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        try:
+            self.retry_after = self.limiter.hit(self.get_limits(request, view))
+        except RedisError:
+            logger.warning("Rate limiter unavailable; letting the request through.", exc_info=True)
+            return True
+        return not self.retry_after
+
+    async def aallow_request(self, request, view):
+        """
+        allow_request() for async views (see api/async_views.py).
+        """
+        self.retry_after = None
+        try:
+            self.retry_after = await self.limiter.ahit(self.get_limits(request, view))
+        except RedisError:
+            logger.warning("Rate limiter unavailable; letting the request through.", exc_info=True)
+            return True
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class RegisterThrottle(RedisRateThrottle):
+    scope = 'register'
+
+
+class SubmitFlagThrottle(RedisRateThrottle):
+    scope = 'submit'
@@ -0,0 +1,170 @@
+# api/timeline.py
+import bisect
+import datetime
+import json
+
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Team, Solve
+from .redis_client import get_redis
+
+# Points per series in the served timeline, however many score changes a team has
+TIMELINE_POINTS = 100
+
+# How long a computed timeline is served before it is recomputed; viewers in between share one computation
+TIMELINE_CACHE_SECONDS = 5
+
+# Largest 'top' a client may ask for
+TIMELINE_MAX_TOP = 50
+
+
+def _timestamp(value):
+    return value.timestamp()
+
+
+def _isoformat(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat()
+
+
+class ScoreTimeline:
+    """
+    Cumulative score history per member (team), one Redis sorted set per member.
+    Each score change appends a (time, score after the change) point, scored by its timestamp,
+    so appends are O(log n) and reading a series never touches the database.
+    """
+
+    def __init__(self, name):
+        self.key_prefix = f'timeline:{name}:'
+
+    def key(self, member_id):
+        return f'{self.key_prefix}{member_id}'
+
+    def append(self, member_id, when, score):
+        # The score is part of the member so repeated scores at different times are all kept
+        timestamp = _timestamp(when)
+        get_redis().zadd(self.key(member_id), {f'{timestamp!r}:{int(score)}': timestamp})
+
+    def remove(self, member_id):
+        get_redis().delete(self.key(member_id))
+
+    def replace(self, histories):
+        """
+        Atomically replaces every series with `histories`, a mapping of member id -> [(time, score)].
+        Returns the number of series written.
+        """
+        redis = get_redis()
+        stale_keys = list(redis.scan_iter(match=f'{self.key_prefix}*', count=1000))
+        pipe = redis.pipeline(transaction=True)
+        if stale_keys:
+            pipe.delete(*stale_keys)
+        for member_id, points in histories.items():
+            if points:
+                pipe.zadd(self.key(member_id), {
+                    f'{_timestamp(when)!r}:{int(score)}': _timestamp(when) for when, score in points
+                })
+        pipe.execute()
+        return len(histories)
+
+    def series(self, member_ids, points=TIMELINE_POINTS, end=None):
+        """
+        Downsamples the members' histories onto `points` evenly spaced instants between the first
+        recorded change and `end` (default: now). Returns (ISO timestamps, {member id: [scores]}),
+        where each score is the member's cumulative score at that instant.
+        """
+        if not member_ids:
+            return [], {}
+        pipe = get_redis().pipeline(transaction=False)
+        for member_id in member_ids:
+            pipe.zrange(self.key(member_id), 0, -1, withscores=True)
+        histories = {}
+        for member_id, entries in zip(member_ids, pipe.execute()):
+            histories[member_id] = (
+                [timestamp for _, timestamp in entries],
+                [int(entry.rsplit(':', 1)[1]) for entry, _ in entries],
+            )
+
+        starts = [times[0] for times, _ in histories.values() if times]
+        if not starts:
+            return [], {member_id: [] for member_id in member_ids}
+        start = min(starts)
+        end = _timestamp(end or timezone.now())
+        step = max(end - start, 0) / max(points - 1, 1)
+        instants = [start + step * index for index in range(points)]
+
+        sampled = {}
+        for member_id, (times, scores) in histories.items():
+            # Score of the latest change at or before each instant, 0 before the first one
+            sampled[member_id] = [
+                scores[position - 1] if position else 0
+                for position in (bisect.bisect_right(times, instant) for instant in instants)
+            ]
+        return [_isoformat(instant) for instant in instants], sampled
+
+
+team_timeline = ScoreTimeline('teams')
+
+
+def team_histories_from_db():
+    """
+    Reconstructs every team's score history from its members' solves. Score changes that are not
+    solves (hint costs, write-up bonuses, team moves) carry no timestamp in the database, so any
+    remaining difference to the current team total is added as one final point at the current time.
+    """
+    histories = {}
+    running = {}
+    solves = (
+        Solve.objects.filter(user__team__isnull=False).order_by('solved_at', 'id')
+        .values_list('user__team', 'solved_at', 'points_awarded')
+    )
+    for team_id, solved_at, points_awarded in solves.iterator(chunk_size=2000):
+        running[team_id] = running.get(team_id, 0) + (points_awarded or 0)
+        histories.setdefault(team_id, []).append((solved_at, running[team_id]))
+
+    now = timezone.now()
+    totals = Team.objects.annotate(total_score=Coalesce(Sum('members__score'), 0)).values_list('id', 'total_score')
+    for team_id, total_score in totals:
+        if running.get(team_id, 0) != total_score:
+            histories.setdefault(team_id, []).append((now, total_score))
+    return histories
+
+
+def rebuild_team_timeline():
+    return team_timeline.replace(team_histories_from_db())
+
+
+def top_team_timeline(team_ids, names, points=TIMELINE_POINTS, end=None):
+    """
+    Builds the timeline payload for the given ranked teams: shared sample times up to `end` (default: now)
+    and one score series per team.
+    """
+    times, sampled = team_timeline.series(team_ids, points, end)
+    return {
+        'times': times,
+        'teams': [
+            {'id': team_id, 'name': names[team_id], 'scores': sampled[team_id]}
+            for team_id in team_ids
+            if team_id in names
+        ],
+    }
+
+
+def cached_json(key, compute, ttl=TIMELINE_CACHE_SECONDS):
+    """
+    Returns `compute()` serialized to JSON, shared through Redis for `ttl` seconds.
+    Once the entry goes stale, a single caller recomputes it while the others keep serving the
+    previous copy, so a burst of viewers costs one computation rather than one each.
+    """
+    redis = get_redis()
+    payload, fresh = redis.mget(key, f'{key}:fresh')
+    if payload is not None and (fresh is not None or not redis.set(f'{key}:lock', 1, nx=True, ex=max(ttl, 1) * 2)):
+        return payload
+
+    payload = json.dumps(compute(), separators=(',', ':'))
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(key, payload, ex=max(ttl, 1) * 60)
+    pipe.set(f'{key}:fresh', 1, ex=ttl)
+    pipe.delete(f'{key}:lock')
+    pipe.execute()
+    return payload
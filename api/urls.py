@@ -2,27 +2,36 @@
 from django.urls import path
 from .views import (
     RegisterView,
-    ProfileView,
-    ChallengeListView,
+    ProfileRankView,
     ChallengeDetailView,
-    SubmitFlagView,
     UnlockHintView,
     TeamListCreateView,
     TeamDetailView,
     JoinTeamView,
     LeaveTeamView,
-    LeaderboardView,
+    PlayerLeaderboardView,
+    LeaderboardTimelineView,
+    ActivityView,
+    WebSocketGaugesView,
     WriteUpSubmitView,
     ContentPageView,
 )
+# Async-native versions of the hottest endpoints (see api/async_views.py)
+from .async_views import (
+    AsyncProfileView,
+    AsyncChallengeListView,
+    AsyncSubmitFlagView,
+    AsyncLeaderboardView,
+)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
-    path('profile/', ProfileView.as_view(), name='profile'),
+    path('profile/', AsyncProfileView.as_view(), name='profile'),
+    path('profile/rank/', ProfileRankView.as_view(), name='profile_rank'),
 
-    path('challenges/', ChallengeListView.as_view(), name='challenge_list'),
+    path('challenges/', AsyncChallengeListView.as_view(), name='challenge_list'),
     path('challenges/<int:pk>/', ChallengeDetailView.as_view(), name='challenge_detail'),
-    path('challenges/<int:pk>/submit/', SubmitFlagView.as_view(), name='submit_flag'),
+    path('challenges/<int:pk>/submit/', AsyncSubmitFlagView.as_view(), name='submit_flag'),
 
     path('hints/<int:pk>/unlock/', UnlockHintView.as_view(), name='unlock_hint'),
 
@@ -31,7 +40,12 @@ urlpatterns = [
     path('teams/<int:pk>/join/', JoinTeamView.as_view(), name='team_join'),
     path('teams/leave/', LeaveTeamView.as_view(), name='team_leave'),
     
-    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/', AsyncLeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/players/', PlayerLeaderboardView.as_view(), name='player_leaderboard'),
+    path('leaderboard/timeline/', LeaderboardTimelineView.as_view(), name='leaderboard_timeline'),
+
+    path('activity/', ActivityView.as_view(), name='activity'),
+    path('stats/websockets/', WebSocketGaugesView.as_view(), name='websocket_gauges'),
 
     path('writeups/', WriteUpSubmitView.as_view(), name='writeup_submit'),
     
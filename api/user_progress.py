@@ -0,0 +1,112 @@
+# api/user_progress.py
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from .models import Solve, UnlockedHint
+from .redis_client import get_redis, get_async_redis
+
+# Idle per-user sets expire after this many seconds and are rebuilt from the database on the next read
+PROGRESS_TTL = 24 * 60 * 60
+
+# Always present in a loaded set, so a loaded but empty set can be told apart from a missing one.
+# Primary keys start at 1, so it never collides with a real id.
+_LOADED = 0
+
+
+class ProgressSet:
+    """
+    A per-user Redis set of the ids of the challenges a user solved, or the hints they unlocked.
+    Writes go through on commit; a set that is not loaded (new user, expired, evicted, invalidated)
+    is filled from the database on the next read, so membership tests cost one Redis round trip
+    and no query. Loading only adds ids, so it can never undo a concurrent write-through.
+    """
+
+    def __init__(self, name, model, field):
+        self.name = name
+        self.model = model
+        self.field = field
+
+    def key(self, user_id):
+        return f'user_progress:{user_id}:{self.name}'
+
+    def _from_db(self, user_id):
+        return set(self.model.objects.filter(user_id=user_id).values_list(self.field, flat=True))
+
+    def _load(self, user_id):
+        ids = self._from_db(user_id)
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.sadd(self.key(user_id), _LOADED, *ids)
+        pipe.expire(self.key(user_id), PROGRESS_TTL)
+        pipe.execute()
+        return ids
+
+    def ids(self, user_id):
+        """
+        Returns the set of ids for the user.
+        """
+        try:
+            members = {int(member) for member in get_redis().smembers(self.key(user_id))}
+        except RedisError:
+            return self._from_db(user_id)
+        if _LOADED not in members:
+            return self._load(user_id) | members
+        return members - {_LOADED}
+
+    def contains(self, user_id, object_id):
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.sismember(self.key(user_id), _LOADED)
+            pipe.sismember(self.key(user_id), object_id)
+            loaded, is_member = pipe.execute()
+        except RedisError:
+            return self.model.objects.filter(user_id=user_id, **{self.field: object_id}).exists()
+        if not loaded and not is_member:
+            return object_id in self._load(user_id)
+        return bool(is_member)
+
+    async def aids(self, user_id):
+        """
+        ids() for async views. Only loading a set that is missing from Redis leaves the event loop.
+        """
+        try:
+            members = {int(member) for member in await get_async_redis().smembers(self.key(user_id))}
+        except RedisError:
+            return await sync_to_async(self._from_db)(user_id)
+        if _LOADED not in members:
+            return await sync_to_async(self._load)(user_id) | members
+        return members - {_LOADED}
+
+    async def acontains(self, user_id, object_id):
+        try:
+            pipe = get_async_redis().pipeline(transaction=False)
+            pipe.sismember(self.key(user_id), _LOADED)
+            pipe.sismember(self.key(user_id), object_id)
+            loaded, is_member = await pipe.execute()
+        except RedisError:
+            return await self.model.objects.filter(user_id=user_id, **{self.field: object_id}).aexists()
+        if not loaded and not is_member:
+            return object_id in await sync_to_async(self._load)(user_id)
+        return bool(is_member)
+
+    def add(self, user_id, object_id):
+        """
+        Adds an id once the surrounding transaction commits.
+        """
+        def apply():
+            pipe = get_redis().pipeline(transaction=True)
+            pipe.sadd(self.key(user_id), object_id)
+            pipe.expire(self.key(user_id), PROGRESS_TTL)
+            pipe.execute()
+
+        transaction.on_commit(apply, robust=True)
+
+    def invalidate(self, user_id):
+        """
+        Drops the user's set once the surrounding transaction commits, e.g. after rows were deleted.
+        """
+        transaction.on_commit(lambda: get_redis().delete(self.key(user_id)), robust=True)
+
+
+solved_challenges = ProgressSet('solved', Solve, 'challenge_id')
+unlocked_hints = ProgressSet('hints', UnlockedHint, 'hint_id')
@@ -3,46 +3,57 @@ import json # Import json for sending messages
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from django.db.models import Sum, Max, Count
-from django.db.models.functions import Coalesce # Import Coalesce for handling NULLs
+from django.http import Http404, HttpResponse
+from django.db import transaction, IntegrityError
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 
-# Channels imports
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-
-# Rate limiting import
-from ratelimit.decorators import ratelimit
-
 from .models import User, Challenge, Solve, Hint, UnlockedHint, Team, CTFSetting, WriteUp, ContentPage
 from .serializers import (
     UserSerializer,
-    ChallengeListSerializer,
-    ChallengeDetailSerializer,
     FlagSubmissionSerializer,
     HintSerializer,
     TeamListSerializer,
     TeamDetailSerializer,
     TeamCreateSerializer,
     LeaderboardSerializer,
+    PlayerLeaderboardSerializer,
+    PlayerRankSerializer,
     WriteUpSubmitSerializer,
     ContentPageSerializer,
 )
 from .permissions import CanSubmitWriteUp
+from .leaderboard import (
+    LEADERBOARD_PAGE_MAX, LEADERBOARD_PAGE_SIZE, player_leaderboard, team_rows, player_rows, record_score, refresh_teams,
+)
+from .scoring import decayed_points
+from .flags import check_flag
+from .submission_log import log_submission
+from .challenge_stats import EMPTY_STATS, count_attempt, count_solve, get_challenge_stats
+from .challenge_cache import challenge_cache, bump_challenge_version, user_hint_view
+from .user_progress import solved_challenges, unlocked_hints
+from .ctf_settings import get_ctf_settings
+from .authentication import bump_user_version
+from .broadcast import activity_broadcaster, EVENT_ID_RE, HISTORY_PAGE_MAX
+from .connection_limits import process_gauges
+from .notifications import notify_user, notify_solve, notify_team_change
+from .throttling import RegisterThrottle, SubmitFlagThrottle
+from .timeline import TIMELINE_MAX_TOP, top_team_timeline, cached_json
+from .scoreboard_freeze import frozen_document, frozen_response
 
 
-@ratelimit(key='ip', rate='5/m', block=True) # Rate limit registration attempts by IP
 class RegisterView(generics.CreateAPIView):
     """
     API endpoint for user registration.
     Allows creation of new User instances without requiring authentication.
+    Registration attempts are rate limited by IP.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (AllowAny,) # Anyone can register
+    throttle_classes = (RegisterThrottle,)
 
 
 class ProfileView(generics.RetrieveUpdateAPIView):
@@ -58,39 +69,94 @@ class ProfileView(generics.RetrieveUpdateAPIView):
         """
         Returns the user instance associated with the current request.
         This ensures users can only view and update their own profiles.
+        The row is read fresh: request.user comes from the authentication cache, whose score may be stale.
+        """
+        return User.objects.select_related('team').get(pk=self.request.user.pk)
+
+
+class ProfileRankView(APIView):
+    """
+    API endpoint returning the authenticated user's rank on the individual leaderboard.
+    The rank is an O(log n) sorted-set lookup instead of counting every user with a higher score.
+    While the scoreboard is frozen, non-admins get their rank in the snapshot taken at freeze time.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        frozen = frozen_document(request, 'players')
+        if frozen is not None:
+            entry = self.frozen_entry(frozen, user.pk)
+            total_players = len(frozen.data)
+        else:
+            entry = player_leaderboard.entry(user.pk)
+            total_players = player_leaderboard.count()
+        serializer = PlayerRankSerializer({
+            'rank': entry['rank'] if entry else None,
+            'total_players': total_players,
+            'score': entry['score'] if entry else user.score,
+            'last_solve_time': entry['last_solve_time'] if entry else None,
+        })
+        return Response(serializer.data)
+
+    @staticmethod
+    def frozen_entry(document, user_id):
+        """
+        The user's row in the frozen player ranking, with its rank, or None if the user was not ranked at freeze time.
         """
-        return self.request.user
+        position = document.position(user_id)
+        if position is None:
+            return None
+        row = document.data[position]
+        return {'rank': position + 1, 'score': row['score'], 'last_solve_time': row['last_solve_time']}
 
 
-class ChallengeListView(generics.ListAPIView):
+class ChallengeListView(APIView):
     """
     API endpoint for listing all published challenges.
     Only includes challenges where is_published is True.
     Requires authentication.
     """
-    queryset = Challenge.objects.filter(is_published=True).order_by('points', 'name')
-    serializer_class = ChallengeListSerializer
     permission_classes = (IsAuthenticated,)
 
+    def get(self, request, *args, **kwargs):
+        """
+        Serves the cached, pre-serialized challenge list (see api/challenge_cache.py) with the
+        solve/attempt statistics, read for the whole list in a single Redis round trip, and the
+        user's solved badges (see api/user_progress.py) merged in.
+        """
+        challenges = challenge_cache.challenge_list()
+        stats = get_challenge_stats([challenge['id'] for challenge in challenges])
+        solved_ids = solved_challenges.ids(request.user.pk)
+        return Response([
+            {**challenge, 'solved': challenge['id'] in solved_ids, 'stats': stats.get(challenge['id'], EMPTY_STATS)}
+            for challenge in challenges
+        ])
+
 
-class ChallengeDetailView(generics.RetrieveAPIView):
+class ChallengeDetailView(APIView):
     """
     API endpoint for retrieving a single published challenge's details.
     Only allows access to challenges where is_published is True.
     Requires authentication.
     """
-    queryset = Challenge.objects.filter(is_published=True)
-    serializer_class = ChallengeDetailSerializer
     permission_classes = (IsAuthenticated,)
 
-    def get_serializer_context(self):
+    def get(self, request, pk, *args, **kwargs):
         """
-        Passes the request context to the serializer,
-        which is needed by the HintSerializer to determine if a hint is unlocked.
+        Serves the cached, pre-serialized challenge (see api/challenge_cache.py) with the requesting
+        user's solved badge and hint unlocks (see api/user_progress.py) and the challenge statistics merged in.
         """
-        context = super().get_serializer_context()
-        context['request'] = self.request
-        return context
+        challenge = challenge_cache.challenge_detail(pk)
+        if challenge is None:
+            raise Http404
+        unlocked_hint_ids = unlocked_hints.ids(request.user.pk)
+        return Response({
+            **challenge,
+            'hints': [user_hint_view(hint, unlocked_hint_ids) for hint in challenge['hints']],
+            'solved': solved_challenges.contains(request.user.pk, pk),
+            'stats': get_challenge_stats([pk]).get(pk, EMPTY_STATS),
+        })
 
 
 class SubmitFlagView(APIView):
@@ -99,95 +165,129 @@ class SubmitFlagView(APIView):
     Requires authentication.
     """
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (SubmitFlagThrottle,) # Shared limits per user, user+challenge, team and IP
     serializer_class = FlagSubmissionSerializer # Used for request body validation
 
-    @ratelimit(key='user_or_ip', rate='10/m', block=True) # Rate limit flag submission attempts
     def post(self, request, pk, *args, **kwargs):
         """
         Handles the submission of a flag for a specific challenge.
         Implements dynamic scoring logic based on CTFSetting.
         Broadcasts successful solves to the activity feed.
         """
-        challenge = get_object_or_404(Challenge, pk=pk, is_published=True)
+        # The flag material comes from the in-process flag cache, so the flag column is not read here
+        challenge = get_object_or_404(Challenge.objects.defer('flag', 'description'), pk=pk, is_published=True)
         user = request.user
 
-        # 1. Check if the user has already solved this challenge
-        if Solve.objects.filter(user=user, challenge=challenge).exists():
+        # 1. Validate the incoming flag data
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submitted_flag = serializer.validated_data['flag']
+
+        # Solved challenges are rejected from the user's solved set without a query; the unique
+        # constraint below still catches concurrent duplicates.
+        if solved_challenges.contains(user.pk, challenge.pk):
             return Response(
                 {"detail": "Challenge already solved."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 2. Validate the incoming flag data
-        serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        submitted_flag = serializer.validated_data['flag']
+        # 2. Compare the submitted flag with the challenge's accepted flags (see api/flags.py)
+        # Every attempt goes to the write-behind submission log; no INSERT happens on this thread.
+        is_correct = check_flag(challenge, submitted_flag)
+        log_submission(request, challenge, submitted_flag, is_correct)
+        count_attempt(challenge.pk, user.pk)
+        if not is_correct:
+            return Response(
+                {"detail": "Incorrect flag."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # 3. Compare the submitted flag with the challenge's flag (case-insensitive and strip whitespace)
-        if submitted_flag.strip().lower() == challenge.flag.strip().lower():
-            # Flag is correct
-            with transaction.atomic():
-                ctf_settings = CTFSetting.load()
-                points_awarded_for_this_solve = challenge.points # Default to current points
+        # 3. Record the solve. Duplicate solves are rejected by the unique_user_challenge_solve
+        # constraint rather than a racy pre-check query.
+        try:
+            solve_instance = self.record_solve(user, challenge)
+        except IntegrityError:
+            return Response(
+                {"detail": "Challenge already solved."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        points_awarded_for_this_solve = solve_instance.points_awarded
+
+        # Broadcast the solve event to the activity feed. The event is encoded once and published on commit;
+        # each ASGI process fans it out to its own connections (see api/broadcast.py).
+        activity_broadcaster.publish({
+            'user': user.username,
+            'challenge': challenge.name,
+            'points': points_awarded_for_this_solve,
+            'timestamp': str(solve_instance.solved_at) # Get actual solve timestamp
+        })
+        notify_solve(user, challenge, points_awarded_for_this_solve) # Teammates' open connections
+
+        return Response(
+            {"detail": "Flag submitted successfully!", "points_awarded": points_awarded_for_this_solve},
+            status=status.HTTP_200_OK
+        )
+
+    @staticmethod
+    def record_solve(user, challenge):
+        """
+        Creates the Solve and awards its points in one short transaction.
+        - The challenge row is locked (select_for_update) only when this solve can change it:
+          dynamic decay or a first blood that has not been claimed yet. Concurrent solvers of the
+          same challenge queue on that lock for the duration of a few small statements.
+        - Scores are updated with F() expressions and only the changed columns are written,
+          so concurrent solves and hint unlocks never overwrite each other.
+        Raises IntegrityError if the user has already solved the challenge.
+        """
+        with transaction.atomic():
+            ctf_settings = get_ctf_settings() # Process-local cache, no query (see api/ctf_settings.py)
+            is_decaying = ctf_settings.scoring_mode == 'dynamic' and challenge.is_dynamic
+            points_awarded_for_this_solve = challenge.points # Default to current points
+            challenge_updates = {}
+
+            if is_decaying or challenge.first_blood_id is None:
+                locked = (
+                    Challenge.objects.select_for_update()
+                    .only('points', 'initial_points', 'minimum_points', 'decay_function', 'decay_factor', 'first_blood')
+                    .get(pk=challenge.pk)
+                )
+                points_awarded_for_this_solve = locked.points
 
-                if ctf_settings.scoring_mode == 'dynamic' and challenge.is_dynamic:
-                    # Calculate current number of solves for this challenge *before* this solve
+                if is_decaying:
+                    # Calculate current number of solves for this challenge *before* this solve.
+                    # The lock makes this count exact even when many players solve at once.
                     current_solves_count = Solve.objects.filter(challenge=challenge).count()
 
                     # Apply dynamic scoring formula: points decay linearly per solve
-                    # points = max(minimum_points, initial_points - (num_solves * decay_factor))
-                    calculated_points = max(
-                        challenge.minimum_points,
-                        challenge.initial_points - (current_solves_count * challenge.decay_factor)
-                    )
-                    
-                    points_awarded_for_this_solve = calculated_points # Points for the current solver
-
+                    points_awarded_for_this_solve = decayed_points(locked, current_solves_count)
                     # Update the challenge's current points for *future* solves
-                    challenge.points = calculated_points
-                    challenge.save()
-                
-                # Create a Solve record
-                solve_instance = Solve.objects.create(
-                    user=user,
-                    challenge=challenge,
-                    points_awarded=points_awarded_for_this_solve
-                )
-
-                # Update user's score
-                user.score += points_awarded_for_this_solve
-                user.save()
-
-                # Check for first blood if not already set
-                if not challenge.first_blood:
-                    challenge.first_blood = user
-                    challenge.save()
-            
-            # Broadcast the solve event to the activity feed
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                'activity_feed',
-                {
-                    'type': 'feed.message', # This will call the 'feed_message' method in the consumer
-                    'message': {
-                        'user': user.username,
-                        'challenge': challenge.name,
-                        'points': points_awarded_for_this_solve,
-                        'timestamp': str(solve_instance.solved_at) # Get actual solve timestamp
-                    }
-                }
+                    challenge_updates['points'] = points_awarded_for_this_solve
+                    if points_awarded_for_this_solve != locked.points:
+                        bump_challenge_version() # The cached challenge payloads show the points
+
+                if locked.first_blood_id is None:
+                    challenge_updates['first_blood'] = user
+
+            # Create a Solve record; a duplicate raises IntegrityError and rolls everything back
+            solve_instance = Solve.objects.create(
+                user=user,
+                challenge=challenge,
+                points_awarded=points_awarded_for_this_solve
             )
 
-            return Response(
-                {"detail": "Flag submitted successfully!", "points_awarded": points_awarded_for_this_solve},
-                status=status.HTTP_200_OK
-            )
-        else:
-            # Flag is incorrect
-            return Response(
-                {"detail": "Incorrect flag."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            if challenge_updates:
+                # QuerySet.update() writes only these columns and skips Challenge.save()'s point reset
+                Challenge.objects.filter(pk=challenge.pk).update(**challenge_updates)
+                for field, value in challenge_updates.items():
+                    setattr(challenge, field, value)
+
+            # Update user's score atomically in the database
+            User.objects.filter(pk=user.pk).update(score=F('score') + points_awarded_for_this_solve)
+            user.score += points_awarded_for_this_solve
+            record_score(user, points_awarded_for_this_solve, solve_instance.solved_at)
+            count_solve(challenge.pk)
+
+        return solve_instance
 
 
 class UnlockHintView(APIView):
@@ -205,28 +305,36 @@ class UnlockHintView(APIView):
         hint = get_object_or_404(Hint, pk=pk)
         user = request.user
 
-        # Check if the user has already unlocked this hint
-        if UnlockedHint.objects.filter(user=user, hint=hint).exists():
+        # Check if the user has already unlocked this hint (see api/user_progress.py)
+        if unlocked_hints.contains(user.pk, hint.pk):
             return Response(
                 {"detail": "You have already unlocked this hint."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if the user has enough score to unlock the hint
-        if user.score < hint.cost:
+        try:
+            with transaction.atomic():
+                # Deduct points from user's score atomically; the score condition checks the balance
+                # (request.user's cached score may be stale) and keeps concurrent unlocks from
+                # spending the same points twice
+                deducted = User.objects.filter(pk=user.pk, score__gte=hint.cost).update(score=F('score') - hint.cost)
+                if not deducted:
+                    return Response(
+                        {"detail": f"Insufficient score. You need {hint.cost} points to unlock this hint."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                user.score -= hint.cost
+                record_score(user, -hint.cost)
+
+                # Create an UnlockedHint record; a concurrent duplicate unlock rolls back the deduction
+                UnlockedHint.objects.create(user=user, hint=hint)
+                notify_user(user.pk, 'hint_unlocked', hint_id=hint.pk, challenge_id=hint.challenge_id, cost=hint.cost)
+        except IntegrityError:
             return Response(
-                {"detail": f"Insufficient score. You need {hint.cost} points to unlock this hint."},
+                {"detail": "You have already unlocked this hint."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        with transaction.atomic():
-            # Deduct points from user's score
-            user.score -= hint.cost
-            user.save()
-
-            # Create an UnlockedHint record
-            UnlockedHint.objects.create(user=user, hint=hint)
-
         return Response(
             {"detail": "Hint unlocked successfully!", "cost_deducted": hint.cost},
             status=status.HTTP_200_OK
@@ -255,18 +363,27 @@ class TeamListCreateView(generics.ListCreateAPIView):
         with transaction.atomic():
             team = serializer.save()
             user.team = team
-            user.save()
+            user.save(update_fields=['team']) # request.user is cached; never write its other fields back
+            refresh_teams(team.id)
+            bump_user_version(user.pk)
+            notify_team_change(user, None, team.id)
 
 
 class TeamDetailView(generics.RetrieveAPIView):
     """
     API endpoint for retrieving a single team's details, including its members.
+    While the scoreboard is frozen, non-admins get the team as it was at freeze time.
     Requires authentication.
     """
     queryset = Team.objects.all()
     serializer_class = TeamDetailSerializer
     permission_classes = (IsAuthenticated,)
 
+    def retrieve(self, request, *args, **kwargs):
+        # Teams created after the freeze are not in the snapshot, and are not found until the unfreeze
+        frozen = frozen_response(request, f"team:{self.kwargs['pk']}")
+        return frozen if frozen is not None else super().retrieve(request, *args, **kwargs)
+
 
 class JoinTeamView(APIView):
     """
@@ -286,7 +403,10 @@ class JoinTeamView(APIView):
 
         with transaction.atomic():
             user.team = team
-            user.save()
+            user.save(update_fields=['team'])
+            refresh_teams(team.id)
+            bump_user_version(user.pk)
+            notify_team_change(user, None, team.id)
 
         return Response(
             {"detail": f"Successfully joined team '{team.name}'."},
@@ -311,8 +431,12 @@ class LeaveTeamView(APIView):
         
         team_name = user.team.name
         with transaction.atomic():
+            team_id = user.team_id
             user.team = None
-            user.save()
+            user.save(update_fields=['team'])
+            refresh_teams(team_id)
+            bump_user_version(user.pk)
+            notify_team_change(user, team_id, None)
 
         return Response(
             {"detail": f"Successfully left team '{team_name}'."},
@@ -320,30 +444,149 @@ class LeaveTeamView(APIView):
         )
 
 
+def parse_page_params(request):
+    """
+    Reads the 'offset' and 'limit' query parameters of ranked listings, from a DRF or a plain Django
+    request (see api/async_views.py). 'limit' defaults to LEADERBOARD_PAGE_SIZE and is capped at
+    LEADERBOARD_PAGE_MAX, so no request serializes a whole ranking.
+    """
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', LEADERBOARD_PAGE_SIZE)), 0), LEADERBOARD_PAGE_MAX)
+    except ValueError:
+        raise ValidationError({"detail": "'offset' and 'limit' must be integers."})
+    return offset, limit
+
+
+def page_selector(offset, limit):
+    """
+    The (select, variant) arguments for frozen_response() that cut a page out of a frozen ranking.
+    """
+    return (lambda rows: rows[offset:offset + limit]), f'{offset}-{limit}'
+
+
 class LeaderboardView(generics.ListAPIView):
     """
     API endpoint for displaying the competition leaderboard.
     Shows teams ordered by total score and last solve time.
+    Paged with '?offset=&limit=' (see parse_page_params()).
+    While the scoreboard is frozen, non-admins get the snapshot taken at freeze time.
     Requires authentication.
     """
     serializer_class = LeaderboardSerializer
     permission_classes = (IsAuthenticated,)
 
+    def list(self, request, *args, **kwargs):
+        select, variant = page_selector(*parse_page_params(request))
+        frozen = frozen_response(request, 'leaderboard', select, variant)
+        return frozen if frozen is not None else super().list(request, *args, **kwargs)
+
     def get_queryset(self):
         """
-        Constructs a queryset for the leaderboard, annotating teams with
-        their total score and the timestamp of their last solve.
+        Reads a page of the incrementally maintained team leaderboard (see api/leaderboard.py)
+        and attaches team names with a single primary-key lookup, so the cost depends only
+        on the page size and not on the number of teams, members or solves.
         """
-        queryset = Team.objects.annotate(
-            # Calculate total score for each team by summing scores of all its members.
-            # Coalesce handles cases where a team has no members or members have no score, defaulting to 0.
-            total_score=Coalesce(Sum('members__score'), 0, output_field=models.IntegerField()),
-            # Find the latest solve time among all members of the team.
-            # Coalesce handles teams with no solves by defaulting to NULL.
-            last_solve_time=Coalesce(Max('members__solves__solved_at'), None, output_field=models.DateTimeField())
-        ).order_by('-total_score', 'last_solve_time') # Order by score (desc) then by solve time (asc for tie-break)
-        
-        return queryset
+        offset, limit = parse_page_params(self.request)
+        return team_rows(offset, limit)
+
+
+class PlayerLeaderboardView(generics.ListAPIView):
+    """
+    API endpoint for displaying the individual leaderboard.
+    Shows players ordered by score and last solve time.
+    Paged with '?offset=&limit=' (see parse_page_params()).
+    While the scoreboard is frozen, non-admins get the snapshot taken at freeze time.
+    Requires authentication.
+    """
+    serializer_class = PlayerLeaderboardSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request, *args, **kwargs):
+        select, variant = page_selector(*parse_page_params(request))
+        frozen = frozen_response(request, 'players', select, variant)
+        return frozen if frozen is not None else super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """
+        Reads a page of the incrementally maintained player leaderboard and attaches usernames
+        with a single primary-key lookup.
+        """
+        offset, limit = parse_page_params(self.request)
+        return player_rows(offset, limit)
+
+
+class LeaderboardTimelineView(APIView):
+    """
+    API endpoint for the scoreboard graph: cumulative score over time of the top teams.
+    Accepts '?top=' (default 10, at most TIMELINE_MAX_TOP).
+    While the scoreboard is frozen, non-admins get the timeline up to the freeze time.
+    Requires authentication.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Serves the precomputed, downsampled team score series (see api/timeline.py) from a short-lived
+        shared cache, so concurrent viewers reuse one computation and one JSON encoding.
+        """
+        try:
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            raise ValidationError({"detail": "'top' must be an integer."})
+        top = min(max(top, 1), TIMELINE_MAX_TOP)
+
+        frozen = frozen_response(
+            request, 'timeline',
+            None if top == TIMELINE_MAX_TOP else lambda timeline: {**timeline, 'teams': timeline['teams'][:top]},
+            f'top{top}',
+        )
+        if frozen is not None:
+            return frozen
+
+        def compute():
+            rows = team_rows(0, top)
+            return top_team_timeline([row['id'] for row in rows], {row['id']: row['name'] for row in rows})
+
+        payload = cached_json(f'timeline_cache:teams:top:{top}', compute)
+        return HttpResponse(payload, content_type='application/json')
+
+
+class ActivityView(APIView):
+    """
+    API endpoint for the activity feed history, newest first: the events also sent over 'ws/activity/'.
+    Pages back with '?before=<event id>' (the 'next' value of the previous page); '?limit=' defaults
+    to 50 (at most HISTORY_PAGE_MAX). Only the capped history in Redis is read, never the solves table.
+    """
+    permission_classes = (AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+        before = request.query_params.get('before')
+        if before and not EVENT_ID_RE.match(before):
+            raise ValidationError({"detail": "'before' must be an event id."})
+        try:
+            limit = int(request.query_params.get('limit', 50))
+        except ValueError:
+            raise ValidationError({"detail": "'limit' must be an integer."})
+        limit = min(max(limit, 1), HISTORY_PAGE_MAX)
+
+        # The events are stored pre-encoded, so the page is assembled without decoding them
+        events = activity_broadcaster.history(before, limit + 1)
+        next_cursor = json.loads(events[limit - 1])['id'] if len(events) > limit else None
+        payload = f'{{"results": [{", ".join(events[:limit])}], "next": {json.dumps(next_cursor)}}}'
+        return HttpResponse(payload, content_type='application/json')
+
+
+class WebSocketGaugesView(APIView):
+    """
+    Staff-only API endpoint reporting the WebSocket gauges of every live ASGI process and their totals:
+    open connections, queued frames and the deepest outbox, connections behind, and the rejected,
+    evicted and coalesced counts since each process started (see api/connection_limits.py).
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(process_gauges())
 
 
 class WriteUpSubmitView(generics.CreateAPIView):
@@ -10,17 +10,19 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 
-from api import routing # Import your app's routing
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ctf_platform.settings')
+django_asgi_app = get_asgi_application() # Sets up Django before the app's modules (models, etc.) are imported
+
+from api import routing # Import your app's routing
+from api.authentication import JWTAuthMiddleware
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": django_asgi_app,
+    # Sockets authenticate with the API's JWT access tokens, checked locally (see JWTAuthMiddleware)
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             routing.websocket_urlpatterns
         )
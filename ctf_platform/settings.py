@@ -43,7 +43,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',     # Added for CORS handling
     'rest_framework',  # Added for REST API
-    'ratelimit',       # Added for API rate limiting
     'api',             # Our core API app
 ]
 
@@ -150,7 +149,7 @@ CORS_ALLOW_CREDENTIALS = True # Allow cookies to be sent with cross-origin reque
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication', # simplejwt with a version-stamped user cache
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny', # Default permission for now, will be refined per view
@@ -162,7 +161,9 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
-    )
+    ),
+    # nginx is the only proxy in front of daphne; it appends the client address to X-Forwarded-For
+    'NUM_PROXIES': 1,
 }
 
 # Django REST Framework Simple JWT settings
@@ -205,12 +206,39 @@ SIMPLE_JWT = {
     'TOKEN_SLIDING_REFRESH_SERIALIZER': 'rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer',
 }
 
+# Redis connection shared by the channel layer and the runtime state kept in Redis (leaderboards etc.)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/1')
+
+# Submission attempt log: rows are buffered in memory and inserted in batches of this size,
+# or at least every FLUSH_INTERVAL seconds (bounding how many attempts a crash can lose)
+SUBMISSION_LOG_BATCH_SIZE = int(os.environ.get('SUBMISSION_LOG_BATCH_SIZE', '500'))
+SUBMISSION_LOG_FLUSH_INTERVAL = float(os.environ.get('SUBMISSION_LOG_FLUSH_INTERVAL', '1.0'))
+SUBMISSION_LOG_MAX_PENDING = 50000 # Kept in memory while the database is unreachable; older entries are dropped
+
+# Rate limits enforced through Redis across all workers (see api/throttling.py), per scope and identity.
+# 'challenge' counts one user's attempts at one challenge.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMITS = {
+    'register': {'ip': '5/m'},
+    'submit': {'user': '10/m', 'challenge': '5/m', 'team': '30/m', 'ip': '60/m'},
+}
+
+# WebSocket connection limits, per ASGI process (see api/connection_limits.py for the defaults).
+# Connections beyond the caps are closed with 4013 (try again later); a connection whose outbox holds
+# more than 'max_queued_frames' frames or has not caught up for 'max_lag' seconds is resynchronized or evicted.
+WEBSOCKET_LIMITS = {
+    'max_connections': int(os.environ.get('WEBSOCKET_MAX_CONNECTIONS', '20000')),
+    'max_connections_per_ip': int(os.environ.get('WEBSOCKET_MAX_CONNECTIONS_PER_IP', '50')),
+    'max_queued_frames': 64,
+    'max_lag': 10.0,
+}
+
 # Channels Layer configuration
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.pubsub.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [os.environ.get('REDIS_URL', 'redis://localhost:6379/1')],
+            "hosts": [REDIS_URL],
         },
     },
 }
@@ -5,8 +5,20 @@ import ReconnectingWebSocket from 'reconnecting-websocket';
 // Use 'ws' for http and 'wss' for https
 const WS_URL = 'ws://127.0.0.1:8000/ws/activity/'; 
 
+// Id of the newest event received. Reconnects pass it along so the server replays exactly the missed events.
+let lastEventId = null;
+
+// Event ids are '<milliseconds>-<sequence>'; compares two of them in stream order
+const compareEventIds = (a, b) => {
+  const [aMs, aSeq] = a.split('-').map(Number);
+  const [bMs, bSeq] = b.split('-').map(Number);
+  return aMs - bMs || aSeq - bSeq;
+};
+
 // Create a ReconnectingWebSocket instance
-const ws = new ReconnectingWebSocket(WS_URL);
+const ws = new ReconnectingWebSocket(
+  () => (lastEventId ? `${WS_URL}?last_id=${encodeURIComponent(lastEventId)}` : WS_URL)
+);
 
 // Array to store callback functions for messages
 const messageListeners = [];
@@ -18,8 +30,22 @@ ws.onopen = () => {
 ws.onmessage = (event) => {
   const data = JSON.parse(event.data);
   // console.log('WebSocket message received:', data);
-  // Notify all registered listeners
-  messageListeners.forEach(listener => listener(data));
+  // Bursts arrive as one 'activity_batch' frame; listeners see each event as its own 'activity_update'
+  const updates = data.type === 'activity_batch'
+    ? data.messages.map(message => ({ type: 'activity_update', message }))
+    : [data];
+  updates.forEach(update => {
+    const id = update.message && update.message.id;
+    if (id) {
+      // A replay can repeat events that were also delivered live
+      if (lastEventId && compareEventIds(id, lastEventId) <= 0) {
+        return;
+      }
+      lastEventId = id;
+    }
+    // Notify all registered listeners
+    messageListeners.forEach(listener => listener(update));
+  });
 };
 
 ws.onclose = (event) => {
@@ -1,26 +1,70 @@
 # frontend/src/stores/leaderboard.js
 import { defineStore } from 'pinia';
-import api from '@/services/api'; // Import the configured axios instance
+import ReconnectingWebSocket from 'reconnecting-websocket';
+
+// Live leaderboard stream: a snapshot on connect, then deltas listing only the teams that moved
+const LEADERBOARD_WS_URL = 'ws://127.0.0.1:8000/ws/leaderboard/';
+
+let socket = null;
 
 export const useLeaderboardStore = defineStore('leaderboard', {
   state: () => ({
     rankings: [],
+    version: null,
+    frozen: false,
     loading: false,
     error: null,
   }),
 
   actions: {
-    async fetchLeaderboard() {
-      this.loading = true;
+    /**
+     * Opens the leaderboard stream. Every (re)connect starts with a fresh snapshot, so gaps heal themselves.
+     */
+    subscribe() {
+      if (socket) {
+        return;
+      }
+      this.loading = this.version === null;
       this.error = null;
-      try {
-        const response = await api.get('leaderboard/');
-        this.rankings = response.data;
-      } catch (error) {
-        this.error = 'Failed to fetch leaderboard.';
-        console.error('Error fetching leaderboard:', error);
-      } finally {
+      socket = new ReconnectingWebSocket(LEADERBOARD_WS_URL);
+      socket.onmessage = (event) => this.handleFrame(JSON.parse(event.data));
+      socket.onerror = (error) => {
+        console.error('Leaderboard stream error:', error);
+        if (this.version === null) {
+          this.error = 'Failed to load leaderboard.';
+          this.loading = false;
+        }
+      };
+    },
+
+    unsubscribe() {
+      if (socket) {
+        socket.close();
+        socket = null;
+      }
+    },
+
+    handleFrame(frame) {
+      if (frame.type === 'leaderboard_snapshot') {
+        this.rankings = frame.rankings;
+        this.version = frame.version;
+        this.frozen = frame.frozen;
         this.loading = false;
+        this.error = null;
+      } else if (frame.type === 'leaderboard_delta' && this.version !== null && frame.version > this.version) {
+        // Each change takes the team out and puts it back at its new rank; the teams in between shift by one
+        const rankings = [...this.rankings];
+        frame.changes.forEach(({ rank, ...team }) => {
+          const index = rankings.findIndex(row => row.id === team.id);
+          if (index > -1) {
+            rankings.splice(index, 1);
+          }
+          if (rank !== null) {
+            rankings.splice(rank - 1, 0, team);
+          }
+        });
+        this.rankings = rankings;
+        this.version = frame.version;
       }
     },
   },